@@ -0,0 +1,136 @@
+"""
+Модуль baseline
+===============
+
+Модуль baseline - оценка и вычитание базовой линии хроматограммы
+
+Дрейф базовой линии пламенно-ионизационного детектора при программировании
+температуры искажает высоты и площади пиков, определенные от прямой между
+началом и окончанием пика. Базовая линия оценивается по всему сигналу
+и вычитается до поиска пиков
+
+Методы (method):
+        'asls' - асимметричный метод наименьших квадратов (Eilers, Boelens):
+                 гладкая кривая, лежащая под сигналом. Система уравнений
+                 с пятидиагональной матрицей решается ленточным методом
+                 Холецкого за O(n) операций. Сигнал с частотой выше
+                 FIT_RATE усредняется до FIT_RATE, базовая линия
+                 интерполируется на исходную частоту: при жесткости
+                 lam * rate ** 4 система для 100 Гц плохо обусловлена
+        'rolling_ball' - морфологическое открытие (минимум, затем максимум
+                 в скользящем окне) со сглаживанием, O(n) операций
+
+Параметры задаются в секундах и не зависят от частоты записи сигнала
+
+Основные функции
+----------------
+        asls(ndarray, float=1, float=1e5, float=.01, int=10) -> ndarray
+        rolling_ball(ndarray, float=1, float=30) -> ndarray
+        estimate(ndarray, float=1, str='asls', **params) -> ndarray
+
+"""
+
+import numpy as np
+
+from . import timing
+
+METHODS = ('asls', 'rolling_ball')
+
+# наибольшая частота сигнала для расчета базовой линии asls, Гц
+FIT_RATE = 1
+
+
+def asls(signal, rate=1, lam=1e5, p=.01, niter=10):
+        """
+        Функция оценки базовой линии асимметричным методом наименьших
+        квадратов
+        Принимает в качестве аргументов:
+        signal - массив сигнала
+        rate - частота записи сигнала, Гц
+        lam - жесткость базовой линии (для сигнала 1 Гц)
+        p - вес точек выше базовой линии (0 < p < 1)
+        niter - число итераций уточнения весов
+
+        Возвращаемое значение:
+                ndarray: базовая линия
+
+        """
+        from scipy.linalg import solveh_banded
+
+        y = np.asarray(signal, dtype=float)
+        n = len(y)
+        if n < 3:
+                return y.copy()
+        size = int(round(rate / FIT_RATE))
+        if size > 1 and n >= 3 * size:
+                # расчет по средним блоков size точек (частота rate / size)
+                # и линейная интерполяция на точки сигнала
+                block = np.arange(n) // size
+                counts = np.bincount(block)
+                coarse = np.bincount(block, weights=y) / counts
+                centers = np.bincount(block, weights=np.arange(n)) / counts
+                z = asls(coarse, rate / size, lam, p, niter)
+                return np.interp(np.arange(n), centers, z)
+        # жесткость для частоты rate соответствует жесткости lam для 1 Гц
+        lam = lam * rate ** 4
+        # ленты матрицы lam * D'D (D - вторые разности): верхняя форма
+        # для solveh_banded, строки - 2-я, 1-я наддиагонали и диагональ
+        band = np.zeros((3, n))
+        band[0, 2:] = lam
+        band[1, 1:] = -4 * lam
+        band[1, 1] = band[1, -1] = -2 * lam
+        band[2] = 6 * lam
+        band[2, [0, -1]] = lam
+        band[2, [1, -2]] = 5 * lam
+        w = np.ones(n)
+        z = y
+        for _ in range(niter):
+                ab = band.copy()
+                ab[2] += w
+                z = solveh_banded(ab, w * y, check_finite=False)
+                w_new = np.where(y > z, p, 1 - p)
+                if np.array_equal(w_new, w):
+                        break
+                w = w_new
+        return z
+
+
+def rolling_ball(signal, rate=1, radius=30):
+        """
+        Функция оценки базовой линии морфологическим открытием
+        Принимает в качестве аргументов:
+        signal - массив сигнала
+        rate - частота записи сигнала, Гц
+        radius - полуширина окна, сек (больше полуширины пиков у основания)
+
+        Возвращаемое значение:
+                ndarray: базовая линия
+
+        """
+        from scipy.ndimage import (maximum_filter1d, minimum_filter1d,
+                                   uniform_filter1d)
+
+        y = np.asarray(signal, dtype=float)
+        size = 2 * max(int(round(radius * rate)), 1) + 1
+        opened = maximum_filter1d(minimum_filter1d(y, size, mode='nearest'),
+                                  size, mode='nearest')
+        smooth = uniform_filter1d(opened, size, mode='nearest')
+        # сглаженная кривая не должна подниматься выше сигнала
+        return np.minimum(smooth, y)
+
+
+@timing.stage('baseline', imports=('scipy.linalg', 'scipy.ndimage'))
+def estimate(signal, rate=1, method='asls', **params):
+        """
+        Функция оценки базовой линии сигнала методом method
+        params - параметры метода (см. asls, rolling_ball)
+
+        Возвращаемое значение:
+                ndarray: базовая линия
+
+        """
+        if method == 'asls':
+                return asls(signal, rate, **params)
+        if method == 'rolling_ball':
+                return rolling_ball(signal, rate, **params)
+        raise ValueError('Неизвестный метод базовой линии: %r' % method)
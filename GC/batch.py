@@ -0,0 +1,354 @@
+"""
+Модуль batch
+============
+
+Модуль batch - пакетная обработка файлов с экспериментальными данными
+без графического интерфейса
+
+Файлы обрабатываются параллельно в пуле процессов (по-умолчанию - по числу
+ядер процессора). Результаты всех файлов сводятся в одну таблицу формата
+CSV или JSON: по одной строке на каждый обнаруженный компонент с параметрами
+t, H, S, S/N, As, N, Rs. Ход обработки и ошибки по каждому файлу выводятся
+в поток ошибок (stderr)
+
+Запуск из командной строки:
+
+        python -m GC.batch папка_или_маска [...] [-o результаты.csv]
+                           [--format csv|json] [-j число_процессов]
+                           [--rate 1] [--library компоненты.csv]
+                           [--noise-window 40,60|auto]
+                           [--noise-method p2p|rms|astm]
+                           [--baseline asls|rolling_ball]
+                           [--fit gauss|emg] [--db результаты.sqlite]
+                           [--profile] [--profile-log этапы.jsonl]
+                           [--channel название|номер|all]
+
+Основные функции
+----------------
+        find_files(list) -> list
+        process_file(file, **options) -> (file, list, str)
+        run(list, int=None, callback=None, bool=False,
+            **options) -> (list, dict)
+        fields(bool=False, bool=False) -> tuple
+        write_csv(list, file) -> None
+        write_json(list, file) -> None
+        add_options(ArgumentParser) -> None
+        options(Namespace) -> dict
+        main(list=None) -> int
+
+"""
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import baseline
+from . import deconvolve
+from . import library
+from . import noise
+from . import scan
+from . import store
+from . import timing
+from .chromatogram import Chromatogram, ProcessingResult, process_channels
+
+# столбцы итоговой таблицы
+FIELDS = ('file', 'date', 'time', 'component') + ProcessingResult.PARAMS
+# столбцы параметров разделенных пиков (параметр --fit)
+FIT_FIELDS = tuple(column for column, _ in ProcessingResult.FIT_PARAMS)
+
+
+def find_files(paths):
+        """
+        Функция формирования списка файлов для обработки
+        Принимает список путей: файлов, папок (обрабатываются все *.txt
+        файлы папки) или масок поиска ('runs/*.txt')
+        Файлы без данных хроматографирования пропускаются
+
+        Возвращаемое значение:
+                list: отсортированный список путей к файлам
+
+        """
+        files = []
+        for path in paths:
+                if os.path.isdir(path):
+                        files.extend(glob.glob(os.path.join(path, '*.txt')))
+                elif os.path.isfile(path):
+                        files.append(path)
+                else:
+                        files.extend(glob.glob(path))
+        return sorted(f for f in set(files) if scan.is_gc_file(f))
+
+
+def process_file(filename, **options):
+        """
+        Функция обработки одного файла в процессе пула
+        options - параметры обработки Chromatogram (rate, library,
+                  wing_noise, noise_method ...), channel='all' - обработка
+                  всех каналов детекторов файла
+        Сообщения модуля chromatogram подавляются
+
+        Возвращаемое значение:
+                (filename, rows, error) - путь к файлу, строки таблицы
+                результатов и текст ошибки (None - обработка успешна)
+
+        """
+        try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                        if options.get('channel') == 'all':
+                                del options['channel']
+                                results = process_channels(filename,
+                                                           **options)
+                                rows = [row for result in results.values()
+                                        for row in result.rows()]
+                                return filename, rows, None
+                        result = Chromatogram(filename, **options).process()
+                return filename, result.rows(), None
+        except Exception as e:
+                return filename, [], '%s: %s' % (type(e).__name__, e)
+
+
+def _profiled(filename, memory, **options):
+        # обработка файла в процессе пула с измерением этапов обработки
+        timing.enable(memory)
+        # журнал записывается в основном процессе (см. run)
+        with timing.run(filename, log=False):
+                output = process_file(filename, **options)
+        return output, timing.PROFILE.pop(filename)
+
+
+def run(files, jobs=None, callback=None, profile=False, **options):
+        """
+        Функция параллельной обработки списка файлов files
+        Принимает в качестве аргументов:
+        jobs - число процессов (по-умолчанию - число ядер процессора)
+        callback - функция callback(done, total, filename, error),
+                   вызываемая по завершении обработки каждого файла
+        profile - измерять этапы обработки (True - время, 'memory' -
+                  время и память), результаты добавляются в timing.PROFILE
+                  и записываются в журнал 'GC.timing'
+        options - параметры обработки файлов (см. process_file)
+
+        Возвращаемое значение:
+                (rows, errors) - строки таблицы результатов всех файлов
+                (в порядке списка files) и словарь ошибок {файл: текст}
+
+        """
+        results = {}
+        errors = {}
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+                if profile:
+                        memory = profile == 'memory'
+                        futures = [pool.submit(_profiled, f, memory,
+                                               **options) for f in files]
+                else:
+                        futures = [pool.submit(process_file, f, **options)
+                                   for f in files]
+                for done, future in enumerate(as_completed(futures), 1):
+                        output = future.result()
+                        if profile:
+                                output, stages = output
+                                timing.PROFILE.merge({output[0]: stages})
+                                timing.write_log(output[0], stages)
+                        filename, rows, error = output
+                        results[filename] = rows
+                        if error is not None:
+                                errors[filename] = error
+                        if callback is not None:
+                                callback(done, len(files), filename, error)
+        rows = [row for f in files for row in results[f]]
+        return rows, errors
+
+
+def fields(channel=False, fit=False):
+        """
+        Функция получения столбцов таблицы результатов
+        channel - добавить столбец канала детектора (параметр --channel)
+        fit - добавить столбцы разделенных пиков (параметр --fit)
+
+        Возвращаемое значение:
+                tuple: названия столбцов
+
+        """
+        columns = FIELDS
+        if channel:
+                columns = FIELDS[:4] + ('channel',) + FIELDS[4:]
+        if fit:
+                columns += FIT_FIELDS
+        return columns
+
+
+def write_csv(rows, outf):
+        """
+        Запись строк таблицы результатов в открытый файл outf в формате CSV
+        Столбцы канала и разделенных пиков добавляются, если они есть
+        в строках
+
+        """
+        columns = fields(any('channel' in row for row in rows),
+                         any(FIT_FIELDS[0] in row for row in rows))
+        writer = csv.DictWriter(outf, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(rows, outf):
+        """
+        Запись строк таблицы результатов в открытый файл outf в формате JSON
+
+        """
+        json.dump(rows, outf, ensure_ascii=False, indent=1)
+        outf.write('\n')
+
+
+def _progress(done, total, filename, error):
+        status = 'ok' if error is None else 'ошибка - ' + error
+        print('[%d/%d] %s: %s' % (done, total, filename, status),
+              file=sys.stderr)
+
+
+def _noise_window(text):
+        # '40,60' -> (40., 60.), 'auto' -> None
+        if text == 'auto':
+                return None
+        return tuple(float(v) for v in text.split(','))
+
+
+def _channel(text):
+        # номер канала или название столбца ('all' - все каналы)
+        return int(text) if text.isdigit() else text
+
+
+def add_options(parser):
+        """
+        Добавление параметров обработки файлов (частота, библиотека, шум,
+        базовая линия, разделение пиков, канал) в разбор командной строки
+        parser (argparse.ArgumentParser), см. options
+
+        """
+        parser.add_argument('-r', '--rate', type=float, default=1.,
+                            help='частота обработки сигнала, Гц '
+                                 '(0 - исходная частота записи)')
+        parser.add_argument('-l', '--library',
+                            help='файл CSV библиотеки компонентов: имя, '
+                                 'время удерживания, допуск')
+        parser.add_argument('--noise-window', type=_noise_window,
+                            default=(40, 60),
+                            help='участок расчета шума: сек,сек или auto - '
+                                 'самый спокойный участок (по-умолчанию '
+                                 '40,60)')
+        parser.add_argument('--noise-method', choices=noise.METHODS,
+                            default='p2p',
+                            help='метод расчета шума')
+        parser.add_argument('-b', '--baseline', choices=baseline.METHODS,
+                            help='коррекция базовой линии перед поиском '
+                                 'пиков (по-умолчанию - без коррекции)')
+        parser.add_argument('--fit', choices=deconvolve.SHAPES,
+                            help='разделение перекрывающихся пиков '
+                                 'аппроксимацией пиками заданной формы')
+        parser.add_argument('--channel', type=_channel,
+                            help='канал детектора: название столбца, номер '
+                                 '(0 - первый канал) или all - все каналы')
+
+
+def options(args):
+        """
+        Функция получения параметров обработки файлов (см. process_file)
+        из разобранной командной строки args (см. add_options)
+
+        Возвращаемое значение:
+                dict: параметры обработки Chromatogram
+
+        """
+        result = {'rate': args.rate or None,
+                  'wing_noise': args.noise_window,
+                  'noise_method': args.noise_method,
+                  'correction': args.baseline,
+                  'fit': args.fit}
+        if args.channel is not None:
+                result['channel'] = args.channel
+        if args.library:
+                result['library'] = library.load(args.library)
+        return result
+
+
+def main(argv=None):
+        """
+        Точка входа командной строки
+
+        Возвращаемое значение:
+                int: код завершения (0 - все файлы обработаны, 1 - есть ошибки,
+                2 - файлы не найдены)
+
+        """
+        parser = argparse.ArgumentParser(
+                prog='python -m GC.batch',
+                description='Пакетная обработка файлов хроматографии')
+        parser.add_argument('paths', nargs='+',
+                            help='файлы, папки или маски поиска файлов')
+        parser.add_argument('-o', '--output', default='-',
+                            help='файл результатов (по-умолчанию - stdout)')
+        parser.add_argument('-f', '--format', choices=('csv', 'json'),
+                            help='формат результатов (по-умолчанию - '
+                                 'по расширению файла результатов, иначе csv)')
+        parser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='число процессов (по-умолчанию - '
+                                 'число ядер процессора)')
+        add_options(parser)
+        parser.add_argument('--db', nargs='?', const=store.DB_PATH,
+                            help='сохранить результаты в базу данных SQLite '
+                                 '(по-умолчанию - %s)' % store.DB_PATH)
+        parser.add_argument('--profile', nargs='?', const=True,
+                            choices=('memory',),
+                            help='измерить время этапов обработки '
+                                 '(memory - и прирост памяти), итог '
+                                 'выводится в поток ошибок')
+        parser.add_argument('--profile-log',
+                            help='дописать результаты измерения каждого '
+                                 'файла в журнал (строки JSON)')
+        args = parser.parse_args(argv)
+
+        files = find_files(args.paths)
+        if not files:
+                print('Файлов с данными хроматографии не обнаружено',
+                      file=sys.stderr)
+                return 2
+        profile = args.profile or bool(args.profile_log)
+        if args.profile_log:
+                handler = logging.FileHandler(args.profile_log,
+                                              encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                timing.log.addHandler(handler)
+                timing.log.setLevel(logging.INFO)
+        rows, errors = run(files, args.jobs, _progress, profile,
+                           **options(args))
+        if profile:
+                print(timing.PROFILE.report(), file=sys.stderr)
+        if args.db:
+                with store.Store(args.db) as db:
+                        # результаты файлов с ошибками не заменяются
+                        db.save(rows, [f for f in files if f not in errors])
+
+        fmt = args.format
+        if fmt is None:
+                fmt = 'json' if args.output.endswith('.json') else 'csv'
+        write = write_json if fmt == 'json' else write_csv
+        if args.output == '-':
+                write(rows, sys.stdout)
+        else:
+                with open(args.output, 'w', newline='',
+                          encoding='utf-8') as outf:
+                        write(rows, outf)
+        print('Обработано файлов: %d, с ошибками: %d'
+              % (len(files) - len(errors), len(errors)), file=sys.stderr)
+        return 1 if errors else 0
+
+
+if __name__ == '__main__':
+        sys.exit(main())
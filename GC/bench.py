@@ -0,0 +1,570 @@
+"""
+Модуль bench
+============
+
+Модуль bench - измерение производительности модулей обработки
+
+Набор тестов производительности измеряет время выполнения всех открытых
+функций модуля chrom на синтетических файлах (модуль synth) разной
+длительности и частоты записи. Функции, читающие файл, измеряются
+без дискового кэша и без повторного использования разобранного файла.
+Результаты сохраняются в файл JSON и могут быть сопоставлены
+с результатами предыдущего запуска
+
+Время импорта модуля измеряется в отдельном процессе интерпретатора,
+чтобы не учитывать уже загруженные модули. Для каждого модуля задан
+предельный бюджет времени импорта IMPORT_BUDGET: модули обработки
+не должны загружать тяжелые зависимости (sympy, подмодули scipy)
+при импорте
+
+Память, занимаемая сигналом одного анализа (тренды держат в памяти тысячи
+анализов), измеряется tracemalloc для исходного хранения сигнала
+хроматограммы - словаря ddict {номер точки: сигнал} - и для series.Signal.
+Сигнал в том виде, в котором анализы хранятся в памяти (memo.compact,
+float32), должен занимать не менее чем в MEMORY_RATIO раз меньше памяти,
+чем словарь. Signal с типом float64 (обработка одного анализа) только
+выводится для сравнения
+
+Базовая линия asls сигнала с исходной частотой записи (100 Гц) сравнивается
+с базовой линией того же сигнала, усредненного до 1 Гц: расхождение
+не должно превышать BASELINE_TOLERANCE
+
+Проверки точности обработки (ACCURACY_CHECKS) выполняются на синтетических
+анализах с известными параметрами пиков:
+        detection - пики с центрами между точками сигнала 10 Гц находятся
+                    при обработке с исходной частотой записи
+        asymmetry - фактор асимметрии гауссовых пиков с центрами между
+                    точками сигнала 1 Гц отличается от 1 не более чем
+                    на ASYMMETRY_TOLERANCE
+        retention - СКО времени удерживания серии анализов 1 Гц
+                    со смещенными на доли секунды пиками совпадает
+                    с заданным разбросом с точностью RETENTION_TOLERANCE
+
+Запуск из командной строки:
+
+        python -m GC.bench [--sizes 300x10,3600x10] [-o результаты.json]
+                           [--compare прежние_результаты.json]
+        python -m GC.bench --import-time   (код завершения 1 - бюджет
+                                            превышен)
+        python -m GC.bench --memory        (код завершения 1 - выигрыш
+                                            по памяти меньше заданного)
+        python -m GC.bench --baseline      (код завершения 1 - расхождение
+                                            больше BASELINE_TOLERANCE)
+        python -m GC.bench --accuracy      (код завершения 1 - проверка
+                                            точности не пройдена)
+
+Основные функции
+----------------
+        run_suite(list=SIZES, int=5) -> dict
+        compare(dict, dict) -> list
+        import_time(str, int=5) -> float
+        check_import_budget(dict=None) -> dict
+        memory_footprint(int=1000, int=600) -> dict
+        check_memory() -> bool
+        baseline_rates(int=600, tuple=(10, 50, 100)) -> dict
+        missed_peaks(int=40, float=10) -> int
+        check_accuracy() -> bool
+
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# длительность анализа (сек) и частота записи (Гц) синтетических файлов
+SIZES = ((300, 10), (1200, 10), (3600, 10))
+
+# предельное время импорта модулей, сек
+IMPORT_BUDGET = {
+        'GC.chrom': 0.5,
+        'GC.batch': 0.5,
+        'GC.live': 0.5,
+        'GC.replicates': 0.5,
+}
+
+# наименьшее отношение памяти словаря сигнала {номер точки: сигнал}
+# к памяти сигнала, сохраненного в кэше memo
+MEMORY_RATIO = 10
+
+# наибольшее расхождение базовых линий asls сигнала с исходной частотой
+# и сигнала 1 Гц, пА
+BASELINE_TOLERANCE = .05
+
+# допустимое отклонение фактора асимметрии симметричного пика от 1
+ASYMMETRY_TOLERANCE = .03
+
+# допустимое расхождение СКО времени удерживания серии анализов 1 Гц
+# и заданного разброса вершин пиков, сек
+RETENTION_TOLERANCE = .05
+
+_IMPORT_CODE = ('import time; t = time.perf_counter(); import {0}; '
+                'print(time.perf_counter() - t)')
+
+
+def _timeit(func, repeat, reset=None):
+        # минимальное время выполнения func из repeat запусков,
+        # reset вызывается перед каждым запуском и не учитывается
+        best = float('inf')
+        for _ in range(repeat):
+                if reset is not None:
+                        reset()
+                t = time.perf_counter()
+                func()
+                best = min(best, time.perf_counter() - t)
+        return best
+
+
+def _cases(filename):
+        # измеряемые функции: {имя: (функция, сброс разобранного файла)}
+        # функции параметров пиков измеряются по обнаруженным пикам
+        from . import chrom, loader
+
+        def cold():
+                loader._last = None
+
+        chrom.findpeaks(filename)
+        cases = {
+                'datachrom': (lambda: chrom.datachrom(filename), cold),
+                'findpeaks': (lambda: chrom.findpeaks(filename), cold),
+                'gcnoise': (lambda: chrom.gcnoise(filename), cold),
+                'gchrom_time': (lambda: chrom.gchrom_time(filename), cold),
+                'gchrom_sec': (lambda: chrom.gchrom_sec(filename), cold),
+                'fpeaks': (lambda: chrom.fpeaks(), None),
+                'myround': (lambda: chrom.myround(2.9731), None),
+        }
+        found = [t for t in (chrom.time_ethanol, chrom.time_acn)
+                 if t is not None]
+        if not found:
+                print('%s: пики не обнаружены, функции параметров пиков '
+                      'не измеряются' % filename, file=sys.stderr)
+                return cases
+        t1 = found[0]
+        p1 = chrom.peak_xy(t1)
+        H1 = chrom.peakheight(p1)
+        cases.update({
+                'integration': (lambda: chrom.integration(t1), None),
+                'peak_xy': (lambda: chrom.peak_xy(t1), None),
+                'peakheight': (lambda: chrom.peakheight(p1), None),
+                'assym': (lambda: chrom.assym(p1, H1), None),
+                'plates': (lambda: chrom.plates(p1, H1), None),
+                'Wx': (lambda: chrom.Wx(p1, .5, H1), None),
+        })
+        if len(found) < 2:
+                print('%s: обнаружен один пик, resolution не измеряется'
+                      % filename, file=sys.stderr)
+                return cases
+        p2 = chrom.peak_xy(found[1])
+        H2 = chrom.peakheight(p2)
+        cases['resolution'] = (lambda: chrom.resolution(p1, p2, H1, H2), None)
+        return cases
+
+
+@contextlib.contextmanager
+def _synthetic():
+        # временная папка синтетических файлов, без дискового кэша
+        # и сообщений модуля chromatogram
+        from . import cache
+
+        cache_dir, cache.CACHE_DIR = cache.CACHE_DIR, None
+        try:
+                with tempfile.TemporaryDirectory() as tmp, \
+                     contextlib.redirect_stdout(io.StringIO()):
+                        yield tmp
+        finally:
+                cache.CACHE_DIR = cache_dir
+
+
+def run_suite(sizes=SIZES, repeat=5):
+        """
+        Функция измерения времени выполнения функций модуля chrom
+        на синтетических файлах размеров sizes [(сек, Гц), ...]
+
+        Возвращаемое значение:
+                dict: {'meta': сведения о системе,
+                       'results': {'<сек>x<Гц>': {функция: время, сек}}}
+
+        """
+        from . import loader, synth
+
+        results = {}
+        with _synthetic() as tmp:
+                for duration, rate in sizes:
+                        label = '%dx%d' % (duration, rate)
+                        filename = synth.write_run(
+                                os.path.join(tmp, label + '.txt'),
+                                duration, rate, seed=1)
+                        results[label] = {
+                                name: _timeit(func, repeat, reset)
+                                for name, (func, reset)
+                                in _cases(filename).items()}
+                        loader._last = None
+        import numpy
+        meta = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': numpy.__version__,
+                'platform': platform.platform(),
+                'repeat': repeat}
+        return {'meta': meta, 'results': results}
+
+
+def compare(old, new):
+        """
+        Функция сопоставления результатов двух запусков run_suite
+
+        Возвращаемое значение:
+                list: [(размер, функция, прежнее время, новое время,
+                        отношение нового времени к прежнему), ...]
+
+        """
+        rows = []
+        for label, funcs in new['results'].items():
+                for name, t in funcs.items():
+                        t_old = old['results'].get(label, {}).get(name)
+                        ratio = t / t_old if t_old else None
+                        rows.append((label, name, t_old, t, ratio))
+        return rows
+
+
+def import_time(module, repeat=5):
+        """
+        Функция измерения времени импорта модуля module в новом процессе
+        Первый запуск прогревает файловый кэш и не учитывается
+
+        Возвращаемое значение:
+                float: минимальное время импорта из repeat запусков, сек
+
+        """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        times = []
+        for _ in range(repeat + 1):
+                out = subprocess.run([sys.executable, '-c',
+                                      _IMPORT_CODE.format(module)],
+                                     capture_output=True, text=True,
+                                     env=env, check=True).stdout
+                times.append(float(out))
+        return min(times[1:])
+
+
+def check_import_budget(budget=None):
+        """
+        Функция проверки времени импорта модулей по бюджету budget
+        (по-умолчанию - IMPORT_BUDGET)
+
+        Возвращаемое значение:
+                dict: {модуль: (время импорта, бюджет)} для модулей,
+                      превысивших бюджет
+
+        """
+        if budget is None:
+                budget = IMPORT_BUDGET
+        over = {}
+        for module, limit in budget.items():
+                t = import_time(module)
+                print('%-12s %.3f c (бюджет %.3f c)' % (module, t, limit))
+                if t > limit:
+                        over[module] = (t, limit)
+        return over
+
+
+def memory_footprint(runs=1000, duration=600):
+        """
+        Функция измерения памяти, занимаемой сигналами runs анализов
+        длительностью duration сек (1 Гц) в виде словаря {номер точки:
+        сигнал}, в виде series.Signal (float64) и в виде, в котором
+        сигнал хранится в кэше memo (memo.compact)
+
+        Возвращаемое значение:
+                dict: {представление: память одного анализа, байт}
+
+        """
+        import numpy as np
+        from . import memo
+        from .series import Signal
+
+        rng = np.random.default_rng(1)
+
+        def measure(make):
+                # прирост памяти после создания runs сигналов
+                tracemalloc.start()
+                try:
+                        before = tracemalloc.get_traced_memory()[0]
+                        kept = [make(np.round(rng.normal(1, .1, duration), 3))
+                                for _ in range(runs)]
+                        size = tracemalloc.get_traced_memory()[0] - before
+                finally:
+                        tracemalloc.stop()
+                del kept
+                return size / runs
+
+        return {'dict': measure(lambda s: dict(enumerate(s.tolist()))),
+                'float64': measure(lambda s: Signal(s)),
+                'memo': measure(lambda s: memo.compact(Signal(s)))}
+
+
+def check_memory():
+        """
+        Функция проверки выигрыша по памяти сигнала, сохраненного в кэше
+        memo, по сравнению со словарем сигнала (см. memory_footprint,
+        MEMORY_RATIO)
+
+        Возвращаемое значение:
+                bool: True - выигрыш не меньше MEMORY_RATIO
+
+        """
+        sizes = memory_footprint()
+        for name, size in sizes.items():
+                print('%-8s %10.0f байт/анализ  x%.1f'
+                      % (name, size, sizes['dict'] / size))
+        return sizes['dict'] / sizes['memo'] >= MEMORY_RATIO
+
+
+def baseline_rates(duration=600, rates=(10, 50, 100)):
+        """
+        Функция сравнения базовой линии asls синтетического сигнала
+        с частотой rates (пики и нелинейный дрейф) с базовой линией
+        того же сигнала, усредненного до 1 Гц
+
+        Возвращаемое значение:
+                dict: {частота: наибольшее расхождение, пА}
+
+        """
+        import numpy as np
+        from . import baseline, loader, synth
+
+        result = {}
+        for rate in rates:
+                time = np.arange(duration * rate) / rate
+                drift = 11.6 + .002 * time + 1.5 * (time / duration) ** 2
+                signal = drift + synth.signal(
+                        time, [(190, 3, 2.5), (210, 2, 2.5), (400, 1, 3)],
+                        drift=0, seed=1, baseline=0)
+                native = baseline.asls(signal, rate)
+                second = baseline.asls(loader.block_mean(signal, rate), 1)
+                result[rate] = float(np.abs(
+                        loader.block_mean(native, rate) - second).max())
+        return result
+
+
+def missed_peaks(runs=40, rate=10):
+        """
+        Функция проверки поиска пиков при обработке с исходной частотой
+        записи rate: runs синтетических анализов с двумя пиками, центры
+        которых смещены от точек сигнала на случайную долю секунды
+
+        Возвращаемое значение:
+                int: число анализов, в которых найдено меньше двух пиков
+
+        """
+        import numpy as np
+        from . import synth
+        from .chromatogram import Chromatogram
+
+        rng = np.random.default_rng(2)
+        missed = 0
+        with _synthetic() as tmp:
+                for i in range(runs):
+                        t1, t2 = 190 + rng.random(), 210 + rng.random()
+                        filename = synth.write_run(
+                                os.path.join(tmp, 'run%d.txt' % i), 300, rate,
+                                peaks=[(t1, 3, 2.5), (t2, 2, 2.5)], seed=i)
+                        chrom = Chromatogram(filename, rate=None)
+                        missed += len(chrom.detect(175, 235)) < 2
+        return missed
+
+
+def _check_detection():
+        runs = 40
+        missed = missed_peaks(runs)
+        return ('пропущены пики в %d анализах из %d' % (missed, runs),
+                missed == 0)
+
+
+def asymmetry_error(centers=(190, 190.25, 190.5, 190.75), rate=1):
+        """
+        Функция проверки фактора асимметрии симметричных (гауссовых) пиков,
+        центры centers которых смещены от точек сигнала частоты rate
+        на долю секунды
+
+        Возвращаемое значение:
+                float: наибольшее отклонение фактора асимметрии от 1
+
+        """
+        from . import synth
+        from .chromatogram import Chromatogram
+
+        error = 0
+        with _synthetic() as tmp:
+                for i, center in enumerate(centers):
+                        filename = synth.write_run(
+                                os.path.join(tmp, 'sym%d.txt' % i), 300, 10,
+                                peaks=[(center, 3, 2.5)], noise=.002,
+                                drift=0, seed=1)
+                        chrom = Chromatogram(filename, rate=rate)
+                        chrom.process()
+                        for p in chrom.coords.values():
+                                error = max(error, abs(chrom.assym(p) - 1))
+        return error
+
+
+def _check_asymmetry():
+        error = asymmetry_error()
+        return ('|As - 1| = %.3f' % error, error <= ASYMMETRY_TOLERANCE)
+
+
+def retention_spread(runs=8, jitter=.4, rate=1):
+        """
+        Функция проверки разброса времени удерживания серии параллельных
+        анализов (модуль replicates): runs синтетических анализов,
+        вершины пиков которых смещены на случайную величину до jitter сек
+
+        Возвращаемое значение:
+                (sd, expected) - стандартное отклонение времени удерживания
+                пика серии и стандартное отклонение заданных смещений, сек
+
+        """
+        import numpy as np
+        from . import replicates, synth
+
+        rng = np.random.default_rng(3)
+        shifts = rng.uniform(-jitter, jitter, runs)
+        with _synthetic() as tmp:
+                files = [synth.write_run(os.path.join(tmp, 'rep%d.txt' % i),
+                                         300, 10,
+                                         peaks=[(190 + d, 3, 2.5),
+                                                (210 + d, 2, 2.5)],
+                                         seed=i)
+                         for i, d in enumerate(shifts)]
+                runs = replicates.load(files, rate)
+                stats = runs.statistics()
+                runs.close()
+        return stats['Этанол']['t']['sd'], float(np.std(shifts, ddof=1))
+
+
+def _check_retention():
+        sd, expected = retention_spread()
+        return ('СКО времени удерживания %.3f c (заданное %.3f c)'
+                % (sd, expected),
+                abs(sd - expected) <= RETENTION_TOLERANCE)
+
+
+# проверки точности: (название, функция () -> (описание, успешно))
+ACCURACY_CHECKS = (
+        ('detection', _check_detection),
+        ('asymmetry', _check_asymmetry),
+        ('retention', _check_retention),
+)
+
+
+def check_accuracy():
+        """
+        Функция выполнения проверок точности ACCURACY_CHECKS
+
+        Возвращаемое значение:
+                bool: True - все проверки пройдены
+
+        """
+        ok = True
+        for name, check in ACCURACY_CHECKS:
+                text, passed = check()
+                print('%-12s %-6s %s' % (name, 'ok' if passed else 'ОШИБКА',
+                                         text))
+                ok &= passed
+        return ok
+
+
+def _print_results(results, old=None):
+        if old is None:
+                for label, funcs in results['results'].items():
+                        for name, t in funcs.items():
+                                print('%-10s %-12s %10.3f мс'
+                                      % (label, name, t * 1e3))
+                return
+        for label, name, t_old, t, ratio in compare(old, results):
+                print('%-10s %-12s %10s %10.3f мс %8s'
+                      % (label, name,
+                         '-' if t_old is None else '%.3f' % (t_old * 1e3),
+                         t * 1e3,
+                         '-' if ratio is None else 'x%.2f' % ratio))
+
+
+def _parse_sizes(text):
+        # '300x10,3600x100' -> [(300, 10), (3600, 100)]
+        return [tuple(int(v) for v in size.split('x'))
+                for size in text.split(',')]
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(
+                prog='python -m GC.bench',
+                description='Измерение производительности модулей обработки')
+        parser.add_argument('--import-time', action='store_true',
+                            help='проверить время импорта модулей')
+        parser.add_argument('--memory', action='store_true',
+                            help='проверить память, занимаемую сигналом')
+        parser.add_argument('--baseline', action='store_true',
+                            help='сравнить базовую линию сигнала исходной '
+                                 'частоты и 1 Гц')
+        parser.add_argument('--accuracy', action='store_true',
+                            help='проверить точность обработки '
+                                 'синтетических анализов')
+        parser.add_argument('--sizes', type=_parse_sizes, default=SIZES,
+                            help='размеры синтетических файлов: '
+                                 'сек x Гц через запятую (300x10,3600x10)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='число повторов каждого измерения')
+        parser.add_argument('-o', '--output',
+                            help='файл JSON для сохранения результатов')
+        parser.add_argument('--compare',
+                            help='файл JSON с результатами прежнего запуска')
+        args = parser.parse_args(argv)
+
+        if args.import_time:
+                over = check_import_budget()
+                if over:
+                        print('Превышен бюджет времени импорта: '
+                              + ', '.join(over), file=sys.stderr)
+                        return 1
+                return 0
+        if args.memory:
+                if not check_memory():
+                        print('Выигрыш по памяти меньше заданного '
+                              '(%d раз)' % MEMORY_RATIO, file=sys.stderr)
+                        return 1
+                return 0
+        if args.baseline:
+                over = False
+                for rate, diff in baseline_rates().items():
+                        print('%4d Гц  %.4f пА' % (rate, diff))
+                        over |= diff > BASELINE_TOLERANCE
+                if over:
+                        print('Расхождение базовых линий больше %g пА'
+                              % BASELINE_TOLERANCE, file=sys.stderr)
+                        return 1
+                return 0
+        if args.accuracy:
+                return 0 if check_accuracy() else 1
+
+        results = run_suite(args.sizes, args.repeat)
+        old = None
+        if args.compare:
+                with open(args.compare, 'r', encoding='utf-8') as inf:
+                        old = json.load(inf)
+        _print_results(results, old)
+        if args.output:
+                with open(args.output, 'w', encoding='utf-8') as outf:
+                        json.dump(results, outf, ensure_ascii=False, indent=1)
+        return 0
+
+
+if __name__ == '__main__':
+        sys.exit(main())
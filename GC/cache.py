@@ -0,0 +1,223 @@
+"""
+Модуль cache
+============
+
+Модуль cache - дисковый кэш разобранных файлов с экспериментальными данными
+
+Для каждого файла в каталоге кэша хранятся два файла:
+        <ключ>.npy - числовые столбцы файла, массив формы (столбцы, точки)
+        <ключ>.json - сведения о файле (время изменения, размер, хэш
+                      содержимого, заголовок и названия столбцов)
+где ключ - хэш абсолютного пути к файлу
+
+Запись считается действительной, если совпадают время изменения и размер
+файла. Если время изменения отличается, а размер совпадает, сравнивается
+хэш содержимого - при совпадении запись используется повторно.
+Массив открывается через np.load(mmap_mode='r'), поэтому повторное открытие
+файла не требует ни разбора текста, ни копирования данных.
+Время изменения, размер и хэш содержимого фиксируются до разбора файла
+(snapshot): если файл изменился во время разбора, запись не сохраняется,
+чтобы данные старого содержимого не попали в кэш со сведениями нового.
+При превышении размера кэша MAX_SIZE удаляются давно не использованные записи
+
+Глобальные переменные
+---------------------
+        CACHE_DIR (str): каталог кэша, None - кэш отключен
+        MAX_SIZE (int): предельный размер кэша, байт
+
+Основные функции
+----------------
+        read(file) -> (dict, ndarray) | None
+        snapshot(file) -> dict | None
+        write(file, dict, ndarray, dict=None) -> None
+        content_hash(file) -> str
+        evict(int=None) -> None
+        clear() -> None
+
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+CACHE_DIR = os.environ.get('QC_CHROM_CACHE',
+                           os.path.join(os.path.expanduser('~'),
+                                        '.qc_chrom_cache'))
+MAX_SIZE = 256 * 1024 * 1024
+
+
+def _entry(filename):
+        # пути к файлам записи кэша для файла с данными
+        key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+        base = os.path.join(CACHE_DIR, key)
+        return base + '.npy', base + '.json'
+
+
+def content_hash(filename):
+        """
+        Функция расчета хэша содержимого файла (blake2b)
+
+        Возвращаемое значение:
+                str: шестнадцатеричное значение хэша
+
+        """
+        h = hashlib.blake2b(digest_size=16)
+        with open(filename, 'rb') as inf:
+                for chunk in iter(lambda: inf.read(1 << 20), b''):
+                        h.update(chunk)
+        return h.hexdigest()
+
+
+def read(filename):
+        """
+        Функция чтения записи кэша для файла filename
+
+        Возвращаемое значение:
+                (meta, table) - сведения о файле и массив столбцов,
+                открытый только для чтения через отображение в память;
+                None - запись отсутствует или устарела
+
+        """
+        if CACHE_DIR is None:
+                return None
+        npy, meta_path = _entry(filename)
+        try:
+                with open(meta_path, 'r', encoding='utf-8') as inf:
+                        meta = json.load(inf)
+                st = os.stat(filename)
+                if meta['size'] != st.st_size:
+                        return None
+                if meta['mtime_ns'] != st.st_mtime_ns:
+                        # файл перезаписан - проверяем содержимое
+                        if meta['hash'] != content_hash(filename):
+                                return None
+                        meta['mtime_ns'] = st.st_mtime_ns
+                        _write_meta(meta_path, meta)
+                table = np.load(npy, mmap_mode='r')
+                # отметка последнего использования записи для вытеснения
+                os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+                return None
+        return meta, table
+
+
+def snapshot(filename):
+        """
+        Функция получения сведений о состоянии файла filename перед
+        разбором (см. write)
+
+        Возвращаемое значение:
+                dict: {'size', 'mtime_ns', 'hash'} - размер, время
+                изменения и хэш содержимого файла; None - кэш отключен
+                или файл недоступен
+
+        """
+        if CACHE_DIR is None:
+                return None
+        try:
+                st = os.stat(filename)
+                digest = content_hash(filename)
+        except OSError:
+                return None
+        return {'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'hash': digest}
+
+
+def _tmp(path):
+        # временный файл записи, уникальный для процесса и потока:
+        # один файл может записываться одновременно из разных потоков
+        return '%s.%d-%d.tmp' % (path, os.getpid(), threading.get_ident())
+
+
+def _write_meta(meta_path, meta):
+        tmp = _tmp(meta_path)
+        with open(tmp, 'w', encoding='utf-8') as outf:
+                json.dump(meta, outf, ensure_ascii=False)
+        os.replace(tmp, meta_path)
+
+
+def write(filename, meta, table, state=None):
+        """
+        Функция записи разобранных данных файла filename в кэш
+        Принимает в качестве аргументов:
+        meta - словарь сведений о содержимом (заголовок, названия столбцов)
+        table - массив числовых столбцов формы (столбцы, точки)
+        state - состояние файла перед разбором (см. snapshot); если размер
+                или время изменения файла с тех пор изменились, запись
+                не сохраняется (None - состояние определяется при записи)
+        Ошибки записи (нет доступа, нет места) не прерывают обработку
+
+        """
+        if CACHE_DIR is None:
+                return
+        if state is None:
+                state = snapshot(filename)
+                if state is None:
+                        return
+        npy, meta_path = _entry(filename)
+        try:
+                st = os.stat(filename)
+                if (st.st_size, st.st_mtime_ns) != (state['size'],
+                                                    state['mtime_ns']):
+                        # файл изменился во время разбора
+                        return
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                meta = dict(meta, **state)
+                tmp = _tmp(npy)
+                with open(tmp, 'wb') as outf:
+                        np.save(outf, np.ascontiguousarray(table))
+                os.replace(tmp, npy)
+                _write_meta(meta_path, meta)
+        except OSError:
+                return
+        evict()
+
+
+def evict(max_size=None):
+        """
+        Функция вытеснения записей кэша
+        Удаляет давно не использованные записи, пока суммарный размер
+        кэша превышает max_size (по-умолчанию - MAX_SIZE)
+
+        """
+        if CACHE_DIR is None:
+                return
+        if max_size is None:
+                max_size = MAX_SIZE
+        entries = {}
+        try:
+                for f in os.scandir(CACHE_DIR):
+                        base, ext = os.path.splitext(f.path)
+                        if (ext not in ('.npy', '.json')
+                            or len(os.path.basename(base)) != 40):
+                                # не запись кэша (например, индекс scan)
+                                continue
+                        st = f.stat()
+                        size, used = entries.get(base, (0, 0))
+                        entries[base] = (size + st.st_size,
+                                         max(used, st.st_mtime))
+        except OSError:
+                return
+        total = sum(size for size, used in entries.values())
+        for base in sorted(entries, key=lambda b: entries[b][1]):
+                if total <= max_size:
+                        break
+                try:
+                        os.remove(base + '.json')
+                        os.remove(base + '.npy')
+                except OSError:
+                        # запись открыта другим процессом - пропускаем
+                        continue
+                total -= entries[base][0]
+
+
+def clear():
+        """
+        Функция полной очистки кэша
+
+        """
+        evict(0)
@@ -24,11 +24,11 @@ chrom содержит набор глобальных переменных, к
         ymax (int): конечная точка координат по оси y
         xmax (int): конечная точка координат по оси x
         
-* Словарь с данными хроматографирования, где: key - время (сек),
-  value - сигнал (рА)
+* Данные хроматографирования (series.Signal), где: ddict[t] - сигнал (рА)
+  в момент времени t (сек), ddict.array - массив сигнала
   Заполняется при запуске функции datachrom(filename)
 
-        ddict = {}
+        ddict = Signal()
         
 * Словарь, содержащий сведения об обнаруженных компонентах хроматограммы.
   По-умолчанию принимается, что хроматограмма может содержать либо 'Этанол',
@@ -55,6 +55,9 @@ chrom содержит набор глобальных переменных, к
   изменить участок, задав начальную и конечную координату диапазона в секундах
   
         wing_noise [int, int]
+
+  Если wing_noise = None, участок выбирается автоматически - самое
+  спокойное окно хроматограммы длительностью 20 сек (см. модуль noise)
         
 * Величина (амплитуда) фонового шума, определенная на участке wing_noise
   По-умолчанию = 0. Автоматически определяется в функции findpeaks(filename)
@@ -62,11 +65,28 @@ chrom содержит набор глобальных переменных, к
   
         noise (float)
 
+* Библиотека компонентов (library.Library, см. модуль library)
+  Если задана, функция findpeaks ищет пики по всей хроматограмме и
+  идентифицирует их по библиотеке вместо поиска Этанола и Ацетонитрила
+
+        library = None
+
+* Метод коррекции базовой линии ('asls', 'rolling_ball', см. модуль
+  baseline). Если задан, базовая линия вычитается из сигнала при загрузке
+  данных (datachrom, findpeaks) до поиска пиков и расчета параметров
+
+        correction = None
+
 *  Дата и время проведения анализа
 
         date_injection (str): дата анализа
         time_injection (str): время анализа
 
+Функции модуля являются обертками над классом chromatogram.Chromatogram,
+хранящим все данные обработки в атрибутах экземпляра. Для параллельной
+обработки нескольких файлов следует использовать непосредственно
+Chromatogram(file).process()
+
 Основные функции
 ----------------
         datachrom(file) -> dict
@@ -86,25 +106,22 @@ chrom содержит набор глобальных переменных, к
 
 """
 
-import re
-import time
-import datetime
-import math
-from statistics import mean
-from sympy.geometry import *
-from scipy.interpolate import InterpolatedUnivariateSpline
-from scipy.signal import find_peaks
+from .chromatogram import Chromatogram, ProcessingResult, myround
 
 ymin = 0
 ymax = 1
 xmax = 1
 
-# данные хроматографирования, где: key - время (сек), value - сигнал (рА)
-ddict = {}
+# хроматограмма, с которой работают функции модуля
+_current = Chromatogram()
+
+# данные хроматографирования (series.Signal): ddict[t] - сигнал (рА)
+# в момент времени t (сек)
+ddict = _current.ddict
 
 # компоненты хроматрограммы, где: key - компонент('Этанол', 'Ацетонитрил'),
 # value - список параметров [t-comp, H-comp, s/n]
-components = {}
+components = _current.components
 
 # ориентировочные времена выхода пиков
 time_ethanol = 190
@@ -119,10 +136,28 @@ wing_noise = [40, 60]
 # величина фонового шума, пА
 noise = 0
 
+# библиотека компонентов (None - поиск Этанола и Ацетонитрила)
+library = None
+
+# метод коррекции базовой линии (None - без коррекции)
+correction = None
+
 # дата и время хроматографирования
 date_injection = str()
 time_injection = str()
 
+def _sync():
+        # перенос состояния текущей хроматограммы в глобальные переменные
+        global time_ethanol, time_acn, wing_L, wing_R, noise
+        global date_injection, time_injection
+        time_ethanol = _current.time_ethanol
+        time_acn = _current.time_acn
+        wing_L = _current.wing_L
+        wing_R = _current.wing_R
+        noise = _current.noise
+        date_injection = _current.date_injection
+        time_injection = _current.time_injection
+
 def datachrom(filename):
         """
         Принимает в качестве аргумента filename путь к файлу с данными
@@ -130,29 +165,14 @@ def datachrom(filename):
         Усредняет значения данных до частоты 1 Гц и заполняет словарь ddict
 
         Возвращаемое значение:
-                ddict (dict): словарь, где ключ - время, значение - сигнал
+                ddict (Signal): сигнал, ddict[t] - сигнал в момент t, сек
 
         """
-        L = []
         ddict.clear()
+        _current.correction = correction
         try:
-                with open(filename, 'r') as inf:
-                        for line in inf:
-                                L.append(line.strip())
-                        global date_injection, time_injection
-                        date_time = re.search(r"\d\d.\d\d.\d{4} \d\d.\d\d",
-                                              L[0]).group()
-                        date_injection = date_time.split()[0]
-                        time_injection = date_time.split()[1]
-                
-                        for i in range(2, len(L)-2, 10):
-                                signal_average = []
-                                for j in range(10):
-                                        a = [_.start() for _ in re.finditer('\t', L[i+j])]
-                                        signal_average.append(float((L[i+j][a[0]+1:a[1]])))
-                                signal_average = round(sum(signal_average)/10, 3)
-                                m_s_format = int((i - 2) / 10)
-                                ddict[m_s_format] = signal_average
+                _current.datachrom(filename)
+                _sync()
                 print('Экспериментальные данные успешно получены')
                 return ddict
         except FileNotFoundError:
@@ -165,6 +185,8 @@ def findpeaks(filename):
         По-умолчанию времена удерживания:
         Этанол - 190 сек (3'10")
         Ацетонитрил - 210 сек (3'30")
+        Если задана библиотека компонентов library, пики ищутся по всей
+        хроматограмме и идентифицируются по библиотеке
         
         Возвращаемое значение:
         
@@ -178,52 +200,13 @@ def findpeaks(filename):
                         }
         
         """
-        global noise, time_ethanol, time_acn
         # получение набора экспериментальных данных
         datachrom(filename)
-        components.clear()
-        # определение присутствующих компонентов
-        fpeaks()
-        # определение величины фонового шума
-        noise = myround(gcnoise(filename))
-        
-        if str('Этанол') not in components:
-                print('Пик этанола не обнаружен')
-                time_ethanol = None
-        else:
-                ethanol_coo = peak_xy(time_ethanol)
-                ethanol_H = peakheight(ethanol_coo)
-                A = assym(ethanol_coo, ethanol_H)
-                N = plates(ethanol_coo, ethanol_H)
-                components['Этанол'] = [{'t, c': time_ethanol},
-                                        {'H, пA': myround(ethanol_H)},
-                                        {'S, пA*с': myround(integration(time_ethanol))},
-                                        {'S/N': myround(2 * ethanol_H / noise)},
-                                        {'A[sub]s[/sub]': myround(A)},
-                                        {'N, тарелок': round(N)},
-                                        {'R[sub]s[/sub]': str(' - ')}]
-        if str('Ацетонитрил') not in components:
-                print('Пик ацетонитрила не обнаружен')
-                time_acn = None
-        else:
-                acn_coo = peak_xy(time_acn)
-                acn_H = peakheight(acn_coo)
-                A = assym(acn_coo, acn_H)
-                N = plates(acn_coo, acn_H)
-                if time_ethanol is not None:
-                        Rs = myround(resolution(ethanol_coo,
-                                                acn_coo,
-                                                ethanol_H,
-                                                acn_H))
-                else:
-                        Rs = str(' - ')
-                components['Ацетонитрил'] = [{'t, c': time_acn},
-                                             {'H, пA': myround(acn_H)},
-                                             {'S, пA*с': myround(integration(time_acn))},
-                                             {'S/N': myround(2 * acn_H / noise)},
-                                             {'A[sub]s[/sub]': myround(A)},
-                                             {'N, тарелок': round(N)},
-                                             {'R[sub]s[/sub]': Rs}]
+        _current.wing_noise = (list(wing_noise)
+                               if wing_noise is not None else None)
+        _current.library = library
+        _current.process()
+        _sync()
         return components
         
         
@@ -241,28 +224,7 @@ def integration(peaktime, filename=None):
         """
         if filename is not None:
                 datachrom(filename)
-
-        if peaktime is not None:
-                
-                points = peak_xy(peaktime)
-                start_point = [points[0], points[1]]
-                end_point = [points[4], points[5]]
-                x = []
-                y = []
-                x2 = [start_point[0], end_point[0]]
-                y2 = [start_point[1], end_point[1]]
-                for k, v in ddict.items():
-                        while k in [i for i in range(start_point[0],
-                                                     end_point[0] + 1)]:  
-                                x.append(k)
-                                y.append(v)
-                                break
-                S1 = InterpolatedUnivariateSpline(x, y, k=1)
-                S2 = InterpolatedUnivariateSpline(x2, y2, k=1)
-                S_all = S1.integral(x[0], x[-1])
-                S_down = S2.integral(x2[0], x2[-1])
-                S = S_all - S_down
-                return S
+        return _current.integration(peaktime)
         
 
 def gcnoise(filename):
@@ -275,49 +237,15 @@ def gcnoise(filename):
                 noise (float): величина (амплитуда) фонового шума
         
         """
-        L = []
-        datas = []
-        with open(filename, 'r') as inf:
-                for line in inf:
-                        L.append(line.strip())
-                        
-                # шум определяется на выбранно участке wing_noise:[start, end]
-                for i in L[wing_noise[0] * 10:wing_noise[1] * 10]:               
-                       a = [_.start() for _ in re.finditer('\t', i)]
-                       datas.append(float(i[(a[0]+1):(a[1])]))
-        # удаляем статистические выбросы макс и мин сигнала
-        datas.remove(max(datas))
-        datas.remove(min(datas))
-        
-        # значение шума хроматограммы - амплитуда шумовых колебаний
-        noise = max(datas) - min(datas)
-        return noise
+        gc = Chromatogram(wing_noise=wing_noise)
+        gc.filename = filename
+        return gc.gcnoise()
 
 
 
 def gchrom_time(filename):
 # представление данных хроматограммы в формате: [мин:сек, сигнал]
-        L = []
-        time_signal = []
-        
-        with open(filename, 'r') as inf:
-                for line in inf:
-                        L.append(line.strip())
-                
-                for i in range(2, len(L)-2, 10):
-                        signal_average = []
-                        for j in range(10):
-                                a = [_.start() for _ in re.finditer('\t', L[i+j])]
-                                signal_average.append(float((L[i+j][a[0]+1:a[1]])))
-                        
-                        signal_average = round(sum(signal_average)/10, 3)
-                        
-                        try:    m_s_format = datetime.time(minute=int((i-2)/10)//60, second=int((i-2)/10)%60).strftime('%M:%S')
-                                
-                        except ValueError:
-                                print('Хроматограмма более часа')
-                        time_signal.append([m_s_format, signal_average])
-        return time_signal
+        return Chromatogram(filename).gchrom_time()
 
 
 def gchrom_sec(filename):
@@ -335,27 +263,10 @@ def gchrom_sec(filename):
 
         """
         global ymin, ymax, xmax
-        L = []
-        seconds_signal = []
-        signal_list = []
         try:
-                with open(filename, 'r') as inf:
-                        for line in inf:
-                                L.append(line.strip())
-                
-                        for i in range(2, len(L)-2, 10):
-                                signal_average = []
-                                for j in range(10):
-                                        a = [_.start() for _ in re.finditer('\t', L[i+j])]
-                                        signal_average.append(float((L[i+j][a[0]+1:a[1]])))
-                                        
-                                signal_average = round(sum(signal_average)/10, 3)
-                                m_s_format = int((i - 2) / 10)
-                                signal_list.append(signal_average)
-                                seconds_signal.append([m_s_format, signal_average])
-                        ymin = min(signal_list)
-                        ymax = max(signal_list)
-                        xmax = len(signal_list)
+                gc = Chromatogram(filename)
+                seconds_signal = gc.gchrom_sec()
+                ymin, ymax, xmax = gc.ymin, gc.ymax, gc.xmax
                 return seconds_signal
         
         except FileNotFoundError:
@@ -381,33 +292,7 @@ def peak_xy(peaktime):
         s3 - конечный сигнал (конечная точка базовой линии пика)
 
         """
-        # определение начальной точки левого крыла пика
-        peak_wing_left = [i for i in range(peaktime, peaktime - 15, -1)]
-        start_peak_s = min([ddict[i] for i in peak_wing_left])
-        for i in peak_wing_left:
-                if start_peak_s == ddict[i]:
-                        start_peak_t = i
-
-        # определение конечной точки пика, правое крыло
-        if len(components) == 1:
-                # обнаружен только один компонент
-                peak_wing_right = [i for i in range(peaktime, 240, 1)]
-                end_peak_s = min([ddict[i] for i in peak_wing_right])
-                for i in peak_wing_right:
-                        if end_peak_s == ddict[i]:
-                                end_peak_t = i
-        else:
-                # для двухкомпонентной смеси
-                peak_wing_right = [i for i in range(peaktime, peaktime + 20, 1)]
-                end_peak_s = min([ddict[i] for i in peak_wing_right])
-                for i in peak_wing_right:
-                        if end_peak_s == ddict[i]:
-                                end_peak_t = i
-        peak_t = peaktime
-        peak_s = ddict[peaktime]
-
-        return [start_peak_t, start_peak_s, peak_t,
-                peak_s, end_peak_t, end_peak_s]
+        return _current.peak_xy(peaktime)
 
 def peakheight(p):
         """
@@ -420,22 +305,9 @@ def peakheight(p):
                 H (float): высота аналитического сигнала 
 
         """
-        startpeak = Point(p[0], p[1]) 
-        toppeak = Point(p[2], p[3])
-        endpeak = Point(p[4], p[5])
-        
-        if (startpeak == toppeak or
-            toppeak == endpeak or
-            startpeak == endpeak):
-                return 0
-        else:
-                global wing_L, wing_R
-                wing_L = toppeak[0] - startpeak[0]
-                wing_R = endpeak[0] - toppeak[0]
-                h = (endpeak[1] - startpeak[1]) * wing_L / (wing_L + wing_R)
-                ordinate_h =  h + startpeak[1]
-                H = float(toppeak[1] - ordinate_h)
-                return H
+        H = _current.peakheight(p)
+        _sync()
+        return H
 
 def fpeaks(filename=None):
         """
@@ -446,28 +318,10 @@ def fpeaks(filename=None):
         Заполняется параметр времени выхода компонента
 
         """
-        global components, time_ethanol, time_acn
-        time_ethanol = 190
-        time_acn = 210
         if filename is not None:
                 datachrom(filename)
-        peaks, heights = find_peaks([x for x in ddict.values()],
-                                    height=0,
-                                    prominence=.05,
-                                    distance=15,
-                                    threshold=.005
-                                    )
-        t = [i for i in range(175, 235) if i in peaks]
-        for i in t:
-                if abs(time_ethanol - i) < abs(time_acn - i):
-                        time_ethanol = i
-                        components.update(Этанол={'t, c': time_ethanol})
-                elif abs(time_ethanol - i) == abs(time_acn - i):
-                        components.update(Компонент={})
-                        print('Необходимо уточнение компонента')
-                else:
-                        time_acn = i
-                        components.update(Ацетонитрил={'t, c': time_acn})
+        _current.fpeaks()
+        _sync()
         return
 
 def assym(p, H=None):
@@ -482,13 +336,8 @@ def assym(p, H=None):
                 A (float): фактор асимметрии пика
 
         """
-        if H is None:
-                H = peakheight(p)
-                
-        pp = Wx(p, .05, H)
-        w005 = pp[0]
-        f = p[2] - pp[1]
-        A = w005 / (2 * f)
+        A = _current.assym(p, H)
+        _sync()
         return A
 
 def plates(p, H=None):
@@ -503,9 +352,8 @@ def plates(p, H=None):
                 N (float): количество теоретических тарелок 
 
         """
-        if H is None:
-                H = peakheight(p)
-        N = 5.54 * (p[2] / Wx(p, .5, H)[0]) ** 2
+        N = _current.plates(p, H)
+        _sync()
         return N
 
 def resolution(p1, p2, H1=None, H2=None):
@@ -521,15 +369,8 @@ def resolution(p1, p2, H1=None, H2=None):
                 Rs (float): разрешение двух пиков
 
         """
-        if H1 is None:
-                H1 = peakheight(p)
-        if H2 is None:
-                H2 = peakheight(p)
-        tr1 = p1[2]
-        tr2 = p2[2]
-        w051 = Wx(p1, .5, H1)[0]
-        w052 = Wx(p2, .5, H2)[0]
-        Rs = 1.18 * (tr2 - tr1) / (w051 + w052)
+        Rs = _current.resolution(p1, p2, H1, H2)
+        _sync()
         return Rs
 
 def Wx(p, x, H=None):
@@ -548,41 +389,7 @@ def Wx(p, x, H=None):
         rpoint - координата крайней правой точки пика на заданной высоте
 
         """
-        if H is None:
-                H = peakheight(p)
-        h = H * x
-        lpoint = p[0]
-        rpoint = p[4]
-
-        def line(x):
-              y = ((x - p[0])/(p[4] - p[0])) * (p[5] - p[1]) + p[1]
-              return y
-
-        for x, y in ddict.items():
-                while x in [i for i in range(p[0], p[2])]:
-                        if ((ddict[x - 1] - line(x - 1)) < h
-                                <= (y - line(x))):
-                                lpoint = x
-                        break
-        for x, y in ddict.items():
-                while x in [i for i in range(p[2], p[4])]:
-                        if  ((ddict[x - 1] - line(x - 1)) >= h
-                             > (y - line(x))):
-                                rpoint = x
-                        break
-        Wx = rpoint - lpoint
-        return [Wx, lpoint, rpoint]
+        W = _current.Wx(p, x, H)
+        _sync()
+        return W
         
-
-def myround(x):
-        """
-        Функция округления аргумента до 3-х значащих цифр
-
-        """
-        if not int(x):
-                return round(x, 3)
-        if len(str(abs(int(x)))) >= 3:
-                x = int(round(x))
-        return round(x, 3 - len(str(abs(int(x)))))
-
-
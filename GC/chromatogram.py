@@ -0,0 +1,922 @@
+"""
+Модуль chromatogram
+===================
+
+Модуль chromatogram - объектный интерфейс расчета хроматографических
+параметров
+
+Все данные обработки одного файла (сигнал, найденные компоненты, шум,
+ширина плечей пиков, диапазон графика, дата анализа) хранятся в атрибутах
+экземпляра Chromatogram, а не в глобальных переменных. Поэтому несколько
+файлов могут обрабатываться одновременно в разных потоках, и результаты
+одного файла не переходят в обработку другого.
+Функции модуля chrom являются тонкими обертками над этим классом
+
+Обработка не зависит от частоты записи прибора: сигнал приводится
+к частоте rate (по-умолчанию 1 Гц) функцией loader.resample, все окна
+поиска пиков задаются в секундах и пересчитываются в номера точек.
+При rate=None обработка выполняется на исходной частоте записи
+
+Если задана библиотека компонентов (модуль library), пики ищутся по всей
+хроматограмме, и каждый пик идентифицируется по библиотеке; иначе ищутся
+только пики Этанола и Ацетонитрила в диапазоне 175-235 сек
+
+Если задан метод коррекции базовой линии (модуль baseline), базовая линия
+вычитается из сигнала при загрузке, и высоты, площади и ширины пиков
+рассчитываются по исправленному сигналу
+
+Файл может содержать несколько каналов детекторов: обрабатывается канал
+channel (по-умолчанию - первый), функция process_channels обрабатывает
+несколько или все каналы файла параллельно
+
+Глобальные переменные
+---------------------
+        PEAK_DISTANCE (float): наименьшее расстояние между пиками, сек
+        PEAK_PROMINENCE (float): наименьшая выделенность пика, пА
+        PEAK_THRESHOLD (float): наименьший перепад между вершиной пика
+                и точками за 1 сек до и после нее, пА
+
+Основные классы
+---------------
+        Chromatogram(file=None, wing_noise=[40, 60],
+                     time_ethanol=190, time_acn=210, rate=1, method='mean',
+                     library=None, noise_method='p2p', correction=None,
+                     fit=None, channel=None)
+        ProcessingResult
+
+Основные функции
+----------------
+        process_channels(file, list=None, int=None, **options) -> dict
+
+Пример:
+
+        result = Chromatogram('run.txt').process()
+        result.components['Этанол']
+
+Модуль импортирует только numpy, подмодули scipy загружаются при первом
+обращении к использующим их функциям
+
+"""
+
+import numpy as np
+
+from . import baseline
+from . import deconvolve
+from . import integrate
+from . import loader
+from . import noise
+from . import timing
+from .series import Signal
+
+# пороги поиска пиков (см. Chromatogram.detect)
+PEAK_DISTANCE = 15
+PEAK_PROMINENCE = .05
+PEAK_THRESHOLD = .005
+
+
+def myround(x):
+        """
+        Функция округления аргумента до 3-х значащих цифр
+
+        """
+        if not int(x):
+                return round(x, 3)
+        if len(str(abs(int(x)))) >= 3:
+                x = int(round(x))
+        return round(x, 3 - len(str(abs(int(x)))))
+
+
+class ProcessingResult:
+        """
+        Результаты обработки одного файла
+
+        Атрибуты:
+                filename (str): путь к файлу с данными
+                date_injection (str): дата анализа
+                time_injection (str): время анализа
+                components (dict): обнаруженные компоненты и их параметры
+                        в формате функции chrom.findpeaks
+                noise (float): величина фонового шума
+                time_ethanol (int): время удерживания этанола (None - нет пика)
+                time_acn (int): время удерживания ацетонитрила (None - нет пика)
+                fits (dict): параметры пиков после разделения аппроксимацией
+                        {компонент: {'S', 't', 'H', 'W', ...}} (None -
+                        разделение не выполнялось, см. Chromatogram.deconvolve)
+                channel (str): название канала детектора (None - канал
+                        по-умолчанию)
+
+        """
+        # краткие имена параметров компонента в порядке chrom.findpeaks
+        PARAMS = ('t', 'H', 'S', 'S/N', 'As', 'N', 'Rs')
+        # параметры разделенных пиков: (столбец таблицы, ключ fits)
+        FIT_PARAMS = (('t fit', 't'), ('H fit', 'H'), ('S fit', 'S'),
+                      ('W fit', 'W'), ('fit ok', 'resolved'))
+
+        def __init__(self, filename, date_injection, time_injection,
+                     components, noise, time_ethanol, time_acn, fits=None,
+                     channel=None):
+                self.filename = filename
+                self.date_injection = date_injection
+                self.time_injection = time_injection
+                self.components = components
+                self.noise = noise
+                self.time_ethanol = time_ethanol
+                self.time_acn = time_acn
+                self.fits = fits
+                self.channel = channel
+
+        def rows(self):
+                """
+                Представление результатов в виде таблицы: по одной строке
+                на каждый компонент с рассчитанными параметрами
+
+                Возвращаемое значение:
+                        list of dict: {'file', 'date', 'time', 'component',
+                                       't', 'H', 'S', 'S/N', 'As', 'N', 'Rs'},
+                        отсутствующее значение параметра - None
+                        Если выполнялось разделение пиков, добавляются
+                        't fit', 'H fit', 'S fit', 'W fit' и 'fit ok'
+                        (1 - остаток аппроксимации не выше шума, 0 - пик
+                        не разделен); если задан канал - 'channel'
+
+                """
+                rows = []
+                for name, params in self.components.items():
+                        if not isinstance(params, list):
+                                # компонент не идентифицирован
+                                continue
+                        row = {'file': self.filename,
+                               'date': self.date_injection,
+                               'time': self.time_injection,
+                               'component': name}
+                        if self.channel is not None:
+                                row['channel'] = self.channel
+                        for key, param in zip(self.PARAMS, params):
+                                value, = param.values()
+                                if isinstance(value, str):
+                                        value = None
+                                row[key] = value
+                        if self.fits is not None:
+                                fit = self.fits.get(name, {})
+                                for key, param in self.FIT_PARAMS:
+                                        value = fit.get(param)
+                                        if isinstance(value, bool):
+                                                value = int(value)
+                                        row[key] = (myround(value)
+                                                    if value is not None
+                                                    else None)
+                        rows.append(row)
+                return rows
+
+        def __repr__(self):
+                return ('ProcessingResult(%r, components=%r)'
+                        % (self.filename, list(self.components)))
+
+
+class Chromatogram:
+        """
+        Хроматограмма одного файла с экспериментальными данными
+        Принимает в качестве аргументов:
+        filename - путь к файлу с данными (default - None, данные
+                   загружаются позднее методом datachrom)
+        wing_noise - диапазон окна расчета фонового шума [сек, сек]
+                     (None - самый спокойный участок хроматограммы)
+        time_ethanol, time_acn - ориентировочные времена выхода пиков, сек
+        rate - частота обработки сигнала, Гц (None - исходная частота
+               записи файла, частота выше исходной снижается до нее)
+        method - способ приведения к частоте rate ('mean', 'decimate',
+                 см. loader.resample)
+        library - библиотека компонентов library.Library (None - поиск
+                  только Этанола и Ацетонитрила)
+        noise_method - метод расчета шума ('p2p', 'rms', 'astm',
+                       см. модуль noise)
+        correction - метод коррекции базовой линии ('asls', 'rolling_ball',
+                     см. модуль baseline; None - без коррекции)
+        fit - форма пиков для разделения перекрывающихся пиков
+              аппроксимацией ('gauss', 'emg', см. модуль deconvolve;
+              None - без разделения)
+        channel - канал детектора: номер канала или название столбца
+                  (None - первый канал, см. loader.RunData.channel)
+
+        Атрибуты экземпляра соответствуют глобальным переменным модуля chrom:
+        ddict, components, noise, time_ethanol, time_acn, wing_L, wing_R,
+        ymin, ymax, xmax, date_injection, time_injection
+        noise_range - участок, на котором рассчитан шум [сек, сек]
+        background - вычтенная базовая линия (None - без коррекции)
+        coords - координаты пиков компонентов {компонент: peak_xy}
+        Времена пиков задаются в секундах, ddict - сигнал (series.Signal,
+        номера точек при частоте 1 Гц совпадают с временем, сек)
+        signal, time - массивы сигнала и времени точек ddict
+
+        """
+        def __init__(self, filename=None, wing_noise=(40, 60),
+                     time_ethanol=190, time_acn=210, rate=1, method='mean',
+                     library=None, noise_method='p2p', correction=None,
+                     fit=None, channel=None):
+                self.filename = filename
+                self.wing_noise = (list(wing_noise)
+                                   if wing_noise is not None else None)
+                self.expected_ethanol = time_ethanol
+                self.expected_acn = time_acn
+                self.rate = rate
+                self.method = method
+                self.library = library
+                self.noise_method = noise_method
+                self.noise_range = None
+                self.correction = correction
+                self.background = None
+                self.fit = fit
+                self.channel = channel
+                self.coords = {}
+                self._center = 0.
+
+                self.ddict = Signal(step=1 / rate if rate else 1)
+                self.components = {}
+                self.time_ethanol = time_ethanol
+                self.time_acn = time_acn
+                self.wing_L = 15
+                self.wing_R = 40
+                self.noise = 0
+                self.ymin = 0
+                self.ymax = 1
+                self.xmax = 1
+                self.date_injection = str()
+                self.time_injection = str()
+                if filename is not None:
+                        self.datachrom(filename)
+
+        def _resampled(self):
+                """
+                Приведение сигнала файла к частоте обработки rate
+
+                Возвращаемое значение:
+                        (time, signal) - массивы времени, сек, и сигнала
+
+                """
+                run = loader.load(self.filename)
+                if self.rate is None or self.rate > run.rate:
+                        # частота обработки не выше частоты записи
+                        self.rate = run.rate
+                # точка после усреднения отнесена к началу интервала,
+                # середина интервала смещена на _center сек
+                self._center = 0.
+                if self.method == 'mean':
+                        self._center = max(.5 * (1 / self.rate - 1 / run.rate),
+                                           0.)
+                return run.resample(self.rate, self.method, self.channel)
+
+        @property
+        def signal(self):
+                return self.ddict.array
+
+        @property
+        def time(self):
+                return self.ddict.time
+
+        @timing.stage()
+        def datachrom(self, filename=None):
+                """
+                Загрузка данных файла filename (по-умолчанию - self.filename)
+                Определяет дату и время проведения анализа
+                Приводит данные к частоте rate, вычитает базовую линию
+                (если задан метод correction) и заполняет ddict
+
+                Возвращаемое значение:
+                        ddict (Signal): сигнал, ddict[i] - сигнал точки i
+
+                """
+                if filename is not None:
+                        self.filename = filename
+                run = loader.load(self.filename)
+                self.date_injection = run.date_injection
+                self.time_injection = run.time_injection
+                self.ddict.clear()
+                time, signal = self._resampled()
+                self.background = None
+                if self.correction is not None:
+                        self.background = baseline.estimate(
+                                signal, self.rate, self.correction)
+                        signal = signal - self.background
+                # объект ddict сохраняется (ссылка chrom.ddict)
+                self.ddict.assign(signal, step=1 / self.rate, time=time)
+                return self.ddict
+
+        @timing.stage()
+        def process(self):
+                """
+                Автоматический поиск пиков Этанола и Ацетонитрила и расчет
+                их параметров (см. chrom.findpeaks)
+
+                Возвращаемое значение:
+                        ProcessingResult: результаты обработки
+
+                """
+                if not self.ddict:
+                        self.datachrom()
+                self.components.clear()
+                self.coords.clear()
+                if self.library is not None:
+                        return self._process_library()
+                # определение присутствующих компонентов
+                self.fpeaks()
+                # определение величины фонового шума
+                self.noise = myround(self.gcnoise())
+                noise = self.noise
+                # площади всех обнаруженных пиков
+                found = [t for name, t in (('Этанол', self.time_ethanol),
+                                           ('Ацетонитрил', self.time_acn))
+                         if name in self.components]
+                S = dict(zip(found, self.areas(found).tolist()))
+
+                if str('Этанол') not in self.components:
+                        print('Пик этанола не обнаружен')
+                        self.time_ethanol = None
+                else:
+                        ethanol_coo = self.peak_xy(self.time_ethanol)
+                        self.coords['Этанол'] = ethanol_coo
+                        ethanol_H = self.peakheight(ethanol_coo)
+                        A = self.assym(ethanol_coo, ethanol_H)
+                        N = self.plates(ethanol_coo, ethanol_H)
+                        self.components['Этанол'] = [
+                                {'t, c': self.time_ethanol},
+                                {'H, пA': myround(ethanol_H)},
+                                {'S, пA*с': myround(S[self.time_ethanol])},
+                                {'S/N': myround(2 * ethanol_H / noise)},
+                                {'A[sub]s[/sub]': myround(A)},
+                                {'N, тарелок': round(N)},
+                                {'R[sub]s[/sub]': str(' - ')}]
+                if str('Ацетонитрил') not in self.components:
+                        print('Пик ацетонитрила не обнаружен')
+                        self.time_acn = None
+                else:
+                        acn_coo = self.peak_xy(self.time_acn)
+                        self.coords['Ацетонитрил'] = acn_coo
+                        acn_H = self.peakheight(acn_coo)
+                        A = self.assym(acn_coo, acn_H)
+                        N = self.plates(acn_coo, acn_H)
+                        if self.time_ethanol is not None:
+                                Rs = myround(self.resolution(ethanol_coo,
+                                                             acn_coo,
+                                                             ethanol_H,
+                                                             acn_H))
+                        else:
+                                Rs = str(' - ')
+                        self.components['Ацетонитрил'] = [
+                                {'t, c': self.time_acn},
+                                {'H, пA': myround(acn_H)},
+                                {'S, пA*с': myround(S[self.time_acn])},
+                                {'S/N': myround(2 * acn_H / noise)},
+                                {'A[sub]s[/sub]': myround(A)},
+                                {'N, тарелок': round(N)},
+                                {'R[sub]s[/sub]': Rs}]
+                return self._result()
+
+        def _process_library(self):
+                """
+                Поиск пиков по всей хроматограмме, идентификация пиков
+                по библиотеке компонентов и расчет их параметров
+                Окончание пика ищется до вершины следующего пика,
+                но не далее 20 сек от вершины
+
+                Возвращаемое значение:
+                        ProcessingResult: результаты обработки
+
+                """
+                peaks = self.detect()
+                found = self.identify(peaks)
+                self.noise = myround(self.gcnoise())
+                noise = self.noise
+
+                coords = {}
+                for name, t in found.items():
+                        right = t + 20
+                        later = [i for i in peaks if i > t]
+                        if later:
+                                right = min(right, later[0])
+                        coords[name] = self.peak_xy(t, right=right)
+                self.coords.update(coords)
+                S = self._point_areas(list(coords.values())).tolist()
+
+                prev = None
+                for (name, p), area in zip(coords.items(), S):
+                        H = self.peakheight(p)
+                        A = self.assym(p, H)
+                        N = self.plates(p, H)
+                        Rs = str(' - ')
+                        if prev is not None:
+                                Rs = myround(self.resolution(prev[0], p,
+                                                             prev[1], H))
+                        prev = (p, H)
+                        self.components[name] = [
+                                {'t, c': p[2]},
+                                {'H, пA': myround(H)},
+                                {'S, пA*с': myround(area)},
+                                {'S/N': myround(2 * H / noise)},
+                                {'A[sub]s[/sub]': myround(A)},
+                                {'N, тарелок': round(N)},
+                                {'R[sub]s[/sub]': Rs}]
+                self.time_ethanol = found.get('Этанол')
+                self.time_acn = found.get('Ацетонитрил')
+                return self._result()
+
+        def _result(self):
+                # результаты обработки, при заданной форме fit -
+                # с параметрами разделенных пиков
+                fits = self.deconvolve(self.fit) if self.fit else None
+                channel = self.channel
+                if isinstance(channel, int):
+                        channel = loader.load(self.filename).channels[channel]
+                return ProcessingResult(self.filename,
+                                        self.date_injection,
+                                        self.time_injection,
+                                        dict(self.components),
+                                        self.noise,
+                                        self.time_ethanol,
+                                        self.time_acn,
+                                        fits,
+                                        channel)
+
+        @timing.stage(imports=('scipy.optimize', 'scipy.special'))
+        def deconvolve(self, shape='gauss'):
+                """
+                Разделение пиков обнаруженных компонентов аппроксимацией
+                суммой пиков формы shape ('gauss', 'emg') после process
+                Время усредненных точек - середина интервала усреднения
+                Группы соприкасающихся пиков аппроксимируются
+                последовательно, пики, не найденные при обработке,
+                добавляются по остатку выше шума noise (см. модуль
+                deconvolve) с именем 'Пик <время вершины>'
+
+                Возвращаемое значение:
+                        dict: {компонент: {'S': площадь, 't': время вершины,
+                               'H': высота, 'W': ширина на половине высоты,
+                               'mu', 'sigma', 'tau', 'residual', 'resolved',
+                               'extra'}}
+
+                """
+                names = list(self.coords)
+                fitted = deconvolve.deconvolve(self.time + self._center,
+                                               self._array(),
+                                               [self._shift(p) for p
+                                                in self.coords.values()],
+                                               shape, self.noise or None)
+                names += ['Пик %s' % myround(peak['t'])
+                          for peak in fitted[len(names):]]
+                return dict(zip(names, fitted))
+
+        def _shift(self, p):
+                # координаты пика p на оси середин интервалов усреднения
+                return [p[0] + self._center, p[1], p[2] + self._center,
+                        p[3], p[4] + self._center, p[5]]
+
+        def integration(self, peaktime, method='trapezoid', baseline='valley'):
+                """
+                Интегрирование пика с временем удерживания peaktime
+                method, baseline - метод интегрирования и базовая линия
+                (см. модуль integrate)
+
+                Возвращаемое значение:
+                        S (float): площадь пика
+
+                """
+                if peaktime is None:
+                        return
+                return float(self.areas([peaktime], method, baseline)[0])
+
+        def areas(self, peaktimes, method='trapezoid', baseline='valley'):
+                """
+                Интегрирование всех пиков с временами удерживания peaktimes
+                за один проход по сигналу
+
+                Возвращаемое значение:
+                        ndarray: площади пиков
+
+                """
+                points = [self.peak_xy(t) for t in peaktimes]
+                return self._point_areas(points, method, baseline)
+
+        @timing.stage('integration', imports=('scipy.integrate',))
+        def _point_areas(self, points, method='trapezoid', baseline='valley'):
+                # площади пиков по координатам peak_xy, для равномерной
+                # шкалы - по шагу без массива времени
+                signal = self._array()
+                time = self.ddict.step if self.ddict.regular else self.time
+                return integrate.peak_areas(signal,
+                                            [self._index(p[0]) for p in points],
+                                            [self._index(p[4]) for p in points],
+                                            time,
+                                            method=method,
+                                            baseline=baseline)
+
+        @timing.stage()
+        def gcnoise(self):
+                """
+                Расчет величины шума на участке wing_noise по разобранному
+                сигналу файла (без усреднения)
+                Если участок не задан, выбирается самый спокойный участок
+                хроматограммы, выбранный участок - атрибут noise_range
+
+                Возвращаемое значение:
+                        noise (float): величина (амплитуда) фонового шума
+
+                """
+                run = loader.load(self.filename)
+                value, self.noise_range = noise.estimate(
+                        run.channel(self.channel), run.time, self.wing_noise,
+                        self.noise_method)
+                return value
+
+        def gchrom_time(self):
+                """
+                Представление данных хроматограммы в формате [мин:сек, сигнал]
+
+                """
+                time, signal = self._resampled()
+                if len(time) and time[-1] >= 3600:
+                        print('Хроматограмма более часа')
+                return [['%02d:%02d' % divmod(int(t), 60), s]
+                        for t, s in zip(time.tolist(), signal.tolist())]
+
+        def gchrom_sec(self):
+                """
+                Представление данных в виде списка координат [t, s]
+                Устанавливает значения атрибутов ymin, ymax, xmax
+
+                Возвращаемое значение:
+                        seconds_signal (list): список координат графика [int, float]
+
+                """
+                time, signal = self._resampled()
+                self.ymin = float(signal.min())
+                self.ymax = float(signal.max())
+                self.xmax = _seconds(len(signal) / self.rate)
+                return [[_seconds(t), s]
+                        for t, s in zip(time.tolist(), signal.tolist())]
+
+        @timing.stage()
+        def peak_xy(self, peaktime, right=None):
+                """
+                Определение координат точек пика с временем удерживания
+                peaktime (сек)
+                right - граница поиска окончания пика, сек (по-умолчанию
+                        240 сек для одного компонента, peaktime + 20 сек
+                        для двухкомпонентной смеси)
+
+                Возвращаемое значение:
+                        [t1, s1, t2, s2, t3, s3] - начало пика, вершина пика,
+                        окончание пика (см. chrom.peak_xy)
+
+                """
+                signal = self._array()
+                top = self._index(peaktime)
+                # определение начальной точки левого крыла пика (15 сек),
+                # при равных значениях - самая ранняя точка
+                lo = max(top - self._index(self.ddict.start + 15) + 1, 0)
+                start = lo + int(np.argmin(signal[lo:top + 1]))
+
+                # определение конечной точки пика, правое крыло
+                if right is not None:
+                        hi = self._index(right)
+                elif len(self.components) == 1:
+                        # обнаружен только один компонент
+                        hi = self._index(240)
+                else:
+                        # для двухкомпонентной смеси
+                        hi = self._index(peaktime + 20)
+                wing = signal[top:max(hi, top + 1)]
+                # при равных значениях - самая поздняя точка
+                end = top + len(wing) - 1 - int(np.argmin(wing[::-1]))
+
+                return [self._time_at(start), float(signal[start]),
+                        self._time_at(top), float(signal[top]),
+                        self._time_at(end), float(signal[end])]
+
+        def peakheight(self, p):
+                """
+                Определение высоты пика по координатам трех точек p
+                Запоминает ширину плечей пика в атрибутах wing_L, wing_R
+
+                Возвращаемое значение:
+                        H (float): высота аналитического сигнала
+
+                """
+                startpeak = (p[0], p[1])
+                toppeak = (p[2], p[3])
+                endpeak = (p[4], p[5])
+
+                if (startpeak == toppeak or
+                    toppeak == endpeak or
+                    startpeak == endpeak):
+                        return 0
+                wing_L = toppeak[0] - startpeak[0]
+                wing_R = endpeak[0] - toppeak[0]
+                self.wing_L, self.wing_R = wing_L, wing_R
+                h = (endpeak[1] - startpeak[1]) * wing_L / (wing_L + wing_R)
+                ordinate_h = h + startpeak[1]
+                return float(toppeak[1] - ordinate_h)
+
+        @timing.stage(imports=('scipy.signal',))
+        def detect(self, start=None, end=None):
+                """
+                Поиск пиков на участке хроматограммы [start, end), сек
+                (по-умолчанию - вся хроматограмма)
+
+                Возвращаемое значение:
+                        list: времена вершин пиков, сек, по возрастанию
+
+                """
+                from scipy.signal import find_peaks
+
+                signal = self._array()
+                # расстояние между пиками PEAK_DISTANCE сек, порог перепада
+                # между вершиной и точками за 1 сек до и после нее -
+                # PEAK_THRESHOLD (при частоте выше 1 Гц перепад между
+                # соседними точками меньше и сравнивается с точками
+                # на расстоянии 1 сек)
+                step = max(int(round(self.rate)), 1)
+                distance = max(round(PEAK_DISTANCE * self.rate), 1)
+                peaks, heights = find_peaks(signal,
+                                            height=0,
+                                            prominence=PEAK_PROMINENCE,
+                                            distance=distance,
+                                            threshold=PEAK_THRESHOLD
+                                            / self.rate
+                                            if step == 1 else None
+                                            )
+                if step > 1:
+                        before = signal[np.maximum(peaks - step, 0)]
+                        after = signal[np.minimum(peaks + step,
+                                                  len(signal) - 1)]
+                        top = signal[peaks]
+                        peaks = peaks[(top - before >= PEAK_THRESHOLD)
+                                      & (top - after >= PEAK_THRESHOLD)]
+                times = self.ddict.times(peaks)
+                inside = np.ones(len(peaks), dtype=bool)
+                if start is not None:
+                        inside &= times >= start
+                if end is not None:
+                        inside &= times < end
+                return [self._time_at(i) for i in peaks[inside].tolist()]
+
+        @timing.stage()
+        def identify(self, peaks):
+                """
+                Идентификация пиков с временами peaks по библиотеке
+                компонентов library
+                Заполняет словарь components с обнаруженными компонентами
+
+                Возвращаемое значение:
+                        dict: {имя компонента: время удерживания пика}
+
+                """
+                found = self.library.assign(peaks)
+                for name, t in found.items():
+                        self.components[name] = {'t, c': t}
+                return found
+
+        @timing.stage()
+        def fpeaks(self):
+                """
+                Поиск пиков в диапазоне 175-235 сек
+                Заполняет словарь components с обнаруженными компонентами,
+                уточняет времена выхода компонентов time_ethanol, time_acn
+
+                """
+                self.time_ethanol = self.expected_ethanol
+                self.time_acn = self.expected_acn
+                t = self.detect(175, 235)
+                for i in t:
+                        if abs(self.time_ethanol - i) < abs(self.time_acn - i):
+                                self.time_ethanol = i
+                                self.components.update(
+                                        Этанол={'t, c': self.time_ethanol})
+                        elif abs(self.time_ethanol - i) == abs(self.time_acn - i):
+                                self.components.update(Компонент={})
+                                print('Необходимо уточнение компонента')
+                        else:
+                                self.time_acn = i
+                                self.components.update(
+                                        Ацетонитрил={'t, c': self.time_acn})
+
+        def assym(self, p, H=None):
+                """
+                Определение фактора асимметрии пика p высотой H
+
+                Возвращаемое значение:
+                        A (float): фактор асимметрии пика
+
+                """
+                if H is None:
+                        H = self.peakheight(p)
+                pp = self.Wx(p, .05, H)
+                w005 = pp[0]
+                # точки пересечения интерполированы, поэтому и вершина
+                # уточняется между точками сигнала
+                f = self.apex(p) - pp[1]
+                return w005 / (2 * f)
+
+        def plates(self, p, H=None):
+                """
+                Определение числа теоретических тарелок по пику p высотой H
+
+                Возвращаемое значение:
+                        N (float): количество теоретических тарелок
+
+                """
+                if H is None:
+                        H = self.peakheight(p)
+                # время удерживания - от середины интервала усреднения
+                tR = self.apex(p) + self._center
+                return 5.54 * (tR / self.Wx(p, .5, H)[0]) ** 2
+
+        def resolution(self, p1, p2, H1=None, H2=None):
+                """
+                Определение разрешения пиков p1 и p2 высотой H1 и H2
+
+                Возвращаемое значение:
+                        Rs (float): разрешение двух пиков
+
+                """
+                if H1 is None:
+                        H1 = self.peakheight(p1)
+                if H2 is None:
+                        H2 = self.peakheight(p2)
+                tr1 = self.apex(p1)
+                tr2 = self.apex(p2)
+                w051 = self.Wx(p1, .5, H1)[0]
+                w052 = self.Wx(p2, .5, H2)[0]
+                return 1.18 * (tr2 - tr1) / (w051 + w052)
+
+        def apex(self, p):
+                """
+                Уточнение времени вершины пика p (см. peak_xy) параболой
+                через вершину и соседние точки сигнала над базовой линией
+                пика
+
+                Возвращаемое значение:
+                        float: время вершины, сек
+
+                """
+                signal = self._array()
+                top = self._index(p[2])
+                if not 0 < top < len(signal) - 1 or p[4] == p[0]:
+                        return float(p[2])
+                t = self.ddict.times([top - 1, top, top + 1])
+                slope = (p[5] - p[1]) / (p[4] - p[0])
+                y0, y1, y2 = signal[top - 1:top + 2] - (p[1] + slope
+                                                         * (t - p[0]))
+                curv = y0 - 2 * y1 + y2
+                if curv >= 0:
+                        return float(p[2])
+                delta = min(max(.5 * (y0 - y2) / curv, -.5), .5)
+                return float(t[1] + delta * (t[2] - t[1]))
+
+        def _array(self):
+                # сигнал в виде массива (без копирования)
+                return self.ddict.array
+
+        def _index(self, t):
+                # номер точки сигнала, ближайшей ко времени t, сек
+                return self.ddict.index(t)
+
+        def _time_at(self, i):
+                # время точки i, сек (целое число для целых секунд)
+                return _seconds(self.ddict.time_at(i))
+
+        @timing.stage()
+        def widths(self, p, fractions, H=None):
+                """
+                Определение ширины пика p сразу на нескольких долях высоты
+                fractions (например, (.05, .1, .5))
+
+                Возвращаемое значение:
+                        ndarray формы (len(fractions), 3): для каждой доли
+                        высоты [Wx, lpoint, rpoint] (см. Wx)
+
+                """
+                if H is None:
+                        H = self.peakheight(p)
+                signal = self._array()
+                return peak_widths(signal, p, fractions, H,
+                                   self.ddict.times([0, 1]))
+
+        def Wx(self, p, x, H=None):
+                """
+                Определение ширины пика p на доле высоты x
+                Точки пересечения уровня x * H определяются линейной
+                интерполяцией между соседними точками сигнала
+
+                Возвращаемое значение:
+                        list(Wx, lpoint, rpoint) - ширина пика, координаты
+                        левой и правой точек пика на заданной высоте
+
+                """
+                return self.widths(p, (x,), H)[0].tolist()
+
+
+def process_channels(filename, channels=None, jobs=None, **options):
+        """
+        Функция обработки нескольких каналов детекторов файла filename
+        в пуле потоков
+        Принимает в качестве аргументов:
+        channels - названия или номера каналов (по-умолчанию - все каналы)
+        jobs - число потоков (по-умолчанию - по числу каналов; при
+               измерении памяти этапов - один поток, см. модуль timing)
+        options - параметры обработки Chromatogram
+
+        Возвращаемое значение:
+                dict: {название канала: ProcessingResult}
+
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        run = loader.load(filename)
+        if channels is None:
+                channels = run.channels
+        names = [run.channels[c] if isinstance(c, int) else c
+                 for c in channels]
+        for name in names:
+                run.channel(name)
+        # этапы обработки в потоках пула относятся к файлу вызывающего
+        # потока (см. timing.run)
+        source = timing.current()
+
+        def work(name):
+                with timing.run(source, log=False):
+                        chrom = Chromatogram(filename, channel=name,
+                                             **options)
+                        return chrom.process()
+
+        if timing.measuring_memory():
+                # tracemalloc учитывает память всего процесса
+                jobs = 1
+        with ThreadPoolExecutor(max_workers=jobs or len(names) or 1) as pool:
+                return dict(zip(names, pool.map(work, names)))
+
+
+def _seconds(t):
+        # время, сек: целые секунды - int, как в исходных данных 1 Гц
+        return int(t) if float(t).is_integer() else t
+
+
+def peak_widths(signal, p, fractions, H, time=None):
+        """
+        Функция определения ширины пика на нескольких долях высоты
+        Принимает в качестве аргументов:
+        signal - массив сигнала
+        p - список координат трех точек пика [x1, y1, x2, y2, x3, y3]
+        fractions - доли высоты от основания (% / 100)
+        H - высота пика
+        time - время точек равномерной шкалы, сек (используются первые
+               две точки: начало и шаг шкалы; по-умолчанию - номер точки)
+
+        Сигнал отсчитывается от базовой линии, соединяющей начало и окончание
+        пика. Для каждой доли высоты находится ближайшее к вершине
+        пересечение уровня на левом и правом крыле, время пересечения
+        интерполируется линейно между соседними точками. Если пересечение
+        не найдено, используется начало (окончание) пика
+
+        Возвращаемое значение:
+                ndarray формы (len(fractions), 3): [Wx, lpoint, rpoint]
+
+        """
+        origin, step = 0., 1.
+        if time is not None and len(time) > 1:
+                origin, step = time[0], time[1] - time[0]
+        # координаты точек пика в номерах точек сигнала
+        t0, t_top, t1 = (int(round((v - origin) / step))
+                         for v in (p[0], p[2], p[4]))
+        h = np.asarray(fractions, dtype=float)[:, None] * H
+        x = np.arange(t0, t1 + 1)
+        y = signal[t0:t1 + 1] - ((x - t0) / (t1 - t0) * (p[5] - p[1]) + p[1])
+        top = t_top - t0
+
+        lpoint = np.full(len(h), float(t0))
+        rpoint = np.full(len(h), float(t1))
+        rows = np.arange(len(h))
+
+        # левое крыло: пары точек (k-1, k), y[k-1] < h <= y[k],
+        # ближайшая к вершине пара
+        ya, yb = y[:top], y[1:top + 1]
+        cross = (ya < h) & (h <= yb)
+        if top:
+                k = top - 1 - np.argmax(cross[:, ::-1], axis=1)
+                found = cross[rows, k]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                        l = t0 + k + (h[:, 0] - ya[k]) / (yb[k] - ya[k])
+                lpoint[found] = l[found]
+
+        # правое крыло: пары точек (k-1, k), y[k-1] >= h > y[k],
+        # ближайшая к вершине пара
+        ya, yb = y[top:-1], y[top + 1:]
+        cross = (ya >= h) & (h > yb)
+        if len(ya):
+                k = np.argmax(cross, axis=1)
+                found = cross[rows, k]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                        r = t_top + k + (ya[k] - h[:, 0]) / (ya[k] - yb[k])
+                rpoint[found] = r[found]
+
+        lpoint = origin + lpoint * step
+        rpoint = origin + rpoint * step
+        return np.column_stack((rpoint - lpoint, lpoint, rpoint))
@@ -0,0 +1,57 @@
+"""
+Модуль decimate
+===============
+
+Модуль decimate - прореживание данных для отображения графика
+
+Видимый участок графика [xmin, xmax] делится на width столбцов (по числу
+пикселей ширины графика). В каждом столбце сохраняются первая, последняя,
+минимальная и максимальная точки, поэтому вершины пиков и провалы
+отображаются без искажений, а число точек не превышает 4 * width
+независимо от длительности и частоты записи хроматограммы
+
+Основные функции
+----------------
+        minmax(ndarray, ndarray, float, float, int) -> (ndarray, ndarray)
+
+"""
+
+import numpy as np
+
+
+def _extreme(y, starts, counts, reduce):
+        # номера первых точек каждого столбца со значением reduce(столбец)
+        value = reduce.reduceat(y, starts)
+        hits = np.flatnonzero(y == np.repeat(value, counts))
+        return hits[np.searchsorted(hits, starts)]
+
+
+def minmax(x, y, xmin, xmax, width):
+        """
+        Функция прореживания данных (x, y) для графика шириной width
+        пикселей с диапазоном оси x [xmin, xmax]
+        Массив x должен быть упорядочен по возрастанию
+
+        Возвращаемое значение:
+                (x, y) - точки видимого участка (включая по одной соседней
+                точке с каждой стороны для непрерывности линии)
+
+        """
+        n = len(x)
+        lo = max(int(np.searchsorted(x, xmin, 'right')) - 1, 0)
+        hi = min(int(np.searchsorted(x, xmax, 'left')) + 1, n)
+        x, y = x[lo:hi], y[lo:hi]
+        width = max(int(width), 1)
+        if len(x) <= 4 * width or xmax <= xmin:
+                return x, y
+
+        column = np.floor((x - xmin) * (width / (xmax - xmin)))
+        np.clip(column, -1, width, out=column)
+        starts = np.r_[0, np.flatnonzero(np.diff(column)) + 1]
+        counts = np.diff(np.r_[starts, len(x)])
+        keep = np.concatenate((starts,
+                               starts + counts - 1,
+                               _extreme(y, starts, counts, np.minimum),
+                               _extreme(y, starts, counts, np.maximum)))
+        keep = np.unique(keep)
+        return x[keep], y[keep]
@@ -0,0 +1,294 @@
+"""
+Модуль deconvolve
+=================
+
+Модуль deconvolve - разделение перекрывающихся пиков аппроксимацией
+
+Соприкасающиеся пики объединяются в группы (кластеры). Сигнал каждой
+группы аппроксимируется суммой пиков заданной формы и линейной базовой
+линии методом наименьших квадратов (scipy.optimize.least_squares)
+с аналитической матрицей Якоби. Начальные значения параметров - пики,
+найденные при обработке. Если задан уровень шума, пики, не найденные
+при обработке (плечи, пики ближе минимального расстояния поиска),
+добавляются по наибольшему остатку аппроксимации выше шума, после чего
+группа аппроксимируется заново (не более MAX_EXTRA добавленных пиков).
+Аппроксимация, остаток которой и после этого выше шума, отмечается как
+неразделенная (resolved = False). Группа, в которой точек меньше, чем
+параметров аппроксимации, не аппроксимируется и также отмечается как
+неразделенная. Группы аппроксимируются последовательно: least_squares
+не освобождает GIL, поэтому потоки не ускоряют расчет, а параллельная
+обработка выполняется по файлам (модули batch, watch)
+
+Форма пиков (shape):
+        'gauss' - гауссов пик: площадь S, центр mu, сигма
+        'emg' - экспоненциально-модифицированный гауссов пик (пик с
+                хвостом): площадь S, mu, сигма, постоянная хвоста tau
+
+Основные функции
+----------------
+        gauss(ndarray, float, float, float) -> (ndarray, ndarray)
+        emg(ndarray, float, float, float, float) -> (ndarray, ndarray)
+        fit_cluster(ndarray, ndarray, list, str='gauss', float=None) -> list
+        deconvolve(ndarray, ndarray, list, str='gauss', float=None) -> list
+
+"""
+
+import numpy as np
+
+from .integrate import _clusters
+
+SHAPES = ('gauss', 'emg')
+
+# наибольшее число пиков, добавляемых в группу по остатку аппроксимации
+MAX_EXTRA = 3
+
+_SQRT2 = np.sqrt(2)
+_SQRT2PI = np.sqrt(2 * np.pi)
+_SQRTPI = np.sqrt(np.pi)
+
+
+def gauss(t, area, mu, sigma):
+        """
+        Функция гауссова пика площадью area с центром mu и сигмой sigma
+
+        Возвращаемое значение:
+                (f, jac) - значения в точках t и производные по параметрам
+                (area, mu, sigma) - массив формы (len(t), 3)
+
+        """
+        x = t - mu
+        shape = np.exp(-.5 * (x / sigma) ** 2) / (sigma * _SQRT2PI)
+        f = area * shape
+        jac = np.column_stack((shape,
+                               f * x / sigma ** 2,
+                               f * (x ** 2 / sigma ** 3 - 1 / sigma)))
+        return f, jac
+
+
+def emg(t, area, mu, sigma, tau):
+        """
+        Функция экспоненциально-модифицированного гауссова пика
+        площадью area (mu, sigma - параметры гауссовой составляющей,
+        tau - постоянная экспоненциального хвоста)
+
+        Возвращаемое значение:
+                (f, jac) - значения в точках t и производные по параметрам
+                (area, mu, sigma, tau) - массив формы (len(t), 4)
+
+        """
+        from scipy.special import erfc, erfcx
+
+        x = t - mu
+        z = (sigma / tau - x / sigma) / _SQRT2
+        gaussian = np.exp(-.5 * (x / sigma) ** 2)
+        # устойчивая форма: при z >= 0 через erfcx, при z < 0 - прямая
+        with np.errstate(over='ignore'):
+                direct = np.exp(np.minimum(.5 * (sigma / tau) ** 2 - x / tau,
+                                           700)) * erfc(z)
+        shape = np.where(z >= 0, gaussian * erfcx(np.maximum(z, 0)),
+                         direct) / (2 * tau)
+        f = area * shape
+        # производная erfc(z) по z, умноженная на area/(2 tau) exp(u)
+        q = -area * gaussian / (tau * _SQRTPI)
+        jac = np.column_stack((
+                shape,
+                f / tau + q / (sigma * _SQRT2),
+                f * sigma / tau ** 2 + q * (1 / tau + x / sigma ** 2) / _SQRT2,
+                f * (x / tau ** 2 - 1 / tau - sigma ** 2 / tau ** 3)
+                - q * sigma / (tau ** 2 * _SQRT2)))
+        return f, jac
+
+
+_MODELS = {'gauss': (gauss, 3), 'emg': (emg, 4)}
+
+
+def _model(params, t, shape, npeaks):
+        # сумма пиков и линейной базовой линии b0 + b1 * (t - t[0])
+        func, k = _MODELS[shape]
+        f = params[-2] + params[-1] * (t - t[0])
+        jac = np.empty((len(t), len(params)))
+        for i in range(npeaks):
+                fi, ji = func(t, *params[i * k:(i + 1) * k])
+                f = f + fi
+                jac[:, i * k:(i + 1) * k] = ji
+        jac[:, -2] = 1
+        jac[:, -1] = t - t[0]
+        return f, jac
+
+
+def _describe(t, params, shape):
+        # вершина, высота и ширина на половине высоты пика по модели,
+        # рассчитанной на сетке с шагом в 10 раз меньше шага данных
+        func, k = _MODELS[shape]
+        grid = np.linspace(t[0], t[-1], 10 * (len(t) - 1) + 1)
+        f = func(grid, *params)[0]
+        top = int(np.argmax(f))
+        H = float(f[top])
+        above = np.flatnonzero(f >= H / 2)
+        peak = {'S': float(params[0]),
+                't': float(grid[top]),
+                'H': H,
+                'W': float(grid[above[-1]] - grid[above[0]]),
+                'mu': float(params[1]),
+                'sigma': float(params[2])}
+        if shape == 'emg':
+                peak['tau'] = float(params[3])
+        return peak
+
+
+def _fit(t, y, x0, lower, upper, shape, n):
+        # аппроксимация суммой n пиков и линейной базовой линии
+        from scipy.optimize import least_squares
+
+        x0 = np.clip(x0, lower, upper)
+        return least_squares(lambda p: _model(p, t, shape, n)[0] - y, x0,
+                             jac=lambda p: _model(p, t, shape, n)[1],
+                             bounds=(lower, upper), method='trf').x
+
+
+def _match(peaks, centers):
+        # порядок пиков: ближайшие к начальным центрам centers,
+        # затем добавленные пики по времени вершины
+        order = []
+        free = list(range(len(peaks)))
+        for center in centers:
+                best = min(free, key=lambda i: abs(peaks[i]['t'] - center))
+                order.append(best)
+                free.remove(best)
+        return order + sorted(free, key=lambda i: peaks[i]['t'])
+
+
+def fit_cluster(t, y, guesses, shape='gauss', noise=None):
+        """
+        Функция аппроксимации сигнала группы пиков
+        Принимает в качестве аргументов:
+        t, y - время и сигнал участка группы
+        guesses - начальные значения [(S, t, sigma), ...] для каждого пика
+        shape - форма пиков ('gauss', 'emg')
+        noise - уровень шума, пА (None - без добавления пиков по остатку
+                и проверки остатка)
+
+        Возвращаемое значение:
+                list: для каждого пика словарь {'S': площадь, 't': время
+                      вершины, 'H': высота, 'W': ширина на половине высоты,
+                      'mu', 'sigma' (и 'tau' для 'emg'), 'residual':
+                      наибольший остаток аппроксимации группы, 'resolved':
+                      остаток не выше шума (None - шум не задан), 'extra':
+                      пик добавлен по остатку}; сначала пики guesses,
+                      затем добавленные пики
+                      Если точек меньше, чем параметров аппроксимации,
+                      параметры пиков - None, 'resolved' - False
+
+        """
+        if shape not in _MODELS:
+                raise ValueError('Неизвестная форма пика: %r' % shape)
+        t = np.asarray(t, dtype=float)
+        y = np.asarray(y, dtype=float)
+        k = _MODELS[shape][1]
+        if len(t) < len(guesses) * k + 2:
+                # группа слишком короткая для аппроксимации
+                params = ('S', 't', 'H', 'W', 'mu', 'sigma') + (
+                        ('tau',) if shape == 'emg' else ())
+                return [dict(dict.fromkeys(params), residual=None,
+                             resolved=False, extra=False)
+                        for _ in guesses]
+        step = t[1] - t[0]
+        span = t[-1] - t[0]
+
+        def bounds(S, center, sigma):
+                # начальные значения и границы параметров одного пика
+                sigma = min(max(sigma, step), span)
+                x0 = [max(S, 1e-9), center, sigma]
+                lower = [0, t[0], step / 4]
+                upper = [np.inf, t[-1], span]
+                if shape == 'emg':
+                        x0.append(sigma / 2)
+                        lower.append(step / 100)
+                        upper.append(span)
+                return x0, lower, upper
+
+        x0, lower, upper = [], [], []
+        for guess in guesses:
+                for items, values in zip((x0, lower, upper), bounds(*guess)):
+                        items += values
+        slope = (y[-1] - y[0]) / span
+        x0 += [y[0], slope]
+        lower += [-np.inf, -np.inf]
+        upper += [np.inf, np.inf]
+
+        n = len(guesses)
+        params = _fit(t, y, x0, lower, upper, shape, n)
+        residual = y - _model(params, t, shape, n)[0]
+        while noise is not None and n < len(guesses) + MAX_EXTRA:
+                top = int(np.argmax(residual))
+                if residual[top] <= noise:
+                        break
+                # новый пик в точке наибольшего остатка с сигмой,
+                # средней для найденных пиков
+                sigma = float(np.mean(params[2:n * k:k]))
+                x0, low, up = bounds(residual[top] * sigma * _SQRT2PI,
+                                     t[top], sigma)
+                x0 = np.r_[params[:n * k], x0, params[n * k:]]
+                lower = lower[:n * k] + low + lower[n * k:]
+                upper = upper[:n * k] + up + upper[n * k:]
+                n += 1
+                params = _fit(t, y, x0, lower, upper, shape, n)
+                residual = y - _model(params, t, shape, n)[0]
+
+        worst = float(np.abs(residual).max())
+        peaks = [_describe(t, params[i * k:(i + 1) * k], shape)
+                 for i in range(n)]
+        for peak in peaks:
+                peak['residual'] = worst
+                peak['resolved'] = None if noise is None else worst <= noise
+        order = _match(peaks, [g[1] for g in guesses])
+        for i, j in enumerate(order):
+                peaks[j]['extra'] = i >= len(guesses)
+        return [peaks[j] for j in order]
+
+
+def deconvolve(time, signal, peaks, shape='gauss', noise=None):
+        """
+        Функция разделения пиков сигнала
+        Принимает в качестве аргументов:
+        time, signal - массивы времени и сигнала
+        peaks - координаты пиков [x1, y1, x2, y2, x3, y3] (см. peak_xy)
+        shape - форма пиков ('gauss', 'emg')
+        noise - уровень шума, пА (см. fit_cluster)
+
+        Возвращаемое значение:
+                list: параметры пиков в порядке peaks, затем пики,
+                      добавленные по остатку (см. fit_cluster)
+
+        """
+        if not peaks:
+                return []
+        time = np.asarray(time, dtype=float)
+        starts = np.searchsorted(time, [p[0] for p in peaks])
+        ends = np.searchsorted(time, [p[4] for p in peaks])
+        cs, ce = _clusters(starts, ends)
+        groups = {}
+        for i, key in enumerate(zip(cs.tolist(), ce.tolist())):
+                groups.setdefault(key, []).append(i)
+
+        def work(item):
+                (lo, hi), members = item
+                t, y = time[lo:hi + 1], signal[lo:hi + 1]
+                guesses = []
+                for i in members:
+                        p = peaks[i]
+                        # площадь и сигма гауссова пика с высотой над
+                        # линией между началом и окончанием пика
+                        H = p[3] - (p[1] + (p[5] - p[1]) * (p[2] - p[0])
+                                    / ((p[4] - p[0]) or 1))
+                        sigma = (p[4] - p[0]) / 6
+                        guesses.append((H * sigma * _SQRT2PI, p[2], sigma))
+                return members, fit_cluster(t, y, guesses, shape, noise)
+
+        result = [None] * len(peaks)
+        extra = []
+        for members, fitted in map(work, groups.items()):
+                for i, peak in zip(members, fitted):
+                        result[i] = peak
+                extra += fitted[len(members):]
+        return result + sorted(extra, key=lambda peak: peak['t'])
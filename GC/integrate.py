@@ -0,0 +1,127 @@
+"""
+Модуль integrate
+================
+
+Модуль integrate - интегрирование пиков хроматограммы
+
+Площади всех пиков рассчитываются за один проход: по сигналу один раз
+строится накопленный интеграл, площадь каждого пика равна разности его
+значений на границах пика. Площадь под базовой линией вычисляется
+аналитически (базовая линия - отрезок прямой)
+
+Методы интегрирования (method):
+        'trapezoid' - метод трапеций
+        'simpson' - метод Симпсона
+
+Базовая линия (baseline):
+        'valley' - от начала до окончания каждого пика (от впадины до впадины)
+        'drop' - общая базовая линия для группы соприкасающихся пиков
+                 от начала первого до окончания последнего пика группы,
+                 пики разделяются перпендикуляром, опущенным из впадины
+
+Основные функции
+----------------
+        cumulative(ndarray, ndarray=None, str='trapezoid') -> ndarray
+        peak_areas(ndarray, list, list, ndarray=None,
+                   str='trapezoid', str='valley') -> ndarray
+
+"""
+
+import numpy as np
+
+METHODS = ('trapezoid', 'simpson')
+BASELINES = ('valley', 'drop')
+
+
+def cumulative(signal, time=None, method='trapezoid'):
+        """
+        Функция расчета накопленного интеграла сигнала signal по времени time
+        (массив времени точек или шаг равномерной шкалы, сек; по-умолчанию -
+        номер точки)
+
+        Возвращаемое значение:
+                ndarray: значения интеграла от начала сигнала до каждой точки
+
+        """
+        if method not in METHODS:
+                raise ValueError('Неизвестный метод интегрирования: %r' % method)
+        signal = np.asarray(signal, dtype=float)
+        if time is None:
+                time = 1.
+        # шаг равномерной шкалы или интервалы между точками
+        dt = time if np.ndim(time) == 0 else np.diff(time)
+        if method == 'simpson' and len(signal) > 2:
+                from scipy.integrate import cumulative_simpson
+                if np.ndim(time) == 0:
+                        return cumulative_simpson(signal, dx=time, initial=0)
+                return cumulative_simpson(signal, x=time, initial=0)
+        total = np.empty(len(signal))
+        total[:1] = 0
+        np.cumsum((signal[1:] + signal[:-1]) * dt / 2, out=total[1:])
+        return total
+
+
+def _clusters(starts, ends):
+        # границы групп соприкасающихся (перекрывающихся) пиков
+        order = np.argsort(starts, kind='stable')
+        s, e = starts[order], ends[order]
+        new = np.ones(len(s), dtype=bool)
+        new[1:] = s[1:] > np.maximum.accumulate(e)[:-1]
+        group = np.cumsum(new) - 1
+        first = s[new]
+        last = np.maximum.reduceat(e, np.flatnonzero(new))
+        cluster_start = np.empty(len(s), dtype=starts.dtype)
+        cluster_end = np.empty(len(s), dtype=ends.dtype)
+        cluster_start[order] = first[group]
+        cluster_end[order] = last[group]
+        return cluster_start, cluster_end
+
+
+def _times(time, index):
+        # время точек index по массиву времени или шагу равномерной шкалы
+        if time is None:
+                return index.astype(float)
+        if np.ndim(time) == 0:
+                return index * float(time)
+        return time[index]
+
+
+def peak_areas(signal, starts, ends, time=None,
+               method='trapezoid', baseline='valley'):
+        """
+        Функция расчета площадей пиков
+        Принимает в качестве аргументов:
+        signal - массив сигнала
+        starts, ends - номера точек начала и окончания пиков
+        time - массив времени точек или шаг равномерной шкалы, сек
+               (по-умолчанию - номер точки)
+        method - метод интегрирования ('trapezoid', 'simpson')
+        baseline - базовая линия ('valley', 'drop')
+
+        Возвращаемое значение:
+                ndarray: площади пиков над базовой линией
+
+        """
+        if baseline not in BASELINES:
+                raise ValueError('Неизвестная базовая линия: %r' % baseline)
+        signal = np.asarray(signal, dtype=float)
+        starts = np.asarray(starts, dtype=int)
+        ends = np.asarray(ends, dtype=int)
+        if not len(starts):
+                return np.empty(0)
+
+        total = cumulative(signal, time, method)
+        S_all = total[ends] - total[starts]
+        t_start, t_end = _times(time, starts), _times(time, ends)
+
+        if baseline == 'valley':
+                base_start, base_end = signal[starts], signal[ends]
+        else:
+                cs, ce = _clusters(starts, ends)
+                t_cs = _times(time, cs)
+                slope = ((signal[ce] - signal[cs]) /
+                         np.where(ce > cs, _times(time, ce) - t_cs, 1.))
+                base_start = signal[cs] + slope * (t_start - t_cs)
+                base_end = signal[cs] + slope * (t_end - t_cs)
+        S_down = (base_start + base_end) / 2 * (t_end - t_start)
+        return S_all - S_down
@@ -0,0 +1,137 @@
+"""
+Модуль library
+==============
+
+Модуль library - библиотека компонентов для идентификации пиков
+по времени удерживания
+
+Каждый компонент библиотеки задается именем, ожидаемым временем
+удерживания (сек) и допуском (сек). Пик с временем удерживания t
+относится к компоненту, если |t - RT| <= допуск; из нескольких
+подходящих компонентов выбирается ближайший по времени.
+Времена удерживания хранятся в отсортированном списке, поиск кандидатов
+выполняется делением пополам (модуль bisect), поэтому идентификация
+одного пика требует O(log n) операций для библиотеки из n компонентов
+
+Файл библиотеки - таблица CSV (разделитель ';', ',' или табуляция)
+с заголовком и столбцами: имя, время удерживания, допуск (необязательный)
+
+        name;rt;tolerance
+        Этанол;190;10
+        Ацетонитрил;210;10
+
+Основные классы и функции
+-------------------------
+        Compound(str, float, float=DEFAULT_TOLERANCE)
+        Library(list)
+        load(file) -> Library
+
+"""
+
+import bisect
+import csv
+
+# допуск времени удерживания по-умолчанию, сек
+DEFAULT_TOLERANCE = 5
+
+
+class Compound:
+        """
+        Компонент библиотеки
+        Принимает в качестве аргументов:
+        name - имя компонента
+        rt - ожидаемое время удерживания, сек
+        tolerance - допуск времени удерживания, сек
+
+        """
+        def __init__(self, name, rt, tolerance=DEFAULT_TOLERANCE):
+                self.name = name
+                self.rt = float(rt)
+                self.tolerance = float(tolerance)
+
+        def __repr__(self):
+                return ('Compound(%r, %g, %g)'
+                        % (self.name, self.rt, self.tolerance))
+
+
+class Library:
+        """
+        Библиотека компонентов, упорядоченная по времени удерживания
+        Принимает список компонентов Compound
+
+        """
+        def __init__(self, compounds):
+                self.compounds = sorted(compounds, key=lambda c: c.rt)
+                self.rts = [c.rt for c in self.compounds]
+                # наибольший допуск - ширина окна поиска кандидатов
+                self.max_tolerance = max(
+                        (c.tolerance for c in self.compounds), default=0.)
+
+        def __len__(self):
+                return len(self.compounds)
+
+        def __iter__(self):
+                return iter(self.compounds)
+
+        def match(self, t):
+                """
+                Идентификация пика с временем удерживания t, сек
+
+                Возвращаемое значение:
+                        Compound: ближайший компонент, в допуск которого
+                        попадает t (None - компонент не найден)
+
+                """
+                lo = bisect.bisect_left(self.rts, t - self.max_tolerance)
+                hi = bisect.bisect_right(self.rts, t + self.max_tolerance)
+                best = None
+                for compound in self.compounds[lo:hi]:
+                        d = abs(compound.rt - t)
+                        if d <= compound.tolerance and (
+                                        best is None or d < abs(best.rt - t)):
+                                best = compound
+                return best
+
+        def assign(self, times):
+                """
+                Идентификация пиков с временами удерживания times
+                Каждому компоненту сопоставляется не более одного пика -
+                ближайший к ожидаемому времени удерживания
+
+                Возвращаемое значение:
+                        dict: {имя компонента: время удерживания пика}
+                        в порядке возрастания времени удерживания
+
+                """
+                found = {}
+                for t in times:
+                        compound = self.match(t)
+                        if compound is None:
+                                continue
+                        prev = found.get(compound.name)
+                        if prev is None or (abs(t - compound.rt)
+                                            < abs(prev - compound.rt)):
+                                found[compound.name] = t
+                return dict(sorted(found.items(), key=lambda item: item[1]))
+
+
+def load(filename):
+        """
+        Функция загрузки библиотеки компонентов из файла CSV
+
+        Возвращаемое значение:
+                Library: библиотека компонентов
+
+        """
+        with open(filename, 'r', newline='', encoding='utf-8-sig') as inf:
+                header = inf.readline()
+                delimiter = max(';\t,', key=header.count)
+                compounds = []
+                for row in csv.reader(inf, delimiter=delimiter):
+                        row = [cell.strip() for cell in row]
+                        if not row or not row[0]:
+                                continue
+                        values = [float(v.replace(',', '.')) for v in row[1:3]
+                                  if v]
+                        compounds.append(Compound(row[0], *values))
+        return Library(compounds)
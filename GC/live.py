@@ -0,0 +1,298 @@
+"""
+Модуль live
+===========
+
+Модуль live - обработка файла с экспериментальными данными во время его
+записи прибором
+
+При каждом опросе (LiveRun.poll) читается только дописанная с прошлого
+опроса часть файла. Новые строки добавляются к ряду данных, усредненному
+до частоты 1 Гц, без повторного чтения файла с начала. Секунда усредняется,
+как только записаны все ее точки (частота записи определяется по столбцу
+времени) или началась следующая секунда. Пики в окне
+window (по-умолчанию 175-235 сек) сообщаются, как только пик полностью
+вышел: после вершины записано не менее tail секунд данных
+
+Запуск из командной строки:
+
+        python -m GC.live файл [--interval 1] [--idle 30]
+
+Основные классы
+---------------
+        LiveRun(file, window=(175, 235), tail=20, wing_noise=(40, 60),
+                time_ethanol=190, time_acn=210)
+
+"""
+
+import argparse
+import locale
+import os
+import sys
+import time
+
+import numpy as np
+
+from . import loader
+from .chromatogram import Chromatogram, myround
+from .noise import peak_to_peak
+
+
+class LiveRun:
+        """
+        Обработка дописываемого файла с экспериментальными данными
+        Принимает в качестве аргументов:
+        filename - путь к файлу с данными
+        window - диапазон поиска пиков [сек, сек]
+        tail - время после вершины пика, по истечении которого пик
+               считается вышедшим, сек
+        wing_noise - диапазон окна расчета фонового шума [сек, сек]
+        time_ethanol, time_acn - ориентировочные времена выхода пиков, сек
+
+        Атрибуты:
+                signal (series.Signal): сигнал, усредненный до 1 Гц
+                                        (chrom.ddict), для графика -
+                                        signal.time и signal.array
+                peaks (list): обнаруженные пики - словари
+                              {'component', 't', 'H', 'S/N'}
+                noise (float): величина фонового шума (None - участок
+                               wing_noise еще не записан)
+                ymin, ymax, xmax: диапазон координат графика
+                date_injection, time_injection (str): дата и время анализа
+
+        """
+        def __init__(self, filename, window=(175, 235), tail=20,
+                     wing_noise=(40, 60), time_ethanol=190, time_acn=210):
+                self.filename = filename
+                self.window = window
+                self.tail = tail
+                self.chrom = Chromatogram(wing_noise=wing_noise,
+                                          time_ethanol=time_ethanol,
+                                          time_acn=time_acn)
+                self.chrom.filename = filename
+                self.peaks = []
+                self.noise = None
+                self.ymin = 0
+                self.ymax = 1
+                self.xmax = 1
+                self.title = None
+                self.columns = None
+                self.date_injection = str()
+                self.time_injection = str()
+                self.samples = 0
+                self.rate = None
+                self.changed = 0.
+
+                self._offset = 0
+                self._buffer = b''
+                self._pending = np.empty(0)
+                self._pending_time = np.empty(0)
+                self._times = []
+                self._noise_samples = []
+                self._reported = set()
+                self._encoding = locale.getpreferredencoding(False)
+
+        def _read(self):
+                # чтение дописанной части файла, неполная строка
+                # остается в буфере до следующего опроса
+                try:
+                        with open(self.filename, 'rb') as inf:
+                                inf.seek(self._offset)
+                                chunk = inf.read()
+                except FileNotFoundError:
+                        return []
+                if not chunk:
+                        return []
+                self._offset += len(chunk)
+                self.changed = time.monotonic()
+                data = self._buffer + chunk
+                end = data.rfind(b'\n') + 1
+                self._buffer = data[end:]
+                text = data[:end].decode(self._encoding, 'replace')
+                return [line.strip() for line in text.splitlines()]
+
+        def _header(self, lines):
+                # строки заголовка: имя файла с датой анализа и названия столбцов
+                if self.title is None and lines:
+                        self.title = lines.pop(0)
+                        (self.date_injection,
+                         self.time_injection) = loader.header_datetime(self.title)
+                        self.chrom.date_injection = self.date_injection
+                        self.chrom.time_injection = self.time_injection
+                if self.columns is None and lines:
+                        self.columns = lines.pop(0).split('\t')
+                return lines
+
+        def _add_signal(self, times, signal):
+                # точки для расчета шума на участке wing_noise
+                start, end = self.chrom.wing_noise
+                self.samples += len(signal)
+                if self.noise is None and len(times):
+                        inside = (times >= start) & (times < end)
+                        self._noise_samples.extend(signal[inside].tolist())
+                        if times[-1] >= end:
+                                self.noise = myround(peak_to_peak(
+                                        np.array(self._noise_samples)))
+                                self._noise_samples = []
+
+                # частота записи по первым секундам файла
+                if self.rate is None:
+                        self._times.extend(times.tolist())
+                        if len(set(self._times)) > 3:
+                                self.rate = loader.sampling_rate(
+                                        np.array(self._times))
+                                self._times = []
+
+                # усреднение до 1 Гц только полных секунд
+                signal = np.concatenate((self._pending, signal))
+                times = np.concatenate((self._pending_time, times))
+                second = np.floor(times).astype(np.int64)
+                complete = second < second[-1] if len(second) else second
+                if self.rate is not None and len(second):
+                        last = np.count_nonzero(second == second[-1])
+                        if last >= round(self.rate):
+                                complete = np.ones(len(second), dtype=bool)
+                n = np.count_nonzero(complete)
+                if n:
+                        groups = second[:n] - second[0]
+                        counts = np.bincount(groups)
+                        sums = np.bincount(groups, weights=signal[:n])
+                        seconds = np.round(sums[counts > 0] / counts[counts > 0],
+                                           3)
+                else:
+                        seconds = np.empty(0)
+                self._pending = signal[n:]
+                self._pending_time = times[n:]
+                ddict = self.chrom.ddict
+                ddict.append(seconds)
+                if len(seconds):
+                        first = len(ddict) == len(seconds)
+                        low = float(seconds.min())
+                        high = float(seconds.max())
+                        self.ymin = low if first else min(self.ymin, low)
+                        self.ymax = high if first else max(self.ymax, high)
+                        self.xmax = len(ddict)
+                return len(seconds)
+
+        @property
+        def signal(self):
+                return self.chrom.ddict
+
+        def _name(self, t):
+                # компонент с ближайшим ориентировочным временем выхода
+                d_ethanol = abs(self.chrom.expected_ethanol - t)
+                d_acn = abs(self.chrom.expected_acn - t)
+                if d_ethanol < d_acn:
+                        return 'Этанол'
+                if d_ethanol == d_acn:
+                        return 'Компонент'
+                return 'Ацетонитрил'
+
+        def _detect(self):
+                # поиск пиков только в пределах окна window
+                from scipy.signal import find_peaks
+
+                ddict = self.chrom.ddict
+                n = len(ddict)
+                lo, hi = self.window
+                start = max(lo - 15, 0)
+                stop = min(n, hi + self.tail)
+                if stop - start < 3:
+                        return []
+                segment = ddict.array[start:stop]
+                peaks, heights = find_peaks(segment,
+                                            height=0,
+                                            prominence=.05,
+                                            distance=15,
+                                            threshold=.005
+                                            )
+                found = []
+                for i in (peaks + start).tolist():
+                        if (not lo <= i < hi or i in self._reported
+                            or n < i + self.tail):
+                                continue
+                        self._reported.add(i)
+                        p = self.chrom.peak_xy(i, right=i + self.tail)
+                        H = self.chrom.peakheight(p)
+                        sn = None
+                        if self.noise:
+                                sn = myround(2 * H / self.noise)
+                        found.append({'component': self._name(i),
+                                      't': i,
+                                      'H': myround(H),
+                                      'S/N': sn})
+                self.peaks.extend(found)
+                return found
+
+        def poll(self):
+                """
+                Чтение дописанных строк файла и обновление данных
+
+                Возвращаемое значение:
+                        list: пики, вышедшие с момента предыдущего опроса
+
+                """
+                lines = self._header(self._read())
+                if not lines:
+                        return []
+                times, signal, oven = loader.parse_lines(lines)
+                if not self._add_signal(times, signal):
+                        return []
+                return self._detect()
+
+        def idle(self):
+                """
+                Время с момента последнего изменения файла, сек
+
+                """
+                return time.monotonic() - self.changed
+
+        def components(self):
+                """
+                Обнаруженные пики в формате словаря компонентов chrom.findpeaks
+                (время удерживания, высота и отношение сигнал/шум)
+
+                """
+                components = {}
+                for peak in self.peaks:
+                        components[peak['component']] = [
+                                {'t, c': peak['t']},
+                                {'H, пA': peak['H']},
+                                {'S/N': peak['S/N']
+                                 if peak['S/N'] is not None else str(' - ')}]
+                return components
+
+
+def main(argv=None):
+        """
+        Точка входа командной строки: слежение за файлом до окончания
+        записи (файл не изменяется в течение idle секунд)
+
+        """
+        parser = argparse.ArgumentParser(
+                prog='python -m GC.live',
+                description='Обработка файла хроматографии во время записи')
+        parser.add_argument('filename', help='файл с данными')
+        parser.add_argument('--interval', type=float, default=1.,
+                            help='период опроса файла, сек')
+        parser.add_argument('--idle', type=float, default=30.,
+                            help='время без изменений файла, после которого '
+                                 'запись считается завершенной, сек')
+        args = parser.parse_args(argv)
+
+        live = LiveRun(args.filename)
+        while not os.path.exists(args.filename):
+                time.sleep(args.interval)
+        live.poll()
+        while live.idle() < args.idle:
+                time.sleep(args.interval)
+                for peak in live.poll():
+                        print('%s: t = %d c, H = %s пA, S/N = %s'
+                              % (peak['component'], peak['t'],
+                                 peak['H'], peak['S/N']))
+                        sys.stdout.flush()
+        print('Запись файла завершена, %d c' % live.xmax)
+        return 0
+
+
+if __name__ == '__main__':
+        sys.exit(main())
@@ -0,0 +1,475 @@
+"""
+Модуль loader
+=============
+
+Модуль loader - однопроходное чтение файлов с экспериментальными данными
+в типизированные массивы numpy
+
+Файл читается один раз целиком, строки данных разбиваются по символу
+табуляции без использования регулярных выражений, столбцы переводятся
+в массивы numpy за одну операцию. Результат разбора (RunData) используется
+всеми функциями модуля chrom, поэтому повторные обращения к одному и тому же
+файлу не приводят к повторному чтению, пока файл не изменится.
+Разобранные столбцы сохраняются в дисковый кэш (модуль cache), и повторное
+открытие файла в другом сеансе не требует разбора текста
+
+Сохраняются все столбцы файла: время, каналы детекторов (FID A, FID B ...)
+и температура термостата. Столбцы доступны как двумерный массив
+RunData.table (столбцы, точки), как структурированный массив RunData.data
+с полями по названиям столбцов и по отдельности (RunData.channel)
+
+Частота записи данных определяется по столбцу "Time, s". Если прибор
+выгружает время с точностью до секунды (несколько строк с одинаковым
+временем), частота определяется по числу строк за секунду, и время каждой
+точки восстанавливается. Функция resample приводит данные к любой частоте
+усреднением блоков или прореживанием без циклов по точкам
+
+Основные функции
+----------------
+        load(file) -> RunData
+        parse(file) -> RunData
+        parse_lines(list) -> (ndarray, ndarray, ndarray)
+        parse_table(list) -> ndarray
+        column_names(list, int) -> list
+        sampling_rate(ndarray) -> float
+        sample_times(ndarray) -> ndarray
+        block_mean(ndarray, int=10) -> ndarray
+        resample(ndarray, ndarray, float=1, str='mean') -> (ndarray, ndarray)
+
+"""
+
+import os
+import re
+
+import numpy as np
+
+from . import cache
+from . import timing
+
+# число строк заголовка: имя файла/дата анализа и названия столбцов
+HEADER_LINES = 2
+
+# частота записи, если ее нельзя определить по столбцу времени, Гц
+DEFAULT_RATE = 10
+
+# версия формата разобранных данных в дисковом кэше
+FORMAT = 3
+
+# признак столбца температуры термостата в названии столбца
+OVEN = 'oven'
+
+# последний разобранный файл: (ключ файла, RunData)
+_last = None
+
+
+class RunData:
+        """
+        Результат разбора файла с экспериментальными данными
+        Принимает в качестве аргументов путь к файлу, первую строку файла,
+        названия столбцов и массив table всех столбцов (первый - время)
+
+        Атрибуты:
+                filename (str): путь к файлу
+                title (str): первая строка файла (имя, дата и время анализа)
+                columns (list): названия столбцов данных
+                names (list): названия столбцов без кавычек, по одному
+                              на каждую строку table (поля data)
+                table (ndarray): все столбцы, массив формы (столбцы, точки)
+                channels (list): названия столбцов каналов детекторов
+                time (ndarray): время каждой точки, сек
+                rate (float): частота записи данных, Гц
+                signal (ndarray): сигнал первого детектора (FID), пА
+                oven (ndarray): температура термостата, °С (None - нет столбца)
+                date_injection (str): дата анализа
+                time_injection (str): время анализа
+
+        """
+        def __init__(self, filename, title, columns, table):
+                self.filename = filename
+                self.title = title
+                self.columns = columns
+                self.table = table
+                self.names = column_names(columns, len(table))
+                oven = [i for i, name in enumerate(self.names)
+                        if OVEN in name.lower()]
+                if not oven and len(table) == 3:
+                        # файл без названия столбца температуры
+                        oven = [2]
+                self.channels = [name for i, name in enumerate(self.names)
+                                 if i and i not in oven]
+                self.time = table[0]
+                self.signal = table[1]
+                self.oven = table[oven[0]] if oven else None
+                self.date_injection, self.time_injection = header_datetime(title)
+                self.rate = sampling_rate(self.time)
+                self._data = None
+
+        def __len__(self):
+                return len(self.signal)
+
+        @property
+        def data(self):
+                """
+                Структурированный массив всех столбцов: поля - названия
+                столбцов (names), создается при первом обращении
+
+                """
+                if self._data is None:
+                        dtype = np.dtype([(name, float)
+                                          for name in self.names])
+                        data = np.empty(len(self.time), dtype)
+                        for name, column in zip(self.names, self.table):
+                                data[name] = column
+                        self._data = data
+                return self._data
+
+        def channel(self, key=None):
+                """
+                Сигнал канала детектора key: номер канала в списке channels,
+                название столбца (None - первый канал)
+
+                Возвращаемое значение:
+                        ndarray: значения столбца
+
+                """
+                if key is None:
+                        return self.signal
+                if isinstance(key, str):
+                        if key not in self.names:
+                                raise KeyError('Нет столбца: %r' % key)
+                        return self.table[self.names.index(key)]
+                return self.table[self.names.index(self.channels[key])]
+
+        def resample(self, rate=1, method='mean', channel=None):
+                """
+                Приведение сигнала канала channel (см. метод channel)
+                к частоте rate, Гц (None - без изменения)
+                method - 'mean' (среднее блока) или 'decimate' (первая точка
+                блока), см. функцию resample
+
+                Возвращаемое значение:
+                        (time, signal) - массивы времени и сигнала
+
+                """
+                signal = self.channel(channel)
+                if rate is None:
+                        return self.time, signal
+                return resample(self.time, signal, rate, method)
+
+
+def header_datetime(title):
+        """
+        Функция определения даты и времени анализа по первой строке файла
+
+        Возвращаемое значение:
+                (date_injection, time_injection) - кортеж строк,
+                пустые строки, если дата в заголовке не найдена
+
+        """
+        date_time = re.search(r"\d\d.\d\d.\d{4} \d\d.\d\d", title)
+        if date_time is None:
+                return str(), str()
+        date_injection, time_injection = date_time.group().split()
+        return date_injection, time_injection
+
+
+def _file_key(filename):
+        # ключ файла: абсолютный путь, время изменения и размер
+        st = os.stat(filename)
+        return (os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+
+
+def _is_data(line):
+        # строка данных содержит числовое значение во втором столбце
+        cells = line.split('\t')
+        if len(cells) < 2:
+                return False
+        try:
+                float(cells[1])
+        except ValueError:
+                return False
+        return True
+
+
+def _seconds(column):
+        """
+        Перевод столбца времени в секунды
+        Допускаются форматы: 12.5 | 00"12" | 00'12.5" | 00:12
+        Разбор текстового формата выполняется только для уникальных значений
+
+        """
+        try:
+                return np.array(column, dtype=float)
+        except ValueError:
+                pass
+        parsed = dict.fromkeys(column)
+        for value in parsed:
+                seconds = 0.
+                for part in re.findall(r"\d+(?:[.,]\d+)?", value):
+                        seconds = seconds * 60 + float(part.replace(',', '.'))
+                parsed[value] = seconds
+        return np.fromiter(map(parsed.get, column), float, count=len(column))
+
+
+def sampling_rate(time):
+        """
+        Функция определения частоты записи данных по столбцу времени time
+        Если время записано с округлением (повторяющиеся значения),
+        частота равна числу точек на один шаг времени
+
+        Возвращаемое значение:
+                float: частота записи, Гц
+
+        """
+        if len(time) < 2:
+                return float(DEFAULT_RATE)
+        changes = np.flatnonzero(np.diff(time))
+        if not len(changes):
+                return float(DEFAULT_RATE)
+        step = np.median(np.diff(time[np.r_[0, changes + 1]]))
+        if len(changes) == len(time) - 1:
+                # время каждой точки различно
+                rate = 1 / step
+        elif len(changes) < 2:
+                return float(DEFAULT_RATE)
+        else:
+                # число точек с одинаковым временем (без неполных
+                # крайних групп)
+                rate = np.median(np.diff(changes)) / step
+        # отбрасываем погрешность округления времени в файле
+        return float('%.9g' % rate)
+
+
+def sample_times(time):
+        """
+        Функция восстановления времени каждой точки по столбцу времени time,
+        записанному с округлением (например, до секунды)
+        Если все значения времени различны, столбец возвращается без изменений
+
+        Возвращаемое значение:
+                ndarray: время каждой точки, сек
+
+        """
+        if len(time) < 2 or not (np.diff(time) == 0).any():
+                return time
+        rate = sampling_rate(time)
+        changes = np.flatnonzero(np.diff(time))
+        # неполная первая группа - файл начат не с начала шага времени
+        first = changes[0] + 1 if len(changes) else len(time)
+        t0 = time[first] - first / rate if len(changes) else time[0]
+        return t0 + np.arange(len(time)) / rate
+
+
+def block_mean(signal, size=10):
+        """
+        Функция усреднения сигнала блоками по size точек
+        Неполный последний блок отбрасывается
+
+        Возвращаемое значение:
+                ndarray: средние значения блоков, округленные до 3 знаков
+
+        """
+        n = len(signal) // size
+        blocks = signal[:n * size].reshape(n, size)
+        # последовательное суммирование столбцов блока
+        total = blocks[:, 0].copy()
+        for j in range(1, size):
+                total += blocks[:, j]
+        return np.round(total / size, 3)
+
+
+def resample(time, signal, rate=1, method='mean'):
+        """
+        Функция приведения сигнала к частоте rate, Гц
+        Принимает в качестве аргументов:
+        time, signal - массивы времени и сигнала
+        rate - частота результата, Гц
+        method - 'mean': среднее значение точек каждого интервала 1/rate,
+                 'decimate': первая точка каждого интервала
+        Интервалы отсчитываются от нулевого времени, неполные интервалы
+        в начале и в конце сигнала отбрасываются
+
+        Возвращаемое значение:
+                (time, signal) - время начала интервалов и значения сигнала
+
+        """
+        if method not in ('mean', 'decimate'):
+                raise ValueError('Неизвестный метод: %r' % method)
+        if not len(signal):
+                return np.empty(0), np.empty(0)
+        native = sampling_rate(time)
+        bins = np.floor(time * rate + 1e-6).astype(np.int64)
+        # номера точек, с которых начинаются интервалы
+        starts = np.flatnonzero(np.diff(bins)) + 1
+        size = native / rate
+        if abs(size - round(size)) < 1e-6 and round(size) >= 1:
+                # целое число точек в интервале - усреднение блоками
+                size = int(round(size))
+                first = 0 if time[0] * rate - bins[0] < 1e-6 else (
+                        starts[0] if len(starts) else len(signal))
+                n = (len(signal) - first) // size
+                t = bins[first] + np.arange(n)
+                if method == 'decimate':
+                        y = signal[first:first + n * size:size]
+                else:
+                        y = block_mean(signal[first:first + n * size], size)
+                return t / rate, y
+        # нецелое число точек в интервале
+        counts = np.bincount(bins - bins[0])
+        index = np.flatnonzero(counts)
+        full = counts[index] >= np.floor(size)
+        full[0] &= time[0] * rate - bins[0] < 1e-6
+        full[-1] = full[-1] and counts[index[-1]] >= np.ceil(size - 1e-6)
+        if method == 'decimate':
+                values = signal[np.r_[0, starts]]
+        else:
+                sums = np.bincount(bins - bins[0], weights=signal)
+                values = np.round(sums[index] / counts[index], 3)
+        return (index[full] + bins[0]) / rate, values[full]
+
+
+def column_names(columns, count):
+        """
+        Функция формирования названий count столбцов по строке названий
+        columns: кавычки удаляются, недостающие и повторяющиеся названия
+        дополняются номером столбца
+
+        Возвращаемое значение:
+                list: названия столбцов
+
+        """
+        names = []
+        for i in range(count):
+                name = ''
+                if i < len(columns):
+                        name = columns[i].strip().strip('"')
+                if not name or name in names:
+                        name = '%s #%d' % (name or 'column', i + 1)
+                names.append(name)
+        return names
+
+
+def _floats(column):
+        # числовой столбец, пустые ячейки - nan
+        try:
+                return np.array(column, dtype=float)
+        except ValueError:
+                return np.array([c or 'nan' for c in column], dtype=float)
+
+
+def parse_table(lines):
+        """
+        Функция разбора строк данных (без строк заголовка) в массив
+        всех столбцов за один проход
+        Число столбцов определяется по первой строке данных,
+        завершающие строки без данных отбрасываются
+
+        Возвращаемое значение:
+                ndarray: массив формы (столбцы, точки), первый столбец -
+                время, сек (как записано в файле, см. sample_times)
+
+        """
+        n = len(lines)
+        while n and not _is_data(lines[n - 1]):
+                n -= 1
+        lines = [line for line in lines[:n] if line]
+        n = len(lines)
+        ncols = lines[0].count('\t') + 1 if n else 2
+        cells = '\t'.join(lines).split('\t')
+        if len(cells) != n * ncols:
+                # строки разной длины - выравниваем по первой строке данных
+                cells = []
+                for line in lines:
+                        row = line.split('\t')[:ncols]
+                        cells.extend(row + [''] * (ncols - len(row)))
+        table = np.empty((ncols, n))
+        table[0] = _seconds(cells[0::ncols])
+        table[1] = np.array(cells[1::ncols], dtype=float)
+        for j in range(2, ncols):
+                table[j] = _floats(cells[j::ncols])
+        return table
+
+
+def parse_lines(lines):
+        """
+        Функция разбора строк данных (без строк заголовка)
+        Число столбцов определяется по первой строке данных,
+        завершающие строки без данных отбрасываются
+
+        Возвращаемое значение:
+                (time, signal, oven) - массивы значений столбцов
+                (время - как записано в файле, см. sample_times),
+                oven = None, если столбец температуры отсутствует
+
+        """
+        table = parse_table(lines)
+        oven = table[2] if len(table) > 2 else None
+        return table[0], table[1], oven
+
+
+def parse(filename):
+        """
+        Функция разбора файла с экспериментальными данными
+        Принимает в качестве аргумента filename путь к файлу с данными
+        Файл читается за один проход, строки заголовка отделяются от данных,
+        завершающие строки без данных отбрасываются
+
+        Возвращаемое значение:
+                RunData: массивы всех столбцов файла
+
+        """
+        with open(filename, 'r', errors='replace') as inf:
+                title = inf.readline().strip()
+                columns = [c.strip() for c in inf.readline().strip().split('\t')]
+                lines = inf.read().splitlines()
+
+        table = parse_table(lines)
+        table[0] = sample_times(table[0])
+        return RunData(filename, title, columns, table)
+
+
+def _from_cache(filename):
+        # восстановление RunData из записи дискового кэша
+        entry = cache.read(filename)
+        if entry is None:
+                return None
+        meta, table = entry
+        if meta.get('format') != FORMAT:
+                return None
+        return RunData(filename, meta['title'], meta['columns'], table)
+
+
+def _to_cache(run, state):
+        # сохранение всех столбцов RunData в дисковый кэш, state - состояние
+        # файла перед разбором (см. cache.snapshot)
+        cache.write(run.filename,
+                    {'format': FORMAT,
+                     'title': run.title,
+                     'columns': run.columns},
+                    run.table, state)
+
+
+@timing.stage()
+def load(filename):
+        """
+        Функция получения разобранных данных файла
+        Повторный вызов для неизмененного файла возвращает ранее
+        разобранный объект без чтения файла, при первом обращении
+        в сеансе данные берутся из дискового кэша, если запись действительна
+
+        Возвращаемое значение:
+                RunData: массивы времени, сигнала и температуры термостата
+
+        """
+        global _last
+        key = _file_key(filename)
+        if _last is not None and _last[0] == key:
+                return _last[1]
+        run = _from_cache(filename)
+        if run is None:
+                state = cache.snapshot(filename)
+                run = parse(filename)
+                if state is not None:
+                        _to_cache(run, state)
+        _last = (key, run)
+        return run
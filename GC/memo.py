@@ -0,0 +1,359 @@
+"""
+Модуль memo
+===========
+
+Модуль memo - кэш результатов обработки файлов в памяти процесса
+
+Результат обработки (хроматограмма и ProcessingResult) сохраняется
+с ключом (полный путь к файлу, хэш содержимого файла, отпечаток
+параметров обработки), поэтому повторный выбор того же файла с теми же
+параметрами не требует обработки. Результат содержит путь к файлу
+и не переносится на другой файл с тем же содержимым. Отпечаток
+учитывает все параметры Chromatogram (неуказанные - по значениям
+по-умолчанию) и настройки модулей обработки SETTINGS (пороги поиска
+пиков, частота аппроксимации базовой линии).
+Хэш содержимого пересчитывается только при изменении времени изменения
+или размера файла. При превышении предельного объема памяти MAX_BYTES
+удаляются давно не использованные результаты (LRU)
+
+Кэш держит в памяти сигналы многих анализов (выбор файлов, тренды),
+поэтому сигнал хроматограммы и базовая линия хранятся с типом STORE_DTYPE
+(float32, см. compact): обработка выполняется с float64, сохраненный
+результат используется для показа и не пересчитывается
+
+Глобальные переменные
+---------------------
+        MAX_BYTES (int): предельный объем памяти кэша по-умолчанию, байт
+        STORE_DTYPE (type): тип значений сохраненных сигналов
+        SETTINGS (tuple): настройки модулей обработки, входящие в отпечаток
+                параметров: ((модуль, (имя переменной, ...)), ...)
+        RESULTS (LRUCache): общий кэш результатов обработки
+
+Основные функции
+----------------
+        fingerprint(dict) -> str
+        parameters(dict) -> dict
+        file_hash(file) -> str
+        sizeof(object) -> int
+        compact(object) -> object
+        get(file, **options) -> object | None
+        put(file, object, **options) -> None
+        process(file, **options) -> (Chromatogram, ProcessingResult)
+        invalidate(file=None) -> None
+
+"""
+
+import copy
+import hashlib
+import importlib
+import inspect
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from . import cache
+from .series import Signal
+
+MAX_BYTES = 128 * 1024 * 1024
+STORE_DTYPE = np.float32
+
+# глобальные переменные модулей, от которых зависит результат обработки
+SETTINGS = (('chromatogram', ('PEAK_DISTANCE', 'PEAK_PROMINENCE',
+                              'PEAK_THRESHOLD')),
+            ('baseline', ('FIT_RATE',)),
+            ('loader', ('DEFAULT_RATE',)))
+
+# хэши содержимого файлов: {полный путь: (время изменения, размер, хэш)}
+_hashes = {}
+
+
+class LRUCache:
+        """
+        Кэш объектов с ограничением занимаемой памяти
+        Принимает в качестве аргумента предельный объем памяти, байт
+        Методы кэша можно вызывать из разных потоков
+
+        Атрибуты:
+                max_bytes (int): предельный объем памяти, байт
+                nbytes (int): оценка памяти, занятой объектами кэша, байт
+
+        """
+        def __init__(self, max_bytes=MAX_BYTES):
+                self.max_bytes = max_bytes
+                self.nbytes = 0
+                # {ключ: (объект, размер, путь к файлу)}
+                self._items = OrderedDict()
+                self._lock = threading.Lock()
+
+        def __len__(self):
+                return len(self._items)
+
+        def get(self, key):
+                """
+                Получение объекта по ключу key
+
+                Возвращаемое значение:
+                        object: объект (None - объекта нет в кэше)
+
+                """
+                with self._lock:
+                        item = self._items.get(key)
+                        if item is None:
+                                return None
+                        self._items.move_to_end(key)
+                        return item[0]
+
+        def put(self, key, value, filename=None, size=None):
+                """
+                Сохранение объекта value с ключом key
+                filename - файл, к которому относится объект (см. invalidate)
+                size - размер объекта, байт (по-умолчанию - оценка sizeof)
+                Объект больше предельного объема памяти не сохраняется
+
+                """
+                if size is None:
+                        size = sizeof(value)
+                with self._lock:
+                        old = self._items.pop(key, None)
+                        if old is not None:
+                                self.nbytes -= old[1]
+                        if size > self.max_bytes:
+                                return
+                        self._items[key] = (value, size, filename)
+                        self.nbytes += size
+                        self._evict()
+
+        def _evict(self):
+                # удаление давно не использованных объектов
+                while self.nbytes > self.max_bytes and self._items:
+                        _, (_, size, _) = self._items.popitem(last=False)
+                        self.nbytes -= size
+
+        def resize(self, max_bytes):
+                """
+                Изменение предельного объема памяти кэша
+
+                """
+                with self._lock:
+                        self.max_bytes = max_bytes
+                        self._evict()
+
+        def invalidate(self, filename=None):
+                """
+                Удаление объектов, относящихся к файлу filename
+                (None - удаление всех объектов)
+
+                Возвращаемое значение:
+                        int: число удаленных объектов
+
+                """
+                with self._lock:
+                        if filename is None:
+                                count = len(self._items)
+                                self._items.clear()
+                                self.nbytes = 0
+                                return count
+                        path = os.path.abspath(filename)
+                        keys = [k for k, item in self._items.items()
+                                if item[2] == path]
+                        for k in keys:
+                                self.nbytes -= self._items.pop(k)[1]
+                        return len(keys)
+
+
+RESULTS = LRUCache()
+
+
+def _freeze(value):
+        # неизменяемое представление параметра для отпечатка
+        if isinstance(value, dict):
+                return tuple(sorted((str(k), _freeze(v))
+                                    for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+                return tuple(_freeze(v) for v in value)
+        if isinstance(value, np.ndarray):
+                return value.tolist()
+        if hasattr(value, '__dict__'):
+                return (type(value).__name__, _freeze(vars(value)))
+        return value
+
+
+def fingerprint(options):
+        """
+        Функция расчета отпечатка параметров обработки options
+        (словарь параметров Chromatogram, объекты - например, библиотека
+        компонентов - учитываются по значениям атрибутов)
+
+        Возвращаемое значение:
+                str: шестнадцатеричное значение хэша параметров
+
+        """
+        text = repr(_freeze(options)).encode()
+        return hashlib.blake2b(text, digest_size=16).hexdigest()
+
+
+def parameters(options):
+        """
+        Функция получения полного набора параметров обработки: параметры
+        Chromatogram options, дополненные значениями по-умолчанию,
+        и настройки модулей SETTINGS ('модуль.ПЕРЕМЕННАЯ')
+
+        Возвращаемое значение:
+                dict: {параметр: значение}
+
+        """
+        from .chromatogram import Chromatogram
+
+        params = {name: p.default for name, p in
+                  inspect.signature(Chromatogram).parameters.items()
+                  if name != 'filename' and p.default is not p.empty}
+        params.update(options)
+        for module, names in SETTINGS:
+                values = importlib.import_module('.' + module, __package__)
+                for name in names:
+                        params['%s.%s' % (module, name)] = getattr(values,
+                                                                   name)
+        return params
+
+
+def file_hash(filename):
+        """
+        Функция получения хэша содержимого файла filename
+        Хэш пересчитывается, только если изменились время изменения
+        или размер файла
+
+        Возвращаемое значение:
+                str: шестнадцатеричное значение хэша (см. cache.content_hash)
+
+        """
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        known = _hashes.get(path)
+        if known is not None and known[:2] == (st.st_mtime_ns, st.st_size):
+                return known[2]
+        digest = cache.content_hash(path)
+        _hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+
+def sizeof(value, _seen=None):
+        """
+        Функция оценки памяти, занятой объектом value и вложенными
+        объектами (массивы numpy - по размеру данных), байт
+
+        Возвращаемое значение:
+                int: оценка размера, байт
+
+        """
+        if _seen is None:
+                _seen = set()
+        if id(value) in _seen:
+                return 0
+        _seen.add(id(value))
+        if isinstance(value, np.ndarray):
+                return sys.getsizeof(value) + (value.nbytes if value.base
+                                               is None else 0)
+        size = sys.getsizeof(value)
+        if isinstance(value, dict):
+                size += sum(sizeof(k, _seen) + sizeof(v, _seen)
+                            for k, v in value.items())
+        elif isinstance(value, (list, tuple, set)):
+                size += sum(sizeof(v, _seen) for v in value)
+        elif hasattr(value, '__dict__'):
+                size += sizeof(vars(value), _seen)
+        elif hasattr(type(value), '__slots__'):
+                size += sum(sizeof(getattr(value, name, None), _seen)
+                            for name in type(value).__slots__)
+        return size
+
+
+def compact(value):
+        """
+        Функция подготовки результата обработки value к хранению в кэше:
+        сигнал (Signal) и сигнал и базовая линия хроматограммы (атрибуты
+        ddict, background) приводятся к типу STORE_DTYPE, остальные
+        объекты сохраняются без изменений
+        Исходный объект не изменяется: хроматограмма копируется
+
+        Возвращаемое значение:
+                object: результат для хранения
+
+        """
+        if isinstance(value, tuple):
+                return tuple(compact(v) for v in value)
+        if isinstance(value, Signal):
+                return value.astype(STORE_DTYPE)
+        signal = getattr(value, 'ddict', None)
+        if isinstance(signal, Signal) and signal.dtype != STORE_DTYPE:
+                value = copy.copy(value)
+                value.ddict = signal.astype(STORE_DTYPE)
+                if value.background is not None:
+                        value.background = np.asarray(value.background,
+                                                      STORE_DTYPE)
+        return value
+
+
+def _key(filename, options):
+        # результат содержит путь к файлу, поэтому файлы с одинаковым
+        # содержимым хранятся отдельно
+        return (os.path.abspath(filename), file_hash(filename),
+                fingerprint(parameters(options)))
+
+
+def get(filename, **options):
+        """
+        Функция получения результата обработки файла filename
+        с параметрами options из общего кэша RESULTS
+
+        Возвращаемое значение:
+                object: сохраненный результат (None - результата нет)
+
+        """
+        return RESULTS.get(_key(filename, options))
+
+
+def put(filename, value, **options):
+        """
+        Функция сохранения результата обработки value файла filename
+        с параметрами options в общем кэше RESULTS
+        (сигналы - с типом STORE_DTYPE, см. compact)
+
+        """
+        RESULTS.put(_key(filename, options), compact(value),
+                    os.path.abspath(filename))
+
+
+def process(filename, **options):
+        """
+        Функция обработки файла filename с параметрами Chromatogram options
+        с сохранением результата в общем кэше RESULTS
+        Возвращаемые объекты общие для всех вызовов и не должны изменяться
+
+        Возвращаемое значение:
+                (chrom, result) - Chromatogram и ProcessingResult
+
+        """
+        from .chromatogram import Chromatogram
+
+        key = _key(filename, options)
+        value = RESULTS.get(key)
+        if value is None:
+                chrom = Chromatogram(filename, **options)
+                value = compact((chrom, chrom.process()))
+                RESULTS.put(key, value, os.path.abspath(filename))
+        return value
+
+
+def invalidate(filename=None):
+        """
+        Функция удаления результатов обработки файла filename
+        (None - всех файлов) из общего кэша RESULTS
+
+        Возвращаемое значение:
+                int: число удаленных результатов
+
+        """
+        return RESULTS.invalidate(filename)
@@ -0,0 +1,150 @@
+"""
+Модуль noise
+============
+
+Модуль noise - расчет фонового шума хроматограммы
+
+Шум рассчитывается по разобранному массиву сигнала (модуль loader) сразу
+для всех окон заданной длительности: окна формируются представлением
+массива без копирования (sliding_window_view), величина шума всех окон
+вычисляется одной операцией над двумерным массивом окон
+
+Методы расчета (method):
+        'p2p' - размах колебаний сигнала без одного максимального и одного
+                минимального значений (как в исходной программе)
+        'rms' - среднеквадратичное отклонение от линейного дрейфа
+        'astm' - шум по ASTM E685: окно делится на segments участков,
+                 шум - среднее значение размаха колебаний на участках
+
+Если участок расчета шума wing_noise не задан, выбирается самое спокойное
+окно хроматограммы: окно с наименьшим ненулевым шумом
+
+Основные функции
+----------------
+        peak_to_peak(ndarray) -> float
+        noise_window(list, ndarray) -> (int, int)
+        rolling(ndarray, int, int=None, str='p2p') -> (ndarray, ndarray)
+        quiet_window(ndarray, ndarray, float=20, str='p2p') -> (float, float)
+        estimate(ndarray, ndarray, list=None, str='p2p') -> (float, list)
+
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+METHODS = ('p2p', 'rms', 'astm')
+
+# длительность окна автоматического выбора участка шума, сек
+QUIET_DURATION = 20
+# число участков окна для метода 'astm'
+SEGMENTS = 10
+
+
+def peak_to_peak(datas):
+        """
+        Функция расчета амплитуды шумовых колебаний сигнала datas
+        без учета одного максимального и одного минимального значений
+
+        Возвращаемое значение:
+                noise (float): величина (амплитуда) фонового шума
+
+        """
+        # удаляем статистические выбросы макс и мин сигнала
+        datas = np.partition(datas, (1, len(datas) - 2))
+        # значение шума хроматограммы - амплитуда шумовых колебаний
+        return float(datas[-2] - datas[1])
+
+
+def noise_window(wing_noise, time):
+        """
+        Функция перевода участка расчета шума wing_noise [сек, сек]
+        в номера точек сигнала с временами time
+
+        Возвращаемое значение:
+                (start, end) - номера первой и следующей за последней точек
+
+        """
+        start, end = np.searchsorted(time, wing_noise).tolist()
+        return start, end
+
+
+def _noise(windows, method, segments=SEGMENTS):
+        # шум каждой строки двумерного массива окон
+        size = windows.shape[1]
+        if method == 'p2p':
+                part = np.partition(windows, (1, size - 2), axis=1)
+                return part[:, -2] - part[:, 1]
+        if method == 'rms':
+                x = np.arange(size) - (size - 1) / 2
+                y = windows - windows.mean(axis=1, keepdims=True)
+                slope = y @ x / (x @ x)
+                resid = y - slope[:, None] * x
+                return np.sqrt((resid ** 2).mean(axis=1))
+        if method == 'astm':
+                k = size // segments
+                parts = windows[:, :k * segments].reshape(len(windows),
+                                                          segments, k)
+                return (parts.max(axis=2) - parts.min(axis=2)).mean(axis=1)
+        raise ValueError('Неизвестный метод расчета шума: %r' % method)
+
+
+def rolling(signal, size, step=None, method='p2p'):
+        """
+        Функция расчета шума во всех окнах по size точек, начинающихся
+        через каждые step точек (по-умолчанию - половина окна)
+
+        Возвращаемое значение:
+                (starts, values) - номера первых точек окон и величины шума
+
+        """
+        signal = np.asarray(signal, dtype=float)
+        if step is None:
+                step = max(size // 2, 1)
+        if size < 4 or len(signal) < size:
+                return np.empty(0, dtype=int), np.empty(0)
+        windows = sliding_window_view(signal, size)[::step]
+        starts = np.arange(len(windows)) * step
+        return starts, _noise(windows, method)
+
+
+def quiet_window(signal, time, duration=QUIET_DURATION, method='p2p'):
+        """
+        Функция выбора самого спокойного участка хроматограммы
+        длительностью duration, сек
+
+        Возвращаемое значение:
+                (start, end) - границы участка, сек (None - сигнал короче
+                               участка)
+
+        """
+        if len(time) < 2:
+                return None
+        rate = (len(time) - 1) / (time[-1] - time[0])
+        size = int(round(duration * rate))
+        starts, values = rolling(signal, size, method=method)
+        # окна с постоянным сигналом (нет данных прибора) пропускаются
+        values = np.where(values > 0, values, np.inf)
+        if not len(values) or not np.isfinite(values).any():
+                return None
+        i = int(starts[np.argmin(values)])
+        return float(time[i]), float(time[i] + duration)
+
+
+def estimate(signal, time, wing_noise=None, method='p2p'):
+        """
+        Функция расчета шума на участке wing_noise [сек, сек]
+        (None - самый спокойный участок, см. quiet_window)
+
+        Возвращаемое значение:
+                (noise, window) - величина шума и участок расчета [сек, сек]
+
+        """
+        if wing_noise is None:
+                wing_noise = quiet_window(signal, time, method=method)
+                if wing_noise is None:
+                        return 0., None
+        start, end = noise_window(wing_noise, time)
+        if method == 'p2p':
+                return peak_to_peak(signal[start:end]), list(wing_noise)
+        window = np.asarray(signal[start:end], dtype=float)[None, :]
+        return float(_noise(window, method)[0]), list(wing_noise)
@@ -0,0 +1,462 @@
+"""
+Модуль replicates
+=================
+
+Модуль replicates - совместная обработка серии параллельных анализов
+(повторных вводов пробы) и расчет показателей пригодности системы
+
+Сигналы всех файлов серии приводятся к одной частоте и сводятся в один
+двумерный массив (анализы x точки) на общей шкале времени: общий участок
+записи всех анализов. Если размер массива превышает MMAP_SIZE, массив
+размещается во временном файле и отображается в память (np.memmap).
+Средняя, минимальная и максимальная хроматограммы, наложение
+хроматограмм и параметры пиков рассчитываются операциями над всем
+массивом сразу, без циклов по анализам
+
+Компоненты серии и окна пиков [начало, окончание] определяются обработкой
+опорного анализа модулем chromatogram. Границы, высота и площадь пика
+каждого анализа определяются так же, как при обработке отдельного файла
+(Chromatogram.peak_xy, peakheight, peak_areas), время удерживания -
+вершина, уточненная параболой (Chromatogram.apex), поэтому разброс
+времени удерживания не ограничен шагом сигнала. Пик, вершина которого
+на границе окна, не учитывается. Для каждого компонента рассчитываются среднее,
+стандартное отклонение и относительное стандартное отклонение (%RSD)
+времени удерживания, высоты и площади
+
+Запуск из командной строки:
+
+        python -m GC.replicates файлы_или_папки [...] [-o rsd.csv]
+                                [--rate 1] [--library компоненты.csv]
+                                [--baseline asls|rolling_ball]
+
+Основные функции
+----------------
+        load(list, float=1, str='mean', str=None) -> RunSet
+        rsd(ndarray) -> (ndarray, ndarray, ndarray)
+        main(list=None) -> int
+
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import sys
+import tempfile
+
+import numpy as np
+
+from . import baseline
+from . import library
+from . import loader
+
+# размер массива серии, начиная с которого он размещается в файле, байт
+MMAP_SIZE = 64 * 1024 * 1024
+
+# параметры пиков серии
+PARAMS = ('t', 'H', 'S')
+
+
+class RunSet:
+        """
+        Серия анализов на общей шкале времени
+        Принимает в качестве аргументов:
+        files - список путей к файлам с данными
+        rate - частота приведения сигналов, Гц (None - исходная частота
+               записи первого файла)
+        method - способ приведения к частоте rate (см. loader.resample)
+        correction - метод вычитания базовой линии каждого анализа
+                     (None - без коррекции, см. модуль baseline)
+
+        Атрибуты:
+                files (list): пути к файлам
+                rate (float): частота сигналов, Гц
+                time (ndarray): общая шкала времени, сек
+                data (ndarray): сигналы, массив формы (анализы, точки),
+                        при размере более MMAP_SIZE - np.memmap
+                injections (list): дата и время каждого анализа
+
+        """
+        def __init__(self, files, rate=1, method='mean', correction=None):
+                if not files:
+                        raise ValueError('Не заданы файлы серии')
+                self.files = list(files)
+                self.rate = rate
+                self.method = method
+                self.correction = correction
+                self.injections = []
+                self._file = None
+                self._build()
+
+        def _build(self):
+                runs = [loader.load(f) for f in self.files]
+                if self.rate is None:
+                        self.rate = runs[0].rate
+                rate = self.rate
+                # усредненная точка отнесена к началу интервала усреднения,
+                # вершина пика отсчитывается от середины интервала
+                self._center = 0.
+                if self.method == 'mean':
+                        self._center = max(.5 * (1 / rate - 1 / runs[0].rate),
+                                           0.)
+                # общая шкала - номера интервалов 1/rate от нулевого времени,
+                # ограничение сверху с запасом на неполные интервалы
+                first = min(int(np.floor(r.time[0] * rate)) for r in runs)
+                last = max(int(np.ceil(r.time[-1] * rate)) for r in runs)
+                shape = (len(runs), last - first + 1)
+                self.data = self._allocate(shape)
+                self.data[:] = np.nan
+                lo, hi = first, last
+                for i, run in enumerate(runs):
+                        self.injections.append((run.date_injection,
+                                                run.time_injection))
+                        t, y = run.resample(rate, self.method)
+                        if self.correction:
+                                y = y - baseline.estimate(y, rate,
+                                                          self.correction)
+                        start = int(round(t[0] * rate)) - first
+                        self.data[i, start:start + len(y)] = y
+                        lo = max(lo, start + first)
+                        hi = min(hi, start + first + len(y) - 1)
+                if hi < lo:
+                        raise ValueError('Анализы серии не имеют общего '
+                                         'участка записи')
+                # общий участок записи всех анализов (без копирования)
+                self.data = self.data[:, lo - first:hi - first + 1]
+                self.time = np.arange(lo, hi + 1) / rate
+
+        def _allocate(self, shape):
+                # массив в памяти или во временном файле, отображенном в память
+                if shape[0] * shape[1] * 8 <= MMAP_SIZE:
+                        return np.empty(shape)
+                self._file = tempfile.TemporaryFile(prefix='qc_chrom_')
+                return np.memmap(self._file, dtype=float, mode='w+',
+                                 shape=shape)
+
+        def close(self):
+                """
+                Освобождение временного файла массива серии
+
+                """
+                self.data = None
+                if self._file is not None:
+                        self._file.close()
+                        self._file = None
+
+        def __len__(self):
+                return len(self.files)
+
+        def mean(self):
+                """
+                Средняя хроматограмма серии
+
+                Возвращаемое значение:
+                        ndarray: среднее значение сигнала в каждой точке
+
+                """
+                return np.asarray(self.data.mean(axis=0))
+
+        def min(self):
+                """
+                Нижняя огибающая серии
+
+                Возвращаемое значение:
+                        ndarray: минимальное значение сигнала в каждой точке
+
+                """
+                return np.asarray(self.data.min(axis=0))
+
+        def max(self):
+                """
+                Верхняя огибающая серии
+
+                Возвращаемое значение:
+                        ndarray: максимальное значение сигнала в каждой точке
+
+                """
+                return np.asarray(self.data.max(axis=0))
+
+        def overlay(self, offset=0):
+                """
+                Наложение хроматограмм серии со смещением каждой
+                следующей хроматограммы на offset, пА
+
+                Возвращаемое значение:
+                        ndarray: массив формы (анализы, точки)
+
+                """
+                shift = offset * np.arange(len(self))[:, None]
+                return np.asarray(self.data) + shift
+
+        def windows(self, reference=0, **options):
+                """
+                Определение окон пиков по опорному анализу серии
+                (номер reference) обработкой модуля chromatogram
+                options - параметры обработки Chromatogram (library,
+                          wing_noise ...)
+
+                Возвращаемое значение:
+                        dict: {компонент: (начало, окончание), сек}
+
+                """
+                chrom = self.chromatogram(reference, **options)
+                with contextlib.redirect_stdout(io.StringIO()):
+                        chrom.process()
+                return {name: (p[0], p[4]) for name, p in chrom.coords.items()}
+
+        def chromatogram(self, index, **options):
+                """
+                Хроматограмма анализа номер index на общей шкале времени
+                (сигнал - строка массива серии, шум рассчитывается
+                по файлу анализа)
+                options - параметры обработки Chromatogram
+
+                Возвращаемое значение:
+                        Chromatogram: хроматограмма с загруженным сигналом
+
+                """
+                from .chromatogram import Chromatogram
+
+                chrom = Chromatogram(rate=self.rate, method=self.method,
+                                     **options)
+                chrom.filename = self.files[index]
+                chrom.date_injection, chrom.time_injection = \
+                        self.injections[index]
+                chrom._center = self._center
+                chrom.ddict.assign(np.asarray(self.data[index]),
+                                   step=1 / self.rate, time=self.time)
+                return chrom
+
+        def _rows(self, first, last):
+                # участки [first, last) строк массива серии (first, last -
+                # номера точек по анализам), за пределами участка - nan
+                width = max(int((last - first).max()), 1)
+                index = first[:, None] + np.arange(width)
+                inside = index < last[:, None]
+                index = np.clip(index, 0, self.data.shape[1] - 1)
+                rows = np.arange(len(self))[:, None]
+                return index, np.where(inside, self.data[rows, index], np.nan)
+
+        def measure(self, windows):
+                """
+                Измерение параметров пиков всех анализов серии операциями
+                над массивом серии (без обработки отдельных анализов)
+                windows - окна пиков {компонент: (начало, окончание), сек}
+
+                Вершина пика - наибольшее значение сигнала в окне, начало
+                и окончание пика определяются как в Chromatogram.peak_xy:
+                самая ранняя наименьшая точка за 15 сек до вершины и самая
+                поздняя наименьшая точка до вершины следующего компонента,
+                но не далее 20 сек от вершины. Высота и площадь
+                рассчитываются как в Chromatogram.peakheight и peak_areas,
+                время удерживания - уточненная вершина Chromatogram.apex
+                (середина интервала усреднения)
+
+                Возвращаемое значение:
+                        dict: {компонент: {'t': ndarray, 'H': ndarray,
+                               'S': ndarray}} - время вершины, высота
+                               и площадь пика в каждом анализе
+                               (nan - вершина на границе окна)
+
+                """
+                n, size = self.data.shape
+                rows = np.arange(n)
+                step = 1 / self.rate
+                index = {name: np.clip(np.round((np.asarray(w) - self.time[0])
+                                                * self.rate).astype(int),
+                                       0, size - 1)
+                         for name, w in windows.items()}
+                # вершины пиков всех компонентов в каждом анализе
+                tops = {}
+                for name, (lo, hi) in index.items():
+                        part = np.asarray(self.data[:, lo:hi + 1])
+                        tops[name] = lo + np.argmax(part, axis=1)
+
+                wing = int(round(15 * self.rate))
+                reach = int(round(20 * self.rate))
+                names = list(windows)
+                result = {}
+                for k, name in enumerate(names):
+                        lo, hi = index[name]
+                        top = tops[name]
+                        # левое крыло: при равных значениях - самая ранняя
+                        first = np.maximum(top - wing + 1, 0)
+                        points, y = self._rows(first, top + 1)
+                        start = points[rows, np.argmin(
+                                np.where(np.isnan(y), np.inf, y), axis=1)]
+                        # правое крыло: до вершины следующего компонента,
+                        # при равных значениях - самая поздняя точка
+                        last = np.minimum(top + reach, size)
+                        if k + 1 < len(names):
+                                later = tops[names[k + 1]]
+                                last = np.where(later > top,
+                                                np.minimum(last, later), last)
+                        last = np.maximum(last, top + 1)
+                        points, y = self._rows(top, last)
+                        y = np.where(np.isnan(y), np.inf, y)[:, ::-1]
+                        end = points[rows, y.shape[1] - 1
+                                     - np.argmin(y, axis=1)]
+
+                        y_s = self.data[rows, start]
+                        y_t = self.data[rows, top]
+                        y_e = self.data[rows, end]
+                        t_s, t_t, t_e = (self.time[start], self.time[top],
+                                         self.time[end])
+                        with np.errstate(divide='ignore', invalid='ignore'):
+                                slope = np.where(end > start,
+                                                 (y_e - y_s) / (t_e - t_s), 0)
+                        H = y_t - (y_s + slope * (t_t - t_s))
+                        H[(start == top) | (top == end)] = 0
+
+                        # площадь методом трапеций над прямой между началом
+                        # и окончанием пика
+                        points, y = self._rows(start, end + 1)
+                        S = (np.nansum(y[:, 1:] + y[:, :-1], axis=1)
+                             * step / 2 - (y_s + y_e) / 2 * (t_e - t_s))
+
+                        # вершина - парабола через три точки над базовой линией
+                        near = np.clip(top[:, None] + np.arange(-1, 2),
+                                       0, size - 1)
+                        y0, y1, y2 = (self.data[rows[:, None], near]
+                                      - (y_s[:, None] + slope[:, None]
+                                         * (self.time[near]
+                                            - t_s[:, None]))).T
+                        curv = y0 - 2 * y1 + y2
+                        with np.errstate(divide='ignore', invalid='ignore'):
+                                delta = np.clip(.5 * (y0 - y2) / curv,
+                                                -.5, .5)
+                        shift = np.where((curv < 0) & (top > 0)
+                                         & (top < size - 1) & (end > start),
+                                         delta, 0)
+                        t = t_t + shift * step + self._center
+
+                        # вершина на границе окна - пик не найден
+                        found = (top > lo) & (top < hi)
+                        result[name] = {param: np.where(found, value, np.nan)
+                                        for param, value in
+                                        zip(PARAMS, (t, H, S))}
+                return result
+
+        def statistics(self, windows=None, **options):
+                """
+                Расчет показателей повторяемости серии
+                windows - окна пиков (по-умолчанию - по первому анализу,
+                          см. windows), options - параметры обработки
+                          опорного анализа
+
+                Возвращаемое значение:
+                        dict: {компонент: {параметр: {'n', 'mean', 'sd',
+                               'rsd'}}}, rsd - относительное стандартное
+                               отклонение, %
+
+                """
+                if windows is None:
+                        windows = self.windows(**options)
+                measured = self.measure(windows)
+                names = list(measured)
+                if not names:
+                        return {}
+                # массив (анализы, компоненты, параметры)
+                values = np.stack([np.column_stack([measured[n][p]
+                                                    for p in PARAMS])
+                                   for n in names], axis=1)
+                n = np.sum(~np.isnan(values), axis=0)
+                mean, sd, rel = rsd(values)
+                return {name: {param: {'n': int(n[i, j]),
+                                       'mean': float(mean[i, j]),
+                                       'sd': float(sd[i, j]),
+                                       'rsd': float(rel[i, j])}
+                               for j, param in enumerate(PARAMS)}
+                        for i, name in enumerate(names)}
+
+
+def load(files, rate=1, method='mean', correction=None):
+        """
+        Функция загрузки серии анализов (см. RunSet)
+
+        Возвращаемое значение:
+                RunSet: сигналы серии на общей шкале времени
+
+        """
+        return RunSet(files, rate, method, correction)
+
+
+def rsd(values):
+        """
+        Функция расчета среднего, стандартного отклонения (n - 1)
+        и относительного стандартного отклонения значений values
+        по первой оси (по анализам), значения nan не учитываются
+
+        Возвращаемое значение:
+                (mean, sd, rsd) - массивы по остальным осям, rsd - в %
+
+        """
+        values = np.asarray(values, dtype=float)
+        n = np.sum(~np.isnan(values), axis=0)
+        total = np.where(np.isnan(values), 0, values).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.where(n > 0, total / n, np.nan)
+                dev = np.where(np.isnan(values), 0, values - mean)
+                sd = np.where(n > 1, np.sqrt((dev ** 2).sum(axis=0)
+                                             / (n - 1)), np.nan)
+                rel = 100 * sd / np.abs(mean)
+        return mean, sd, rel
+
+
+def main(argv=None):
+        """
+        Точка входа командной строки: таблица CSV показателей
+        повторяемости серии (компонент, параметр, n, среднее, СКО, %RSD)
+
+        Возвращаемое значение:
+                int: код завершения (0 - успешно, 2 - файлы не найдены)
+
+        """
+        from .batch import find_files
+
+        parser = argparse.ArgumentParser(
+                prog='python -m GC.replicates',
+                description='Повторяемость серии параллельных анализов')
+        parser.add_argument('paths', nargs='+',
+                            help='файлы, папки или маски поиска файлов')
+        parser.add_argument('-o', '--output', default='-',
+                            help='файл результатов (по-умолчанию - stdout)')
+        parser.add_argument('-r', '--rate', type=float, default=1.,
+                            help='частота обработки сигнала, Гц '
+                                 '(0 - исходная частота записи)')
+        parser.add_argument('-l', '--library',
+                            help='файл CSV библиотеки компонентов')
+        parser.add_argument('-b', '--baseline', choices=baseline.METHODS,
+                            help='коррекция базовой линии каждого анализа')
+        args = parser.parse_args(argv)
+
+        files = find_files(args.paths)
+        if not files:
+                print('Файлов с данными хроматографии не обнаружено',
+                      file=sys.stderr)
+                return 2
+        options = {}
+        if args.library:
+                options['library'] = library.load(args.library)
+        runs = load(files, args.rate or None, correction=args.baseline)
+        stats = runs.statistics(**options)
+        runs.close()
+
+        outf = sys.stdout
+        if args.output != '-':
+                outf = open(args.output, 'w', newline='', encoding='utf-8')
+        writer = csv.writer(outf)
+        writer.writerow(('component', 'param', 'n', 'mean', 'sd', 'RSD, %'))
+        for name, params in stats.items():
+                for param, s in params.items():
+                        writer.writerow((name, param, s['n'],
+                                         '%.6g' % s['mean'], '%.4g' % s['sd'],
+                                         '%.3g' % s['rsd']))
+        if outf is not sys.stdout:
+                outf.close()
+        print('Анализов в серии: %d' % len(files), file=sys.stderr)
+        return 0
+
+
+if __name__ == '__main__':
+        sys.exit(main())
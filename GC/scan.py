@@ -0,0 +1,169 @@
+"""
+Модуль scan
+===========
+
+Модуль scan - поиск файлов с экспериментальными данными в папке
+
+Формат файла определяется только по строкам заголовка: читается начало
+файла (не более SNIFF_BYTES байт), и в первых SNIFF_LINES строках ищется
+название столбца 'FID A, pA'. Файл целиком не читается.
+
+Результаты проверки файлов сохраняются в индексе (файл JSON в каталоге
+дискового кэша, см. модуль cache) с ключом - полный путь к файлу и
+значениями - время изменения и размер файла. При повторном сканировании
+папки проверяются только новые и измененные файлы
+
+Основные классы и функции
+-------------------------
+        is_gc_file(file) -> bool
+        ScanIndex(file=None)
+        scan(str='.', str='*.txt') -> list
+
+"""
+
+import fnmatch
+import json
+import os
+
+from . import cache
+
+# признак файла с данными хроматографирования в строке названий столбцов
+SIGNATURE = 'FID A, pA'
+# число проверяемых строк и байт начала файла
+SNIFF_LINES = 5
+SNIFF_BYTES = 4096
+# имя файла индекса в каталоге кэша
+INDEX_NAME = 'scan_index.json'
+# версия формата индекса
+VERSION = 1
+
+
+def is_gc_file(filename):
+        """
+        Функция проверки файла filename по строкам заголовка
+
+        Возвращаемое значение:
+                bool: True - файл содержит данные хроматографирования
+
+        """
+        try:
+                with open(filename, 'rb') as inf:
+                        head = inf.read(SNIFF_BYTES)
+        except OSError:
+                return False
+        lines = head.decode('latin-1').splitlines()[:SNIFF_LINES]
+        return any(SIGNATURE in line for line in lines)
+
+
+class ScanIndex:
+        """
+        Индекс проверенных файлов
+        Принимает в качестве аргумента путь к файлу индекса (по-умолчанию -
+        INDEX_NAME в каталоге кэша; если кэш отключен, индекс хранится
+        только в памяти)
+
+        Атрибуты:
+                files (dict): {полный путь: [время изменения, нс, размер,
+                               признак файла с данными]}
+                checked (int): число файлов, проверенных при последнем
+                               сканировании
+
+        """
+        def __init__(self, filename=None):
+                if filename is None and cache.CACHE_DIR is not None:
+                        filename = os.path.join(cache.CACHE_DIR, INDEX_NAME)
+                self.filename = filename
+                self.files = {}
+                self.checked = 0
+                self._changed = False
+                self.load()
+
+        def load(self):
+                """
+                Чтение индекса из файла, поврежденный индекс отбрасывается
+
+                """
+                if self.filename is None:
+                        return
+                try:
+                        with open(self.filename, 'r', encoding='utf-8') as inf:
+                                data = json.load(inf)
+                except (OSError, ValueError):
+                        return
+                if isinstance(data, dict) and data.get('version') == VERSION:
+                        self.files = data.get('files', {})
+
+        def save(self):
+                """
+                Запись индекса в файл, если он изменился при сканировании
+
+                """
+                if self.filename is None or not self._changed:
+                        return
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                tmp = self.filename + '.tmp'
+                with open(tmp, 'w', encoding='utf-8') as outf:
+                        json.dump({'version': VERSION, 'files': self.files},
+                                  outf, ensure_ascii=False)
+                os.replace(tmp, self.filename)
+                self._changed = False
+
+        def scan(self, directory='.', pattern='*.txt'):
+                """
+                Поиск файлов с данными по маске pattern в папке directory
+                Проверяются только файлы, отсутствующие в индексе или
+                измененные после проверки; записи удаленных файлов папки
+                из индекса удаляются
+
+                Возвращаемое значение:
+                        list: отсортированный список путей к файлам с данными
+
+                """
+                folder = os.path.abspath(directory)
+                found = []
+                seen = set()
+                self.checked = 0
+                with os.scandir(directory) as entries:
+                        for entry in entries:
+                                if not fnmatch.fnmatch(entry.name, pattern):
+                                        continue
+                                try:
+                                        if not entry.is_file():
+                                                continue
+                                        st = entry.stat()
+                                except OSError:
+                                        continue
+                                key = os.path.join(folder, entry.name)
+                                seen.add(key)
+                                record = self.files.get(key)
+                                if (record is None or record[0] != st.st_mtime_ns
+                                    or record[1] != st.st_size):
+                                        record = [st.st_mtime_ns, st.st_size,
+                                                  is_gc_file(entry.path)]
+                                        self.files[key] = record
+                                        self.checked += 1
+                                        self._changed = True
+                                if record[2]:
+                                        found.append(os.path.normpath(
+                                                os.path.join(directory,
+                                                             entry.name)))
+                # удаленные файлы
+                for key in [k for k in self.files
+                            if os.path.dirname(k) == folder and k not in seen
+                            and fnmatch.fnmatch(os.path.basename(k), pattern)]:
+                        del self.files[key]
+                        self._changed = True
+                self.save()
+                return sorted(found)
+
+
+def scan(directory='.', pattern='*.txt'):
+        """
+        Функция поиска файлов с данными в папке directory
+        с использованием индекса по-умолчанию (см. ScanIndex)
+
+        Возвращаемое значение:
+                list: отсортированный список путей к файлам с данными
+
+        """
+        return ScanIndex().scan(directory, pattern)
@@ -0,0 +1,264 @@
+"""
+Модуль series
+=============
+
+Модуль series - компактное хранение сигнала хроматограммы
+
+Signal хранит значения сигнала в одном массиве numpy (float64 или float32)
+и шкалу времени в виде времени первой точки и шага (равномерная шкала)
+либо массива времени каждой точки. Время точки, номер точки по времени
+и участок сигнала по диапазону времени определяются без перебора точек;
+участок - представление массива без копирования. Массив времени всех
+точек равномерной шкалы (атрибут time) рассчитывается при каждом
+обращении и не хранится: если нужны отдельные точки или шаг, следует
+использовать time_at, times, start и step
+Signal заменяет словарь {номер точки: сигнал} (ddict) и поддерживает
+его интерфейс: ddict[i], len, keys, values, items, update, clear,
+дописывание точки ddict[len(ddict)] = s (модуль live). Массив значений -
+атрибут array
+
+Основные классы
+---------------
+        Signal(values=(), start=0, step=1, time=None, dtype=float)
+
+"""
+
+import numpy as np
+
+# число знаков после запятой времени точек равномерной шкалы: устраняет
+# погрешность умножения на шаг (1903 * 0.1 = 190.30000000000001 -> 190.3)
+DECIMALS = 9
+
+
+class Signal:
+        """
+        Сигнал хроматограммы на шкале времени
+        Принимает в качестве аргументов:
+        values - значения сигнала
+        start, step - время первой точки и шаг равномерной шкалы, сек
+        time - время каждой точки, сек (неравномерная шкала; step -
+               средний шаг для определения номера точки по времени)
+        dtype - тип значений (float32 - вдвое меньше памяти)
+
+        Атрибуты:
+                start (float): время первой точки, сек
+                step (float): шаг шкалы времени, сек
+
+        """
+        __slots__ = ('_values', '_size', '_time', 'start', 'step')
+
+        def __init__(self, values=(), start=0, step=1, time=None,
+                     dtype=float):
+                self._values = np.empty(0, dtype)
+                self._size = 0
+                self._time = None
+                self.start = start
+                self.step = step
+                if len(values):
+                        self.assign(values, start, step, time)
+
+        def assign(self, values, start=0, step=1, time=None):
+                """
+                Замена значений и шкалы времени сигнала (без копирования,
+                если массив values имеет тип сигнала)
+                Массив времени time сохраняется, только если шкала
+                неравномерна (не совпадает с шагом step)
+
+                """
+                self._values = np.asarray(values, dtype=self._values.dtype)
+                self._size = len(self._values)
+                if time is not None:
+                        time = np.asarray(time)
+                        if len(time):
+                                start = float(time[0])
+                        grid = np.round(start + np.arange(len(time)) * step,
+                                        DECIMALS)
+                        if np.array_equal(grid, time):
+                                time = None
+                self.start = start
+                self.step = step
+                self._time = time
+
+        @property
+        def array(self):
+                """
+                Массив значений сигнала (представление, без копирования)
+
+                """
+                return self._values[:self._size]
+
+        @property
+        def time(self):
+                """
+                Массив времени точек, сек (для равномерной шкалы
+                рассчитывается при обращении)
+
+                """
+                if self._time is not None:
+                        return self._time[:self._size]
+                t = self.start + np.arange(self._size) * self.step
+                return np.round(t, DECIMALS)
+
+        @property
+        def regular(self):
+                """
+                Равномерная шкала времени (время точки - start + i * step)
+
+                """
+                return self._time is None
+
+        @property
+        def dtype(self):
+                return self._values.dtype
+
+        @property
+        def nbytes(self):
+                """
+                Память, занятая массивами сигнала, байт
+
+                """
+                size = self._values.nbytes
+                if self._time is not None and self._time.base is None:
+                        size += self._time.nbytes
+                return size
+
+        def time_at(self, i):
+                """
+                Время точки номер i, сек
+
+                """
+                if self._time is not None:
+                        return float(self._time[i])
+                if i < 0:
+                        i += self._size
+                return round(self.start + i * self.step, DECIMALS)
+
+        def times(self, index):
+                """
+                Время точек с номерами index (массив номеров), сек
+
+                Возвращаемое значение:
+                        ndarray: время точек
+
+                """
+                index = np.asarray(index)
+                if self._time is not None:
+                        return self._time[index]
+                index = np.where(index < 0, index + self._size, index)
+                return np.round(self.start + index * self.step, DECIMALS)
+
+        def index(self, t):
+                """
+                Номер точки, ближайшей ко времени t, сек (по шагу шкалы,
+                без ограничения диапазоном сигнала)
+
+                """
+                return int(round((t - self.start) / self.step))
+
+        def between(self, t0, t1):
+                """
+                Участок сигнала t0 <= t <= t1, сек (значения - представление
+                массива сигнала)
+
+                Возвращаемое значение:
+                        Signal: участок сигнала
+
+                """
+                if self._time is not None:
+                        lo = int(np.searchsorted(self.time, t0, 'left'))
+                        hi = int(np.searchsorted(self.time, t1, 'right'))
+                        part = Signal(dtype=self.dtype)
+                        part.assign(self.array[lo:hi], step=self.step,
+                                    time=self._time[lo:hi])
+                        return part
+                eps = 1e-9
+                lo = max(int(np.ceil((t0 - self.start) / self.step - eps)), 0)
+                hi = min(int(np.floor((t1 - self.start) / self.step + eps))
+                         + 1, self._size)
+                hi = max(hi, lo)
+                return Signal(self.array[lo:hi], self.start + lo * self.step,
+                              self.step, dtype=self.dtype)
+
+        def append(self, values):
+                """
+                Дописывание значений в конец сигнала (равномерная шкала)
+                Память выделяется с запасом, время дописывания точки - O(1)
+                в среднем
+
+                """
+                if self._time is not None:
+                        raise ValueError('Дописывание точек в сигнал '
+                                         'с неравномерной шкалой времени')
+                values = np.atleast_1d(np.asarray(values,
+                                                  dtype=self._values.dtype))
+                need = self._size + len(values)
+                if need > len(self._values) or self._values.base is not None:
+                        grown = np.empty(max(need, 2 * len(self._values), 16),
+                                         self._values.dtype)
+                        grown[:self._size] = self.array
+                        self._values = grown
+                self._values[self._size:need] = values
+                self._size = need
+
+        def astype(self, dtype):
+                """
+                Копия сигнала с типом значений dtype
+
+                """
+                copy = Signal(dtype=dtype)
+                copy.assign(self.array, self.start, self.step,
+                            None if self._time is None else self.time)
+                return copy
+
+        # интерфейс словаря {номер точки: сигнал}
+        def __len__(self):
+                return self._size
+
+        def __bool__(self):
+                return self._size > 0
+
+        def __getitem__(self, i):
+                if not 0 <= i < self._size:
+                        raise KeyError(i)
+                return float(self._values[i])
+
+        def __setitem__(self, i, value):
+                if i == self._size:
+                        self.append(value)
+                elif 0 <= i < self._size:
+                        self._values[i] = value
+                else:
+                        raise KeyError('Пропуск точек сигнала: %r' % i)
+
+        def __contains__(self, i):
+                return isinstance(i, int) and 0 <= i < self._size
+
+        def __iter__(self):
+                return iter(range(self._size))
+
+        def keys(self):
+                return range(self._size)
+
+        def values(self):
+                return self.array
+
+        def items(self):
+                return zip(range(self._size), self.array.tolist())
+
+        def update(self, items):
+                """
+                Добавление точек (номер, значение) по порядку номеров
+                (интерфейс словаря)
+
+                """
+                for i, value in dict(items).items():
+                        self[i] = value
+
+        def clear(self):
+                self._values = np.empty(0, self._values.dtype)
+                self._size = 0
+                self._time = None
+
+        def __repr__(self):
+                return 'Signal(%d points, start=%g, step=%g)' % (
+                        self._size, self.start, self.step)
@@ -0,0 +1,228 @@
+"""
+Модуль store
+============
+
+Модуль store - хранение результатов обработки в базе данных SQLite
+
+Каждое значение параметра компонента хранится отдельной строкой таблицы
+results с ключом (файл, дата и время анализа, компонент, параметр).
+Дата и время анализа хранятся в формате 'ГГГГ-ММ-ДД ЧЧ:ММ', поэтому
+сортировка и выборка за период выполняются сравнением строк.
+Покрывающий индекс (компонент, параметр, дата и время, значение)
+позволяет строить тренды (например, площадь пика этанола по дням
+за несколько месяцев) чтением только индекса, без обращения к таблице.
+Результаты пакета файлов записываются одной транзакцией (executemany),
+прежние результаты обработанных файлов удаляются полностью, в том числе
+если при повторной обработке компоненты не найдены
+
+Глобальные переменные
+---------------------
+        DB_PATH (str): путь к файлу базы данных по-умолчанию
+
+Основные функции
+----------------
+        injected(str, str) -> str
+        records(list) -> list
+        connect(str=None) -> Store
+
+"""
+
+import os
+import sqlite3
+
+DB_PATH = os.environ.get('QC_CHROM_DB',
+                         os.path.join(os.path.expanduser('~'),
+                                      'qc_chrom.sqlite'))
+
+# версия схемы базы данных (PRAGMA user_version)
+VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+        file TEXT NOT NULL,
+        injected TEXT NOT NULL,
+        component TEXT NOT NULL,
+        param TEXT NOT NULL,
+        value REAL,
+        PRIMARY KEY (file, injected, component, param)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_trend
+        ON results (component, param, injected, value);
+CREATE INDEX IF NOT EXISTS results_injected
+        ON results (injected);
+"""
+
+# группировка трендов: длина префикса строки даты и времени анализа
+PERIODS = {'minute': 16, 'hour': 13, 'day': 10, 'month': 7, 'year': 4}
+
+# столбцы строки результатов, не являющиеся параметрами компонента
+_KEYS = ('file', 'date', 'time', 'component', 'channel')
+
+
+def injected(date_injection, time_injection):
+        """
+        Функция перевода даты '31.12.2024' и времени '14.35' анализа
+        в строку '2024-12-31 14:35' для хранения и сортировки
+
+        Возвращаемое значение:
+                str: дата и время анализа (пустая строка - дата не найдена)
+
+        """
+        if not date_injection:
+                return ''
+        day, month, year = (date_injection[:2], date_injection[3:5],
+                            date_injection[6:10])
+        text = '%s-%s-%s' % (year, month, day)
+        if time_injection:
+                text += ' %s:%s' % (time_injection[:2], time_injection[3:5])
+        return text
+
+
+def records(rows):
+        """
+        Функция перевода строк таблицы результатов (ProcessingResult.rows)
+        в записи базы данных, отсутствующие значения пропускаются
+        Компонент канала детектора записывается как 'компонент [канал]'
+
+        Возвращаемое значение:
+                list: [(файл, дата и время, компонент, параметр, значение)]
+
+        """
+        result = []
+        for row in rows:
+                component = row['component']
+                if row.get('channel'):
+                        component = '%s [%s]' % (component, row['channel'])
+                key = (os.path.abspath(row['file']),
+                       injected(row['date'], row['time']),
+                       component)
+                for param, value in row.items():
+                        if param in _KEYS or value is None:
+                                continue
+                        result.append(key + (param, float(value)))
+        return result
+
+
+class Store:
+        """
+        База данных результатов обработки
+        Принимает в качестве аргумента путь к файлу базы данных
+        (по-умолчанию - DB_PATH, ':memory:' - база в памяти)
+        Соединение используется только в создавшем его потоке
+
+        """
+        def __init__(self, filename=None):
+                self.filename = filename or DB_PATH
+                self.db = sqlite3.connect(self.filename)
+                if self.filename != ':memory:':
+                        self.db.execute('PRAGMA journal_mode=WAL')
+                self.db.execute('PRAGMA synchronous=NORMAL')
+                with self.db:
+                        self.db.executescript(_SCHEMA)
+                        self.db.execute('PRAGMA user_version=%d' % VERSION)
+
+        def close(self):
+                self.db.close()
+
+        def __enter__(self):
+                return self
+
+        def __exit__(self, *exc):
+                self.close()
+
+        def save(self, rows, files=None):
+                """
+                Запись строк таблицы результатов rows (ProcessingResult.rows,
+                batch.run) одной транзакцией
+                files - обработанные файлы: все прежние результаты этих
+                        файлов удаляются, даже если для файла нет строк
+                        в rows (по-умолчанию - файлы строк rows)
+
+                Возвращаемое значение:
+                        int: число записанных значений
+
+                """
+                data = records(rows)
+                if files is None:
+                        files = [row['file'] for row in rows]
+                files = sorted({os.path.abspath(f) for f in files})
+                with self.db:
+                        self.db.executemany(
+                                'DELETE FROM results WHERE file = ?',
+                                [(f,) for f in files])
+                        self.db.executemany(
+                                'INSERT INTO results VALUES (?, ?, ?, ?, ?)',
+                                data)
+                return len(data)
+
+        def trend(self, component, param='S', start=None, end=None,
+                  period='day'):
+                """
+                Тренд параметра param компонента component за период
+                [start, end] (строки 'ГГГГ-ММ-ДД[ ЧЧ:ММ]', None - без
+                ограничения) с группировкой по period ('minute', 'hour',
+                'day', 'month', 'year')
+
+                Возвращаемое значение:
+                        list: [(период, среднее, минимум, максимум, число
+                               анализов)] в порядке возрастания периода
+
+                """
+                size = PERIODS[period]
+                sql = ('SELECT substr(injected, 1, %d) AS period, avg(value), '
+                       'min(value), max(value), count(value) FROM results '
+                       'WHERE component = ? AND param = ?' % size)
+                args = [component, param]
+                if start is not None:
+                        sql += ' AND injected >= ?'
+                        args.append(start)
+                if end is not None:
+                        # конец периода включительно (все строки с началом end)
+                        sql += ' AND injected < ?'
+                        args.append(end + '\uffff')
+                sql += ' GROUP BY period ORDER BY period'
+                return self.db.execute(sql, args).fetchall()
+
+        def runs(self, start=None, end=None):
+                """
+                Список анализов за период [start, end]
+
+                Возвращаемое значение:
+                        list: [(дата и время, файл)] в порядке времени анализа
+
+                """
+                sql = 'SELECT DISTINCT injected, file FROM results'
+                where, args = [], []
+                if start is not None:
+                        where.append('injected >= ?')
+                        args.append(start)
+                if end is not None:
+                        where.append('injected < ?')
+                        args.append(end + '\uffff')
+                if where:
+                        sql += ' WHERE ' + ' AND '.join(where)
+                return self.db.execute(sql + ' ORDER BY injected',
+                                       args).fetchall()
+
+        def components(self):
+                """
+                Список компонентов, для которых сохранены результаты
+
+                Возвращаемое значение:
+                        list: имена компонентов в алфавитном порядке
+
+                """
+                rows = self.db.execute('SELECT DISTINCT component '
+                                       'FROM results ORDER BY component')
+                return [name for name, in rows]
+
+
+def connect(filename=None):
+        """
+        Функция открытия (создания) базы данных результатов
+
+        Возвращаемое значение:
+                Store: база данных результатов
+
+        """
+        return Store(filename)
@@ -0,0 +1,153 @@
+"""
+Модуль synth
+============
+
+Модуль synth - генерация синтетических файлов с экспериментальными данными
+для измерения производительности и проверки обработки
+
+Файлы записываются в формате, который выгружает прибор: строка с именем,
+датой и временем анализа, строка названий столбцов и три столбца данных,
+разделенных табуляцией:
+Values Xxxxxx, DD.MM.YYYY HH.MM
+"Time, s"       FID A, pA	OvenTemp, °C
+"00"00"         11.615	        30.000
+
+Сигнал - сумма гауссовых пиков, линейного дрейфа базовой линии и
+нормального шума. По-умолчанию содержит пики этанола (190 сек) и
+ацетонитрила (210 сек)
+
+Запуск из командной строки:
+
+        python -m GC.synth файл [--duration 300] [--rate 10] [--noise .004]
+                                [--peaks 2 --overlap 0 --start 175]
+
+Основные функции
+----------------
+        make_peaks(int, float=175, float=2.5, float=0., int=None) -> list
+        signal(ndarray, list, float=.004, float=.002, int=None) -> ndarray
+        write_run(file, float=300, int=10, list=None, float=.004, ...) -> str
+
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+# пики по-умолчанию: (время удерживания, сек; высота, пА; сигма, сек)
+DEFAULT_PEAKS = ((190, 3.0, 2.5), (210, 2.0, 3.0))
+
+
+def make_peaks(n, start=175, width=2.5, overlap=0., seed=None):
+        """
+        Функция формирования списка из n пиков
+        Принимает в качестве аргументов:
+        start - время удерживания первого пика, сек
+        width - сигма гауссова пика, сек
+        overlap - степень перекрывания соседних пиков: 0 - пики разделены
+                  до базовой линии (расстояние 8 сигма), 1 - пики совпадают
+        seed - начальное значение генератора случайных высот
+
+        Возвращаемое значение:
+                list: [(время удерживания, высота, сигма), ...]
+
+        """
+        rng = np.random.default_rng(seed)
+        spacing = 8 * width * (1 - overlap)
+        heights = rng.uniform(1., 3., n)
+        return [(start + i * spacing, float(h), width)
+                for i, h in enumerate(heights)]
+
+
+def signal(time, peaks, noise=.004, drift=.002, seed=None, baseline=11.6):
+        """
+        Функция расчета сигнала детектора в моменты времени time
+        Принимает в качестве аргументов:
+        peaks - список пиков [(время удерживания, высота, сигма), ...]
+        noise - стандартное отклонение шума, пА
+        drift - скорость дрейфа базовой линии, пА/сек
+        baseline - начальный уровень базовой линии, пА
+
+        Возвращаемое значение:
+                ndarray: сигнал, пА
+
+        """
+        rng = np.random.default_rng(seed)
+        y = baseline + drift * time + rng.normal(0, noise, len(time))
+        for center, height, sigma in peaks:
+                lo, hi = np.searchsorted(time, (center - 8 * sigma,
+                                                center + 8 * sigma))
+                y[lo:hi] += height * np.exp(
+                        -.5 * ((time[lo:hi] - center) / sigma) ** 2)
+        return y
+
+
+def write_run(filename, duration=300, rate=10, peaks=None, noise=.004,
+              drift=.002, seed=None, name='Run001',
+              date_time='12.03.2024 14.35'):
+        """
+        Функция записи синтетического файла с экспериментальными данными
+        Принимает в качестве аргументов:
+        filename - путь к создаваемому файлу
+        duration - длительность анализа, сек
+        rate - частота записи данных, Гц
+        peaks - список пиков (по-умолчанию - DEFAULT_PEAKS)
+        noise, drift, seed - параметры сигнала (см. signal)
+        name, date_time - имя и дата анализа в первой строке файла
+
+        Возвращаемое значение:
+                str: путь к созданному файлу
+
+        """
+        if peaks is None:
+                peaks = DEFAULT_PEAKS
+        n = int(duration * rate)
+        time = np.arange(n) / rate
+        y = signal(time, peaks, noise, drift, seed)
+        # температурная программа: 30 °С, нагрев 6 °С/мин
+        oven = 30 + time / 10
+        seconds = time.astype(int)
+        lines = ['"%02d"%02d"\t%.3f\t%.3f' % (s // 60, s % 60, v, o)
+                 for s, v, o in zip(seconds.tolist(), y.tolist(),
+                                    oven.tolist())]
+        with open(filename, 'w', newline='\r\n') as outf:
+                outf.write('Values %s, %s\n' % (name, date_time))
+                outf.write('"Time, s"\tFID A, pA\tOvenTemp, °C\n')
+                outf.write('\n'.join(lines))
+                outf.write('\n\n\n')
+        return filename
+
+
+def main(argv=None):
+        parser = argparse.ArgumentParser(
+                prog='python -m GC.synth',
+                description='Генерация синтетического файла хроматографии')
+        parser.add_argument('filename', help='создаваемый файл')
+        parser.add_argument('--duration', type=float, default=300,
+                            help='длительность анализа, сек')
+        parser.add_argument('--rate', type=int, default=10,
+                            help='частота записи данных, Гц')
+        parser.add_argument('--noise', type=float, default=.004,
+                            help='стандартное отклонение шума, пА')
+        parser.add_argument('--peaks', type=int, default=None,
+                            help='число пиков (по-умолчанию - пики этанола '
+                                 'и ацетонитрила)')
+        parser.add_argument('--overlap', type=float, default=0.,
+                            help='степень перекрывания пиков от 0 до 1')
+        parser.add_argument('--start', type=float, default=175,
+                            help='время удерживания первого пика, сек')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='начальное значение генератора')
+        args = parser.parse_args(argv)
+
+        peaks = None
+        if args.peaks is not None:
+                peaks = make_peaks(args.peaks, args.start,
+                                   overlap=args.overlap, seed=args.seed)
+        write_run(args.filename, args.duration, args.rate, peaks,
+                  args.noise, seed=args.seed)
+        return 0
+
+
+if __name__ == '__main__':
+        sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+Модуль timing
+=============
+
+Модуль timing - измерение времени выполнения этапов обработки
+
+Функции и методы этапов обработки отмечаются декоратором stage. Пока
+измерение выключено, декоратор только проверяет флаг и вызывает функцию.
+Во включенном состоянии для каждого файла и этапа накапливаются число
+вызовов, общее время выполнения (включая вложенные этапы) и, если
+включено измерение памяти (tracemalloc), наибольший прирост памяти
+за время этапа. Файл задается контекстом run(file). По завершении
+обработки файла его результаты записываются в журнал 'GC.timing' одной
+строкой JSON. Результаты разных запусков (разных пакетов, процессов)
+складываются функцией merge и чтением журналов функцией read_log
+
+Модули, загружаемые этапами при первом вызове (подмодули scipy), задаются
+в декораторе stage(imports=...) и загружаются при включении измерения,
+чтобы время импорта не попадало во время первого вызова этапа
+
+Измерение памяти однопоточное: tracemalloc учитывает память всего
+процесса, и сброс наибольшего значения (reset_peak) в одном потоке
+искажает результаты этапов других потоков. Поэтому при включенном
+измерении памяти (measuring_memory) потоки пула обработки не
+используются (см. chromatogram.process_channels), а параллельная
+обработка выполняется в отдельных процессах (модуль batch)
+
+Глобальные переменные
+---------------------
+        PROFILE (Profile): результаты измерений текущего процесса
+
+Основные функции
+----------------
+        enable(bool=False) -> None
+        disable() -> None
+        enabled() -> bool
+        measuring_memory() -> bool
+        stage(str=None, tuple=()) -> decorator
+        run(file, bool=True) -> context manager
+        current() -> str
+        read_log(file) -> Profile
+
+"""
+
+import contextlib
+import functools
+import importlib
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+log = logging.getLogger('GC.timing')
+
+_enabled = False
+_memory = False
+# текущий файл и стек этапов каждого потока
+_local = threading.local()
+# модули, загружаемые этапами при первом вызове (см. stage)
+_imports = set()
+
+
+class Profile:
+        """
+        Результаты измерения этапов обработки
+
+        Атрибуты:
+                files (dict): {файл: {этап: [число вызовов, время, сек,
+                               прирост памяти, байт]}}
+
+        """
+        def __init__(self):
+                self.files = {}
+                self._lock = threading.Lock()
+
+        def add(self, filename, name, seconds, peak=0):
+                # добавление одного вызова этапа name
+                with self._lock:
+                        stages = self.files.setdefault(filename, {})
+                        stat = stages.setdefault(name, [0, 0., 0])
+                        stat[0] += 1
+                        stat[1] += seconds
+                        stat[2] = max(stat[2], peak)
+
+        def merge(self, files):
+                """
+                Сложение результатов files ({файл: {этап: [вызовы, время,
+                память]}}, см. атрибут files) с результатами профиля
+
+                """
+                with self._lock:
+                        for filename, stages in files.items():
+                                own = self.files.setdefault(filename, {})
+                                for name, other in stages.items():
+                                        stat = own.setdefault(name,
+                                                              [0, 0., 0])
+                                        stat[0] += other[0]
+                                        stat[1] += other[1]
+                                        stat[2] = max(stat[2], other[2])
+
+        def pop(self, filename):
+                """
+                Извлечение результатов файла filename из профиля
+
+                Возвращаемое значение:
+                        dict: {этап: [вызовы, время, память]}
+
+                """
+                with self._lock:
+                        return self.files.pop(filename, {})
+
+        def totals(self):
+                """
+                Сумма результатов по всем файлам
+
+                Возвращаемое значение:
+                        dict: {этап: [вызовы, время, сек, наибольший прирост
+                               памяти, байт]}, по убыванию времени
+
+                """
+                total = Profile()
+                for stages in list(self.files.values()):
+                        total.merge({None: stages})
+                stages = total.files.get(None, {})
+                return dict(sorted(stages.items(), key=lambda s: -s[1][1]))
+
+        def clear(self):
+                with self._lock:
+                        self.files.clear()
+
+        def report(self):
+                """
+                Таблица суммарных результатов по этапам
+
+                Возвращаемое значение:
+                        str: строки таблицы (этап, вызовы, время, память)
+
+                """
+                lines = ['%-24s %8s %10s %10s' % ('этап', 'вызовы',
+                                                   'время, с', 'память, КБ')]
+                for name, (calls, seconds, peak) in self.totals().items():
+                        lines.append('%-24s %8d %10.3f %10.0f'
+                                     % (name, calls, seconds, peak / 1024))
+                return '\n'.join(lines)
+
+
+PROFILE = Profile()
+
+
+def enable(memory=False):
+        """
+        Включение измерения этапов обработки
+        memory - измерять прирост памяти (tracemalloc, замедляет обработку;
+                 только при обработке в одном потоке)
+        Модули, загружаемые этапами при первом вызове, загружаются сразу
+
+        """
+        global _enabled, _memory
+        _preload()
+        _memory = memory
+        if memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+        _enabled = True
+
+
+def disable():
+        """
+        Выключение измерения этапов обработки
+
+        """
+        global _enabled, _memory
+        _enabled = False
+        if _memory and tracemalloc.is_tracing():
+                tracemalloc.stop()
+        _memory = False
+
+
+def enabled():
+        return _enabled
+
+
+def measuring_memory():
+        """
+        Функция проверки, включено ли измерение памяти этапов
+        (обработка должна выполняться в одном потоке)
+
+        Возвращаемое значение:
+                bool: True - измерение памяти включено
+
+        """
+        return _enabled and _memory
+
+
+def _preload():
+        # загрузка модулей этапов вне измеряемых этапов
+        for module in list(_imports):
+                importlib.import_module(module)
+                _imports.discard(module)
+
+
+def _stack():
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+                stack = _local.stack = []
+        return stack
+
+
+def _measure(name, func, args, kwargs):
+        # выполнение этапа с измерением времени и памяти
+        stack = _stack()
+        memory = _memory and tracemalloc.is_tracing()
+        if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                if stack:
+                        # наибольшая память внешнего этапа до сброса
+                        outer = stack[-1]
+                        outer[1] = max(outer[1], peak - outer[0])
+                tracemalloc.reset_peak()
+        # [память в начале этапа, наибольший прирост памяти]
+        frame = [current if memory else 0, 0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+                return func(*args, **kwargs)
+        finally:
+                seconds = time.perf_counter() - start
+                stack.pop()
+                if memory:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        frame[1] = max(frame[1], peak - frame[0])
+                        if stack:
+                                outer = stack[-1]
+                                outer[1] = max(outer[1],
+                                               frame[0] + frame[1] - outer[0])
+                PROFILE.add(getattr(_local, 'filename', None), name,
+                            seconds, frame[1])
+
+
+def stage(name=None, imports=()):
+        """
+        Декоратор функции (метода) этапа обработки name
+        (по-умолчанию - имя функции)
+        imports - модули, загружаемые этапом при первом вызове; при
+                  включенном измерении загружаются до начала измерения
+
+        """
+        _imports.update(imports)
+
+        def decorate(func):
+                label = name or func.__name__
+
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                        if not _enabled:
+                                return func(*args, **kwargs)
+                        if _imports:
+                                _preload()
+                        return _measure(label, func, args, kwargs)
+                return wrapper
+        return decorate
+
+
+@contextlib.contextmanager
+def run(filename, log=True):
+        """
+        Контекст обработки файла filename: этапы, выполненные в контексте
+        в этом потоке, относятся к файлу. По завершении обработки
+        результаты файла записываются в журнал, если log (см. write_log)
+
+        """
+        previous = getattr(_local, 'filename', None)
+        _local.filename = filename
+        try:
+                yield
+        finally:
+                _local.filename = previous
+                if _enabled and log:
+                        write_log(filename, PROFILE.files.get(filename, {}))
+
+
+def current():
+        """
+        Функция получения файла, обрабатываемого в этом потоке
+        (см. run; потоки пула передают файл явно)
+
+        Возвращаемое значение:
+                str: файл (None - вне контекста run)
+
+        """
+        return getattr(_local, 'filename', None)
+
+
+def write_log(filename, stages):
+        """
+        Запись результатов файла filename ({этап: [вызовы, время, память]})
+        в журнал 'GC.timing' одной строкой JSON
+
+        """
+        if log.isEnabledFor(logging.INFO):
+                log.info(json.dumps({'file': filename, 'stages': stages},
+                                    ensure_ascii=False))
+
+
+def read_log(filename, profile=None):
+        """
+        Функция чтения журнала filename (строки JSON, см. write_log)
+        со сложением результатов всех записей
+
+        Возвращаемое значение:
+                Profile: результаты из журнала (добавляются в profile,
+                         если он задан)
+
+        """
+        if profile is None:
+                profile = Profile()
+        with open(filename, 'r', encoding='utf-8') as inf:
+                for line in inf:
+                        line = line.strip()
+                        if not line.startswith('{'):
+                                continue
+                        record = json.loads(line)
+                        profile.merge({record['file']: record['stages']})
+        return profile
@@ -0,0 +1,429 @@
+"""
+Модуль watch
+============
+
+Модуль watch - автоматическая обработка файлов, появляющихся в папке
+(папка выгрузки прибора)
+
+Наблюдение за папкой выполняется в цикле событий asyncio. В Linux
+изменения папки сообщает inotify (через ctypes, без дополнительных
+библиотек), в остальных системах и при недоступности inotify папка
+опрашивается каждые interval секунд. События inotify не приходят
+об изменениях, сделанных другим компьютером в сетевой папке (NFS, SMB),
+поэтому и при работе inotify папка просматривается каждые rescan секунд.
+Новый или измененный файл считается
+записанным, когда его размер и время изменения не меняются в течение
+settle секунд. Записанные файлы с данными хроматографирования передаются
+в пул процессов (обработка batch.process_file), результаты каждого файла
+выводятся по мере готовности
+
+Ограничение нагрузки: записанные файлы ожидают обработки в очереди
+длиной не более queue_size, в обработке одновременно находится не более
+jobs файлов. Если очередь заполнена, новые файлы остаются в списке
+наблюдаемых (путь и размер) до освобождения места в очереди, поэтому
+одновременное появление сотен файлов не увеличивает расход памяти
+
+Запуск из командной строки (параметры обработки те же, что
+у GC.batch, столбцы результатов определяются параметрами --channel
+и --fit):
+
+        python -m GC.watch папка [-o результаты.csv] [--db [файл]]
+                           [-j число_процессов] [--settle 10]
+                           [--interval 1] [--rescan 60] [--poll]
+                           [--existing] [--rate 1]
+                           [--library компоненты.csv]
+                           [--noise-window 40,60|auto]
+                           [--noise-method p2p|rms|astm]
+                           [--baseline asls|rolling_ball]
+                           [--fit gauss|emg] [--channel all]
+
+Основные классы
+---------------
+        Watcher(directory, pattern='*.txt', settle=10, interval=1,
+                jobs=None, queue_size=16, callback=None, existing=False,
+                poll=False, rescan=60, **options)
+
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import ctypes
+import ctypes.util
+import fnmatch
+import functools
+import os
+import signal
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import batch
+from . import scan
+from . import store
+
+# время неизменности файла, после которого он считается записанным, сек
+SETTLE = 10
+# период проверки файлов (опроса папки без inotify), сек
+INTERVAL = 1
+# период просмотра папки при работе inotify (изменения в сетевой папке), сек
+RESCAN = 60
+# наибольшее число записанных файлов, ожидающих обработки
+QUEUE_SIZE = 16
+
+# события inotify: файл закрыт после записи, перемещен в папку, изменен
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_EVENT = struct.Struct('iIII')
+
+
+class _Inotify:
+        # наблюдение за папкой через inotify (Linux)
+        def __init__(self, directory):
+                libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                   use_errno=True)
+                self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+                if self.fd < 0:
+                        raise OSError(ctypes.get_errno(), 'inotify_init1')
+                mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                            mask)
+                if wd < 0:
+                        os.close(self.fd)
+                        raise OSError(ctypes.get_errno(), 'inotify_add_watch')
+
+        def read(self):
+                # имена файлов из прочитанных событий
+                try:
+                        data = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                        return []
+                names = []
+                pos = 0
+                while pos + _EVENT.size <= len(data):
+                        _, _, _, size = _EVENT.unpack_from(data, pos)
+                        pos += _EVENT.size
+                        name = data[pos:pos + size].rstrip(b'\0')
+                        pos += size
+                        if name:
+                                names.append(os.fsdecode(name))
+                return names
+
+        def close(self):
+                os.close(self.fd)
+
+
+class Watcher:
+        """
+        Наблюдение за папкой и обработка записанных файлов
+        Принимает в качестве аргументов:
+        directory - папка выгрузки файлов
+        pattern - маска имен файлов
+        settle - время неизменности файла до начала обработки, сек
+        interval - период проверки файлов (опроса папки), сек
+        jobs - число процессов обработки (по-умолчанию - число ядер)
+        queue_size - наибольшее число файлов, ожидающих обработки
+        callback - функция callback(filename, rows, error), вызываемая
+                   в цикле событий по завершении обработки каждого файла
+                   (см. batch.process_file)
+        existing - обработать файлы, находящиеся в папке при запуске
+        poll - опрашивать папку без использования inotify
+        rescan - период просмотра папки при работе inotify, сек
+                 (None - только события inotify)
+        options - параметры обработки Chromatogram (rate, library ...)
+
+        Атрибуты:
+                processed (int): число обработанных файлов
+                inotify (bool): изменения папки сообщает inotify
+
+        """
+        def __init__(self, directory, pattern='*.txt', settle=SETTLE,
+                     interval=INTERVAL, jobs=None, queue_size=QUEUE_SIZE,
+                     callback=None, existing=False, poll=False,
+                     rescan=RESCAN, **options):
+                self.directory = os.path.abspath(directory)
+                self.pattern = pattern
+                self.settle = settle
+                self.interval = interval
+                self.jobs = jobs or os.cpu_count() or 1
+                self.queue_size = queue_size
+                self.callback = callback
+                self.existing = existing
+                self.poll = poll
+                self.rescan = rescan
+                self.options = options
+                self.processed = 0
+                self.inotify = False
+                # наблюдаемые файлы: {путь: (время изменения, размер,
+                # время последнего изменения по часам монотонного времени)}
+                self._watched = {}
+                # последнее обработанное состояние: {путь: (время, размер)}
+                self._done = {}
+                # файлы в очереди и в обработке: {путь: (время, размер)}
+                self._queued = {}
+                self._stop = None
+                self._changed = None
+
+        def _stat(self, path):
+                try:
+                        st = os.stat(path)
+                except OSError:
+                        return None
+                return st.st_mtime_ns, st.st_size
+
+        def _list(self):
+                # файлы папки, подходящие по маске
+                try:
+                        names = os.listdir(self.directory)
+                except OSError:
+                        return []
+                return [os.path.join(self.directory, name) for name in names
+                        if fnmatch.fnmatch(name, self.pattern)]
+
+        def _touch(self, path):
+                # регистрация изменения файла path
+                state = self._stat(path)
+                if state is None:
+                        self._watched.pop(path, None)
+                        return
+                if state in (self._done.get(path), self._queued.get(path)):
+                        return
+                known = self._watched.get(path)
+                if known is None or known[:2] != state:
+                        self._watched[path] = state + (time.monotonic(),)
+
+        def _ready(self):
+                # файлы, не изменявшиеся settle секунд, в порядке изменения
+                now = time.monotonic()
+                ready = []
+                for path, known in list(self._watched.items()):
+                        state = self._stat(path)
+                        if state is None:
+                                del self._watched[path]
+                        elif state != known[:2]:
+                                self._watched[path] = state + (now,)
+                        elif now - known[2] >= self.settle:
+                                ready.append((known[2], path))
+                return [path for _, path in sorted(ready)]
+
+        async def _watch(self, queue):
+                # поиск записанных файлов и постановка их в очередь
+                loop = asyncio.get_running_loop()
+                notify = None
+                if not self.poll:
+                        try:
+                                notify = _Inotify(self.directory)
+                        except (OSError, AttributeError, TypeError):
+                                notify = None
+                self.inotify = notify is not None
+                if notify is not None:
+                        def events():
+                                for name in notify.read():
+                                        if fnmatch.fnmatch(name, self.pattern):
+                                                self._touch(os.path.join(
+                                                        self.directory, name))
+                                self._changed.set()
+                        loop.add_reader(notify.fd, events)
+                try:
+                        for path in self._list():
+                                if self.existing:
+                                        self._touch(path)
+                                else:
+                                        self._done[path] = self._stat(path)
+                        scanned = time.monotonic()
+                        while not self._stop.is_set():
+                                now = time.monotonic()
+                                if notify is None or (
+                                                self.rescan is not None and
+                                                now - scanned >= self.rescan):
+                                        scanned = now
+                                        for path in self._list():
+                                                self._touch(path)
+                                for path in self._ready():
+                                        del self._watched[path]
+                                        state = self._stat(path)
+                                        if not scan.is_gc_file(path):
+                                                self._done[path] = state
+                                                continue
+                                        # ожидание места в очереди
+                                        self._queued[path] = state
+                                        await queue.put((path, state))
+                                self._changed.clear()
+                                try:
+                                        await asyncio.wait_for(
+                                                self._changed.wait(),
+                                                self.interval)
+                                except asyncio.TimeoutError:
+                                        pass
+                finally:
+                        if notify is not None:
+                                loop.remove_reader(notify.fd)
+                                notify.close()
+
+        async def _work(self, queue, pool):
+                # обработка файлов из очереди в пуле процессов
+                loop = asyncio.get_running_loop()
+                while True:
+                        path, state = await queue.get()
+                        try:
+                                work = functools.partial(batch.process_file,
+                                                         path, **self.options)
+                                try:
+                                        filename, rows, error = \
+                                                await loop.run_in_executor(
+                                                        pool, work)
+                                except Exception as e:
+                                        # сбой процесса пула
+                                        filename, rows, error = (
+                                                path, [], '%s: %s'
+                                                % (type(e).__name__, e))
+                                self._done[path] = state
+                                self.processed += 1
+                                self._queued.pop(path, None)
+                                if self.callback is not None:
+                                        self.callback(filename, rows, error)
+                        finally:
+                                queue.task_done()
+
+        async def run(self):
+                """
+                Наблюдение за папкой до вызова stop
+
+                """
+                self._stop = asyncio.Event()
+                self._changed = asyncio.Event()
+                queue = asyncio.Queue(self.queue_size)
+                with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                        workers = [asyncio.create_task(self._work(queue, pool))
+                                   for _ in range(self.jobs)]
+                        try:
+                                await self._watch(queue)
+                                await queue.join()
+                        finally:
+                                for task in workers:
+                                        task.cancel()
+                                await asyncio.gather(*workers,
+                                                     return_exceptions=True)
+
+        def stop(self):
+                """
+                Завершение наблюдения (вызывается в цикле событий): файлы,
+                уже поставленные в очередь, обрабатываются
+
+                """
+                if self._stop is not None:
+                        self._stop.set()
+                        self._changed.set()
+
+
+class _Output:
+        # запись результатов по мере обработки файлов, столбцы таблицы
+        # (см. batch.fields) определяются параметрами обработки options
+        def __init__(self, filename, db, options):
+                fields = batch.fields(options.get('channel') is not None,
+                                      bool(options.get('fit')))
+                self.outf = sys.stdout
+                if filename != '-':
+                        self.outf = open(filename, 'a+', newline='',
+                                         encoding='utf-8')
+                        self.outf.seek(0)
+                        header = next(csv.reader(self.outf), None)
+                        if header is not None and tuple(header) != fields:
+                                self.outf.close()
+                                raise ValueError(
+                                        'столбцы файла %s не совпадают '
+                                        'с параметрами обработки' % filename)
+                self.writer = csv.DictWriter(self.outf, fields)
+                if filename == '-' or not self.outf.tell():
+                        self.writer.writeheader()
+                self.db = store.Store(db) if db else None
+
+        def __call__(self, filename, rows, error):
+                status = 'ok' if error is None else 'ошибка - ' + error
+                print('%s: %s' % (filename, status), file=sys.stderr)
+                self.writer.writerows(rows)
+                self.outf.flush()
+                if self.db is not None and error is None:
+                        self.db.save(rows, [filename])
+
+        def close(self):
+                if self.outf is not sys.stdout:
+                        self.outf.close()
+                if self.db is not None:
+                        self.db.close()
+
+
+async def _serve(watcher):
+        # наблюдение с завершением по сигналу SIGTERM (кроме Windows)
+        loop = asyncio.get_running_loop()
+        with contextlib.suppress(NotImplementedError, AttributeError):
+                loop.add_signal_handler(signal.SIGTERM, watcher.stop)
+        await watcher.run()
+
+
+def main(argv=None):
+        """
+        Точка входа командной строки, наблюдение до прерывания (Ctrl+C)
+
+        Возвращаемое значение:
+                int: код завершения (2 - папка не найдена или столбцы
+                файла результатов не совпадают с параметрами обработки)
+
+        """
+        parser = argparse.ArgumentParser(
+                prog='python -m GC.watch',
+                description='Автоматическая обработка файлов хроматографии, '
+                            'появляющихся в папке')
+        parser.add_argument('directory', help='папка выгрузки файлов')
+        parser.add_argument('-o', '--output', default='-',
+                            help='файл CSV, в который дописываются '
+                                 'результаты (по-умолчанию - stdout)')
+        parser.add_argument('--db', nargs='?', const=store.DB_PATH,
+                            help='сохранять результаты в базу данных SQLite')
+        parser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='число процессов обработки')
+        parser.add_argument('--pattern', default='*.txt',
+                            help='маска имен файлов')
+        parser.add_argument('--settle', type=float, default=SETTLE,
+                            help='время неизменности файла до обработки, сек')
+        parser.add_argument('--interval', type=float, default=INTERVAL,
+                            help='период проверки файлов, сек')
+        parser.add_argument('--rescan', type=float, default=RESCAN,
+                            help='период просмотра папки при работе '
+                                 'inotify, сек (0 - только события inotify)')
+        parser.add_argument('--poll', action='store_true',
+                            help='опрашивать папку без inotify')
+        parser.add_argument('--existing', action='store_true',
+                            help='обработать файлы, уже находящиеся в папке')
+        batch.add_options(parser)
+        args = parser.parse_args(argv)
+
+        if not os.path.isdir(args.directory):
+                print('Папка не найдена: %s' % args.directory, file=sys.stderr)
+                return 2
+        options = batch.options(args)
+        try:
+                output = _Output(args.output, args.db, options)
+        except ValueError as e:
+                print('Ошибка: %s' % e, file=sys.stderr)
+                return 2
+        watcher = Watcher(args.directory, args.pattern, args.settle,
+                          args.interval, args.jobs, callback=output,
+                          existing=args.existing, poll=args.poll,
+                          rescan=args.rescan or None, **options)
+        try:
+                asyncio.run(_serve(watcher))
+        except KeyboardInterrupt:
+                pass
+        finally:
+                output.close()
+        print('Обработано файлов: %d' % watcher.processed, file=sys.stderr)
+        return 0
+
+
+if __name__ == '__main__':
+        sys.exit(main())
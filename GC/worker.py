@@ -0,0 +1,148 @@
+"""
+Модуль worker
+=============
+
+Модуль worker - выполнение обработки в фоновом потоке
+
+Задание Job выполняет функцию func(job, *args) в отдельном потоке и
+сообщает о ходе выполнения, результате или ошибке через функции
+обратного вызова. Функции обратного вызова вызываются в потоке задания;
+графический интерфейс передает их в свой главный поток (например,
+Clock.schedule_once в Kivy).
+
+Отмена задания (Job.cancel) - согласованная: функция задания вызывает
+job.progress или job.check между этапами обработки, и после отмены
+очередной вызов прерывает задание исключением Cancelled. Результаты
+отмененного задания не передаются
+
+Основные классы
+---------------
+        Job(func, args=(), on_done=None, on_error=None, on_progress=None)
+        Cancelled
+
+Пример:
+
+        def work(job, filename):
+                job.progress(0, 'загрузка')
+                chrom = Chromatogram(filename)
+                job.progress(.5, 'обработка')
+                return chrom.process()
+
+        job = Job(work, ('run.txt',), on_done=print).start()
+        job.cancel()
+
+"""
+
+import threading
+
+
+class Cancelled(Exception):
+        """
+        Задание отменено
+
+        """
+
+
+class Job:
+        """
+        Задание, выполняемое в фоновом потоке
+        Принимает в качестве аргументов:
+        func - функция задания func(job, *args)
+        args - аргументы функции
+        on_done - функция on_done(result), вызываемая по завершении
+        on_error - функция on_error(exception), вызываемая при ошибке
+        on_progress - функция on_progress(fraction, stage), вызываемая
+                      при переходе к следующему этапу (доля выполнения
+                      от 0 до 1 и название этапа)
+
+        Атрибуты:
+                result: результат функции задания (None - не завершено)
+                error (Exception): ошибка выполнения (None - нет ошибки)
+
+        """
+        def __init__(self, func, args=(), on_done=None, on_error=None,
+                     on_progress=None):
+                self.func = func
+                self.args = args
+                self.on_done = on_done
+                self.on_error = on_error
+                self.on_progress = on_progress
+                self.result = None
+                self.error = None
+                self._cancel = threading.Event()
+                self._finished = threading.Event()
+                self._thread = None
+
+        @property
+        def cancelled(self):
+                return self._cancel.is_set()
+
+        @property
+        def done(self):
+                return self._finished.is_set()
+
+        def start(self):
+                """
+                Запуск задания в фоновом потоке
+
+                Возвращаемое значение:
+                        Job: задание
+
+                """
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                return self
+
+        def cancel(self):
+                """
+                Отмена задания: выполнение прерывается на следующем этапе,
+                функции on_done, on_error и on_progress больше не вызываются
+
+                """
+                self._cancel.set()
+
+        def check(self):
+                """
+                Проверка отмены задания из функции задания
+
+                """
+                if self._cancel.is_set():
+                        raise Cancelled()
+
+        def progress(self, fraction, stage=''):
+                """
+                Сообщение о переходе к этапу stage из функции задания
+                Прерывает отмененное задание
+
+                """
+                self.check()
+                if self.on_progress is not None:
+                        self.on_progress(fraction, stage)
+
+        def wait(self, timeout=None):
+                """
+                Ожидание завершения задания
+
+                Возвращаемое значение:
+                        bool: True - задание завершено
+
+                """
+                return self._finished.wait(timeout)
+
+        def _run(self):
+                try:
+                        self.result = self.func(self, *self.args)
+                except Cancelled:
+                        pass
+                except Exception as e:
+                        self.error = e
+                try:
+                        if self.cancelled:
+                                return
+                        if self.error is not None:
+                                if self.on_error is not None:
+                                        self.on_error(self.error)
+                        elif self.on_done is not None:
+                                self.on_done(self.result)
+                finally:
+                        self._finished.set()
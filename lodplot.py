@@ -0,0 +1,46 @@
+"""
+
+Line plot for kivy_garden.graph drawn from NumPy arrays.
+The data are decimated to the current graph width and x-range
+(min/max per pixel column, see GC.decimate) on every redraw,
+so the number of vertices is bounded by the screen width
+and peaks are drawn exactly for runs of any length and rate.
+
+"""
+import numpy as np
+
+from kivy_garden.graph import MeshLinePlot
+
+from GC import decimate
+
+
+class ArrayLinePlot(MeshLinePlot):
+    """Implementation of a :class:`MeshLinePlot` fed by
+    set_data(x, y) with NumPy arrays instead of the points list,
+    mesh vertices are built from a float32 buffer
+
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+
+    def set_data(self, x, y):
+        # replaces the plot data, x is sorted in ascending order
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.ask_draw()
+
+    def plot_mesh(self):
+        params = self.params
+        xmin, xmax = params['xmin'], params['xmax']
+        ymin, ymax = params['ymin'], params['ymax']
+        x0, y0, x1, y1 = params['size']
+        x, y = decimate.minmax(self.x, self.y, xmin, xmax, x1 - x0)
+        # vertex format of the mesh: x, y, u, v
+        vert = np.zeros((len(x), 4), dtype=np.float32)
+        if len(x):
+            vert[:, 0] = (x - xmin) * ((x1 - x0) / ((xmax - xmin) or 1)) + x0
+            vert[:, 1] = (y - ymin) * ((y1 - y0) / ((ymax - ymin) or 1)) + y0
+        self._mesh.vertices = vert.ravel()
+        self._mesh.indices = np.arange(len(x), dtype=np.uint16)
@@ -8,6 +8,10 @@ Automatic scaling of the graph from the minimum value to the maximum.
 Calculation of necessary parameters based on experimental data
 
 """
+import time
+# program start, used to report the time to the first frame
+START_TIME = time.perf_counter()
+
 import os
 os.environ['KIVY_IMAGE'] = 'pil'
 
@@ -23,10 +27,10 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.modalview import ModalView
 from kivy.uix.filechooser import FileChooserIconView
 
-from kivy_garden.graph import Graph, MeshLinePlot
 from kivy.graphics import (Color, Rectangle, Line)
 from kivy.core.window import Window
 from kivy.clock import Clock
+from kivy.logger import Logger
 from kivy.properties import StringProperty, ColorProperty
 
 from kivy.uix.boxlayout import BoxLayout
@@ -36,12 +40,49 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.uix.widget import Widget
 from kivy.uix.checkbox import CheckBox
 
-from pathlib import Path
 from functools import partial
-import win32api
-import win32file
-
-from GC import chrom
+import importlib
+import threading
+
+# processing modules are imported in background after the first frame,
+# see ScreenMain.startup
+chromatogram = None
+live = None
+memo = None
+scan = None
+store = None
+worker = None
+
+# files modified less than LIVE_IDLE seconds ago are processed
+# in live mode, polling every LIVE_INTERVAL seconds
+LIVE_IDLE = 30
+LIVE_INTERVAL = 1
+
+# Chromatogram parameters of the selected file processing (defaults),
+# the same parameters are the key of the processed results in memory
+PROCESS_OPTIONS = {}
+
+
+def process_job(job, filename, options):
+    # runs in the worker thread: loads the file, prepares the graph
+    # and calculates the parameters, the job is cancelled between stages;
+    # a file processed before with the same path, content and options
+    # is taken from memory
+    output = memo.get(filename, **options)
+    if output is not None:
+        return output
+    job.progress(0, 'загрузка')
+    run = chromatogram.Chromatogram(filename, **options)
+    job.progress(.5, 'расчет')
+    result = run.process()
+    # results are kept in the local database for trend charts
+    try:
+        with store.Store() as db:
+            db.save(result.rows(), [filename])
+    except Exception as e:
+        Logger.warning('QC_Chrom: results are not saved: %s' % e)
+    memo.put(filename, (run, result), **options)
+    return run, result
 
 
 class ScreenMain(Screen):
@@ -55,21 +96,18 @@ class ScreenMain(Screen):
                        size_hint=[1, 1]
                        )
 
-        # top part in main contains graphics and its setups
-        self.graph = Graph(xlabel='time, s', ylabel='FID A, pA',
-                           label_options={'color': (0,0,0,1)},
-                           x_ticks_major=20, y_ticks_major=.5,
-                           x_ticks_minor=4, y_ticks_minor=5,
-                           background_color=[.91, .96, 1, 1],
-                           border_color=[0, 0, 0, 1],
-                           tick_color=[0, 0, 0, .3],
-                           y_grid_label=True, x_grid_label=True, padding=5,
-                           x_grid=True, y_grid=True, ymin=11, ymax=12,
-                           xmin=0, xmax=1
-                           )
-        self.plot = MeshLinePlot(color=[1, 0, 0, 1])
-        self.plot.points = chrom.gchrom_sec('')
-        self.graph.add_plot(self.plot)
+        # top part in main contains graphics and its setups,
+        # the graph is created after the first frame (see build_graph)
+        self.graph_box = BoxLayout()
+        self.graph = None
+        self.plot = None
+
+        # live processing of the file being written by the instrument
+        self.live = None
+        self.live_event = None
+
+        # processing job of the selected file, see statusbar
+        self.job = None
 
         # down part in main contains left(about filelist) and right(GC params)
         bl_down_master = BoxLayout(orientation='horizontal'
@@ -101,62 +139,6 @@ class ScreenMain(Screen):
                                on_press=self.readfile
                                )
                 
-        # modal view with filechooser
-        self.modal_open_file = ModalView(auto_dismiss=False,
-                                         size_hint=(.8, .8),
-                                         overlay_color=[0, 0, 0, .5],
-                                         background_color=(.94, 1, .96, 1),
-                                         background='',
-                                         on_pre_open=self.scan_local_drives
-                                         )
-        modal_open_box = BoxLayout(orientation='vertical',
-                                   )
-        btns_box = BoxLayout(orientation='horizontal',
-                             spacing=2,
-                             size_hint=(1, .05)
-                             )
-        self.drives_box = drives_box = BoxLayout(orientation='horizontal',
-                                                 size_hint=(1, .05),
-                                                 spacing=1
-                                                 )
-        self.btn_root = Button(text='...',
-                               size_hint=(None, 1),
-                               width=50,
-                               background_color=[.94, 1, .96, 1],
-                               background_normal='',
-                               background_down='',
-                               color=[0, 0, 0, 1],
-                               on_press=self.change_drive
-                               )
-        self.btn_before = self.btn_root
-        
-        self.icon_view = MyChooser(on_submit=self.submit,
-                                   path='.',
-                                   dirselect=True,
-                                   size_hint=(1, .95),
-                                   filters=['*.txt']
-                                   )
-        btn_load_filechooser = Button(text='Открыть',
-                                      background_color=[.94, .94, .94, 1],
-                                      background_normal='images/statusbar.png',
-                                      color=[0, 0, 0, 1],
-                                      on_release=partial(self.load_from_filechooser,
-                                                         self.icon_view)
-                                      )
-        btn_cancel_filechooser = Button(text='Отмена',
-                                        background_color=[.94, .94, .94, 1],
-                                        background_normal='images/statusbar.png',
-                                        color=[0, 0, 0, 1],
-                                        on_press=self.modal_open_file.dismiss
-                                        )
-        # modal view filechooser widgets structure
-        self.modal_open_file.add_widget(modal_open_box)
-        modal_open_box.add_widget(drives_box)
-        modal_open_box.add_widget(self.icon_view)
-        modal_open_box.add_widget(btns_box)
-        btns_box.add_widget(btn_load_filechooser)
-        btns_box.add_widget(btn_cancel_filechooser)
-
         # calls modal view for choose file
         self.btn_load = Button(text='Открыть файл',
                                markup=True,
@@ -165,7 +147,7 @@ class ScreenMain(Screen):
                                background_color=[.94, .94, .94, 1],
                                background_normal='images/statusbar.png',
                                color=[0, 0, 0, 1],
-                               on_press=self.modal_open_file.open
+                               on_press=self.open_file
                                )
 
         # status bar placed in left down part of main,
@@ -288,7 +270,7 @@ class ScreenMain(Screen):
         
 
         # structure of main screen widgets
-        bl.add_widget(self.graph)
+        bl.add_widget(self.graph_box)
         bl.add_widget(bl_down_master)
 
         bl_down_master.add_widget(bl_dm_files_master)
@@ -314,8 +296,122 @@ class ScreenMain(Screen):
         self.bl_file_list.add_widget(self.scroll)
 
         self.add_widget(bl)
-    
+
+        # buttons are enabled when the processing modules are loaded
+        self.btn_scan.disabled = True
+        self.btn_load.disabled = True
+        self.modal_open_file = None
+
+    def startup(self):
+        # second stage of startup, runs after the first frame:
+        # builds the graph and loads processing modules in background
+        self.build_graph()
+        threading.Thread(target=self.load_processing, daemon=True).start()
+
+    def build_graph(self):
+        from kivy_garden.graph import Graph
+        from lodplot import ArrayLinePlot
+
+        self.graph = Graph(xlabel='time, s', ylabel='FID A, pA',
+                           label_options={'color': (0,0,0,1)},
+                           x_ticks_major=20, y_ticks_major=.5,
+                           x_ticks_minor=4, y_ticks_minor=5,
+                           background_color=[.91, .96, 1, 1],
+                           border_color=[0, 0, 0, 1],
+                           tick_color=[0, 0, 0, .3],
+                           y_grid_label=True, x_grid_label=True, padding=5,
+                           x_grid=True, y_grid=True, ymin=11, ymax=12,
+                           xmin=0, xmax=1
+                           )
+        # the plot is decimated to the graph width on every redraw
+        self.plot = ArrayLinePlot(color=[1, 0, 0, 1])
+        self.graph.add_plot(self.plot)
+        self.graph_box.add_widget(self.graph)
+
+    def load_processing(self):
+        # imports the processing stack, runs in a background thread
+        global chromatogram, live, memo, scan, store, worker
+        chromatogram = importlib.import_module('GC.chromatogram')
+        live = importlib.import_module('GC.live')
+        memo = importlib.import_module('GC.memo')
+        scan = importlib.import_module('GC.scan')
+        store = importlib.import_module('GC.store')
+        worker = importlib.import_module('GC.worker')
+        Clock.schedule_once(self.processing_loaded)
+
+    def processing_loaded(self, *args):
+        Logger.info('QC_Chrom: processing modules loaded in %.3f s'
+                    % (time.perf_counter() - START_TIME))
+        self.btn_scan.disabled = False
+        self.btn_load.disabled = False
+
+    def build_modal_open_file(self):
+        # modal view with filechooser
+        self.modal_open_file = ModalView(auto_dismiss=False,
+                                         size_hint=(.8, .8),
+                                         overlay_color=[0, 0, 0, .5],
+                                         background_color=(.94, 1, .96, 1),
+                                         background='',
+                                         on_pre_open=self.scan_local_drives
+                                         )
+        modal_open_box = BoxLayout(orientation='vertical',
+                                   )
+        btns_box = BoxLayout(orientation='horizontal',
+                             spacing=2,
+                             size_hint=(1, .05)
+                             )
+        self.drives_box = drives_box = BoxLayout(orientation='horizontal',
+                                                 size_hint=(1, .05),
+                                                 spacing=1
+                                                 )
+        self.btn_root = Button(text='...',
+                               size_hint=(None, 1),
+                               width=50,
+                               background_color=[.94, 1, .96, 1],
+                               background_normal='',
+                               background_down='',
+                               color=[0, 0, 0, 1],
+                               on_press=self.change_drive
+                               )
+        self.btn_before = self.btn_root
+        
+        self.icon_view = MyChooser(on_submit=self.submit,
+                                   path='.',
+                                   dirselect=True,
+                                   size_hint=(1, .95),
+                                   filters=['*.txt']
+                                   )
+        btn_load_filechooser = Button(text='Открыть',
+                                      background_color=[.94, .94, .94, 1],
+                                      background_normal='images/statusbar.png',
+                                      color=[0, 0, 0, 1],
+                                      on_release=partial(self.load_from_filechooser,
+                                                         self.icon_view)
+                                      )
+        btn_cancel_filechooser = Button(text='Отмена',
+                                        background_color=[.94, .94, .94, 1],
+                                        background_normal='images/statusbar.png',
+                                        color=[0, 0, 0, 1],
+                                        on_press=self.modal_open_file.dismiss
+                                        )
+        # modal view filechooser widgets structure
+        self.modal_open_file.add_widget(modal_open_box)
+        modal_open_box.add_widget(drives_box)
+        modal_open_box.add_widget(self.icon_view)
+        modal_open_box.add_widget(btns_box)
+        btns_box.add_widget(btn_load_filechooser)
+        btns_box.add_widget(btn_cancel_filechooser)
+
+    def open_file(self, instance):
+        # the modal view with filechooser is created on the first use
+        if self.modal_open_file is None:
+            self.build_modal_open_file()
+        self.modal_open_file.open()
+
     def scan_local_drives(self, *args):
+        import win32api
+        import win32file
+
         self.drives_box.clear_widgets()
         self.drives_box.add_widget(self.btn_root)
         drives = win32api.GetLogicalDriveStrings()
@@ -367,19 +463,11 @@ class ScreenMain(Screen):
         a widget is created with the message
         
         """
-        textfile = []
         self.scroll_grid.clear_widgets()
         self.scroll.clear_widgets()
-        # find only *.txt files
-        paths = Path('.').glob('*.txt')
-        for i in list(map(str, paths)):
-            # checks each .txt file on contain GC data
-            with open(i, 'r') as inf:
-                for n, line in enumerate(inf, 1):
-                    line = line.rstrip('\n')
-                    if line.find('FID A, pA') != -1:
-                        textfile.append(i)
-                        continue
+        # *.txt files with GC data, only new or changed files
+        # are checked (header lines only), see GC.scan
+        textfile = scan.scan('.')
         # if no files are found
         if not textfile:
             self.label_empty_list = MyLabel(text='Файлов с данными хроматографии'
@@ -414,10 +502,9 @@ class ScreenMain(Screen):
             else:
                 pass
 
-    def params_table(self, filename):
-        # calculated parameters representation function
-        # receives data on the number of components
-        # and displays a table with calculated chromatography parameters
+    def components_table(self, components):
+        # displays a table with parameters of components
+        # components = {'comp': [{'param': value}, ...]}
         parameters = {}
         self.chrom_comp.clear_widgets()
         self.chrom_params.clear_widgets()
@@ -428,9 +515,6 @@ class ScreenMain(Screen):
                                            size_hint=[.7, 1],
                                            halign='left'))
         self.auto_check.text_size = [self.auto_check.width, 16]
-        # checks the number of components
-        # components = {'comp': {'param': [values]}}
-        components = chrom.findpeaks(filename)
         # sets the number of cols in the table
         self.chrom_params.cols = (len(components) + 1)
         # creates the widget (cell) for each component
@@ -474,26 +558,109 @@ class ScreenMain(Screen):
                 self.chrom_params.add_widget(self.btn_v)
 
     def statusbar(self, instance):
-        # file name output to status bar and run graph
+        # file name output to status bar, the file is processed
+        # in the worker thread, the previous job is cancelled
         if isinstance(instance, str):
+            filename = instance
             self.status_bar.text = os.path.basename(instance)
-            self.gcrun(instance)
-            self.params_table(instance)
         else:
-            self.status_bar.text = instance.text
-            self.gcrun(self.status_bar.text)
-            self.params_table(self.status_bar.text)
+            filename = self.status_bar.text = instance.text
+        self.status_name = self.status_bar.text
+        self.live_stop()
+        self.job_cancel()
+        try:
+            modified = os.path.getmtime(filename)
+        except OSError as e:
+            # the file was removed or is not accessible
+            self.job_error(e)
+            return
+        if time.time() - modified < LIVE_IDLE:
+            # the instrument is still writing the file
+            self.live_start(filename)
+            return
+        job = self.job = worker.Job(process_job, (filename, PROCESS_OPTIONS))
+        job.on_done = partial(self.post, job, self.job_done)
+        job.on_error = partial(self.post, job, self.job_error)
+        job.on_progress = partial(self.post, job, self.job_progress)
+        job.start()
+
+    def post(self, job, callback, *args):
+        # passes the job callback from the worker thread to the main
+        # thread, callbacks of a cancelled job are dropped
+        def run(dt):
+            if self.job is job and not job.cancelled:
+                callback(*args)
+        Clock.schedule_once(run)
+
+    def job_cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+        self.job = None
+
+    def job_progress(self, fraction, stage):
+        # progress indicator in the status bar
+        self.status_bar.text = '%s  %d%% %s' % (self.status_name,
+                                                fraction * 100, stage)
+
+    def job_done(self, output):
+        run, result = output
+        self.job = None
+        self.status_bar.text = self.status_name
+        self.gcrun(run.time, run.signal, float(run.signal.min()),
+                   float(run.signal.max()), len(run.signal) / run.rate)
+        self.components_table(result.components)
         self.date_inj.text = ('Дата и время анализа: ' +
-                              chrom.date_injection + ', ' +
-                              chrom.time_injection)
+                              result.date_injection + ', ' +
+                              result.time_injection)
+
+    def job_error(self, error):
+        self.job = None
+        self.status_bar.text = self.status_name
+        Logger.warning('QC_Chrom: %s: %s' % (type(error).__name__, error))
+        self.date_inj.text = 'Ошибка обработки файла'
+
+    def live_start(self, filename):
+        # follows the growing file: refreshes graph and
+        # shows peaks as soon as they are eluted
+        self.live = live.LiveRun(filename)
+        self.live_event = Clock.schedule_interval(self.live_poll,
+                                                  LIVE_INTERVAL)
+        self.live_poll()
+
+    def live_stop(self):
+        if self.live_event is not None:
+            self.live_event.cancel()
+        self.live_event = None
+        self.live = None
+
+    def live_poll(self, *args):
+        found = self.live.poll()
+        signal = self.live.signal
+        if signal:
+            # array views of the 1 Hz signal, no per-point lists
+            self.plot.set_data(signal.time, signal.array)
+            self.graph.ymin = self.live.ymin
+            self.graph.ymax = self.live.ymax
+            self.graph.xmax = self.live.xmax
+            self.graph.y_ticks_major = (self.graph.ymax - self.graph.ymin) / 4
+        self.date_inj.text = ('Дата и время анализа: ' +
+                              self.live.date_injection + ', ' +
+                              self.live.time_injection)
+        if found:
+            self.components_table(self.live.components())
+        if self.live.idle() > LIVE_IDLE:
+            # recording is finished - full processing of the file
+            filename = self.live.filename
+            self.live_stop()
+            self.statusbar(filename)
     
-    def gcrun(self, datafile):
-        # displays or refresh graph setups from gc's data file
-        self.plot.points = chrom.gchrom_sec(datafile)
+    def gcrun(self, x, y, ymin, ymax, xmax):
+        # displays or refresh graph setups from gc's data
+        self.plot.set_data(x, y)
         # refresh x, y-ranges values
-        self.graph.ymin = chrom.ymin
-        self.graph.ymax = chrom.ymax
-        self.graph.xmax = chrom.xmax
+        self.graph.ymin = ymin
+        self.graph.ymax = ymax
+        self.graph.xmax = xmax
         self.graph.y_ticks_major = (self.graph.ymax - self.graph.ymin) / 4
 
     def GC(self):
@@ -507,15 +674,10 @@ class ScreenMain(Screen):
         ## or calls not_gc foo (file not contains GC data)
         # ignores submit if file doesn't have GC data
         try:
-            if args[1][0].endswith('.txt'):
-                with open(args[1][0], 'r') as inf:
-                    for n, line in enumerate(inf, 1):
-                        line = line.rstrip('\n')
-                        # checks the file contents for GC data
-                        if line.find('FID A, pA') != -1:
-                            self.modal_open_file.dismiss()
-                            self.statusbar(args[1][0])
-                            
+            # checks the file header for GC data
+            if args[1][0].endswith('.txt') and scan.is_gc_file(args[1][0]):
+                self.modal_open_file.dismiss()
+                self.statusbar(args[1][0])
         except Exception:
             pass
             
@@ -578,8 +740,10 @@ class MyLabel(Button):
 class MyApp(App):
     def build(self):
         sm = ScreenManager()
-        sm.add_widget(ScreenMain(name='main_screen'))
+        self.screen_main = ScreenMain(name='main_screen')
+        sm.add_widget(self.screen_main)
         sm.add_widget(FileOpen(name='openfile'))
+        Window.bind(on_flip=self.first_frame)
 
         # background setups
         Window.bind(on_resize=self.resize)
@@ -588,6 +752,13 @@ class MyApp(App):
             self.rect = Rectangle(size=[Window.size[0], Window.size[1]])
         return sm
 
+    def first_frame(self, *args):
+        # reports time to the first frame and starts loading the rest
+        Window.unbind(on_flip=self.first_frame)
+        Logger.info('QC_Chrom: first frame in %.3f s'
+                    % (time.perf_counter() - START_TIME))
+        Clock.schedule_once(lambda dt: self.screen_main.startup())
+
     def resize(self, instance, width, height):
         self.rect.size = [width, height]
 